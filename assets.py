@@ -0,0 +1,142 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'AssetRegistry' class,
+and the registry shared by the whole application: 'ASSETS'.
+
+Each sprite is a PNG file located in 'sprites/<category>/<name>.png'.
+It is loaded and converted once per process, then the same
+pygame.Surface is handed out to every caller.
+The sprites can be decoded in a background thread while the window
+is opened (cf. 'preload'); only the conversion to the display format
+is done by the caller.
+This module uses pygame as main support.
+"""
+
+import os
+import threading
+import time
+
+import pygame
+from pygame.locals import *
+
+
+SPRITES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "sprites")
+WHITE = (255, 255, 255)  # colour used as transparent in our sprites
+# event posted when the sprites are decoded (cf. 'preload')
+ASSETS_READY = USEREVENT
+
+
+class AssetRegistry:
+    """This class loads the sprites, and keeps them in a cache."""
+
+    def __init__(self, root=SPRITES_DIR):
+        """This special method is the class constructor."""
+        self.root = root  # type is str
+        # 'self._surfaces' type is dict: key -> pygame.Surface
+        self._surfaces = {}
+        # the sprites decoded in background, not converted yet:
+        # 'self._decoded' type is dict: file path -> pygame.Surface
+        self._decoded = {}
+        # 'self._pending' type is dict: file path -> threading.Event
+        # (set when the sprite is decoded)
+        self._pending = {}
+        self.hits = 0  # type is int
+        self.misses = 0  # type is int
+        self.preload_time = None  # type is float (seconds, once decoded)
+
+    def path(self, category, name):
+        """This method returns the file path of a sprite."""
+        return os.path.join(self.root, category, name + ".png")
+
+    def get(self, category, name, colorkey=None, alpha=False):
+        """This method returns the sprite 'name' of the folder 'category',
+        converted to the display format (with its alpha channel if 'alpha'),
+        with 'colorkey' as transparent colour if given.
+        We assume that the pygame display mode has been set."""
+        key = (category, name, colorkey, alpha)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        self.misses += 1
+        path = self.path(category, name)
+        # if the sprite is decoded in background, we wait for it
+        pending = self._pending.get(path)
+        if pending is not None:
+            pending.wait()
+        surface = self._decoded.get(path)
+        if surface is None:
+            try:
+                surface = pygame.image.load(path)
+            except (pygame.error, FileNotFoundError):
+                raise NameError("{}.png introuvable".format(name))
+        if alpha:
+            surface = surface.convert_alpha()
+        else:
+            surface = surface.convert()
+        if colorkey is not None:
+            surface.set_colorkey(colorkey, RLEACCEL)
+        self._surfaces[key] = surface
+        return surface
+
+    def preload(self, sprites):
+        """This method decodes the sprites 'sprites' (list of tuples
+        (category, name)) in a background thread, and posts an
+        ASSETS_READY event once they are decoded (if the display is
+        initialized). 'get' waits for a sprite which is not decoded yet.
+        pygame does not need to be initialized."""
+        paths = []
+        for category, name in sprites:
+            path = self.path(category, name)
+            if path not in self._decoded and path not in self._pending:
+                self._pending[path] = threading.Event()
+                paths.append(path)
+        thread = threading.Thread(target=self._decode, args=(paths,),
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, category, name):
+        """This method returns 'True' if the sprite is not being decoded
+        in background, i.e. 'get' does not wait."""
+        return self.path(category, name) not in self._pending
+
+    def laby_sprites(self):
+        """This method returns the sprites used to display the labyrinth,
+        in a dictionary (cf. 'LabyViewer.display_labyrinth')."""
+        return {"wall": self.get("laby", "wall"),
+                "sand_path": self.get("laby", "path"),
+                "guard": self.get("laby", "guard", WHITE),
+                "m_gyver": self.get("laby", "m_gyver", WHITE)}
+
+    def clear(self):
+        """This method empties the cache, e.g. if the display mode changes."""
+        self._surfaces.clear()
+        self._decoded.clear()
+
+    def stats(self):
+        """This method returns the cache statistics as a dictionary."""
+        return {"hits": self.hits, "misses": self.misses,
+                "surfaces": len(self._surfaces)}
+
+    def _decode(self, paths):
+        """This protected method decodes the sprites files 'paths'
+        (it is executed by the background thread)."""
+        start = time.perf_counter()
+        for path in paths:
+            try:
+                self._decoded[path] = pygame.image.load(path)
+            except (pygame.error, FileNotFoundError):
+                # 'get' loads it again, and reports the error
+                pass
+            finally:
+                self._pending.pop(path).set()
+        self.preload_time = time.perf_counter() - start
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(ASSETS_READY))
+
+
+# the registry shared by the whole application
+ASSETS = AssetRegistry()
@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'AutoSaver' class.
+This saves the labyrinth grid in a background thread (write-behind),
+thus the edit loop never waits for the disk.
+
+The edits are coalesced: the grid is saved once the edits stop
+for a quiet period, or when the saver is closed.
+The grid is copied by the thread which requests the save (the edit loop),
+thus the worker thread never reads the grid while it is modified.
+If a save fails, the error is written on the standard error,
+and the save is tried again later.
+"""
+
+import sys
+import threading
+import time
+
+import mapfile
+
+
+RETRY_DELAY = 5.0  # seconds before a failed save is tried again
+
+
+class AutoSaver:
+    """This class saves a grid to a file in a background thread."""
+
+    def __init__(self, grid, map_file, quiet_period=0.5):
+        """This special method is the class constructor."""
+        self.grid = grid  # type is <class 'Grid'>
+        self.map_file = map_file  # type is str
+        self.quiet_period = quiet_period  # type is float (seconds)
+        # statistics about the flushes
+        self.flush_count = 0  # type is int
+        self.last_flush_latency = 0.0  # type is float (seconds)
+        self.max_flush_latency = 0.0  # type is float (seconds)
+        self.max_queue_depth = 0  # type is int
+        self.error_count = 0  # type is int (failed saves)
+        # state shared with the worker thread, protected by '_condition'
+        self._condition = threading.Condition()
+        self._pending = 0  # number of edits not saved yet
+        self._snapshot = None  # copy of the grid to save, or None
+        self._last_request = 0.0  # time of the last edit
+        self._retry_time = 0.0  # time of the next try, after a failure
+        self._closed = False
+        self._worker = threading.Thread(target=self._run,
+                                        name="autosave", daemon=True)
+        self._worker.start()
+
+    @property
+    def queue_depth(self):
+        """This property returns the number of edits not saved yet."""
+        with self._condition:
+            return self._pending
+
+    def request_save(self):
+        """This method notifies the saver that the grid has been modified.
+        The grid is copied now, by the calling thread (one copy of the
+        cells, thus it should be called once per frame rather than once
+        per cell), and saved later by the worker thread."""
+        snapshot = self.grid.copy()
+        with self._condition:
+            self._snapshot = snapshot
+            self._pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._pending)
+            self._last_request = time.monotonic()
+            self._condition.notify()
+
+    def close(self):
+        """This method stops the worker thread,
+        then saves the last edits if needed
+        (the error is raised if this last save fails)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+        self._flush()
+
+    def stats(self):
+        """This method returns the statistics as a dictionary."""
+        return {"flush_count": self.flush_count,
+                "last_flush_latency": self.last_flush_latency,
+                "max_flush_latency": self.max_flush_latency,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "error_count": self.error_count}
+
+    def _run(self):
+        """This protected method is the worker thread loop."""
+        while True:
+            with self._condition:
+                # we wait for an edit
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                # we wait for the quiet period after the last edit
+                # (and for the retry delay after a failed save)
+                while not self._closed:
+                    delay = max(self._last_request + self.quiet_period,
+                                self._retry_time) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if self._closed:
+                    return
+            # the worker thread goes on, whatever the error
+            try:
+                self._flush()
+            except Exception as error:
+                sys.stderr.write("autosave of {} failed: {}\n"
+                                 .format(self.map_file, error))
+                with self._condition:
+                    self._retry_time = time.monotonic() + RETRY_DELAY
+
+    def _flush(self):
+        """This protected method saves the last snapshot of the grid,
+        if there are pending edits, without holding the lock.
+        If the save fails, the edits stay pending (with their snapshot,
+        unless a newer one has been taken meanwhile), and the error
+        is raised."""
+        with self._condition:
+            if not self._pending:
+                return
+            snapshot = self._snapshot
+            pending = self._pending
+            self._snapshot = None
+            self._pending = 0
+        start = time.perf_counter()
+        try:
+            mapfile.save_grid(snapshot, self.map_file)
+        except BaseException:
+            with self._condition:
+                self.error_count += 1
+                if self._snapshot is None:
+                    self._snapshot = snapshot
+                self._pending += pending
+            raise
+        self.last_flush_latency = time.perf_counter() - start
+        self.max_flush_latency = max(self.max_flush_latency,
+                                     self.last_flush_latency)
+        self.flush_count += 1
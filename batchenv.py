@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'BatchEnv' class.
+A batch environment plays N games on the same labyrinth in lockstep,
+e.g. to train bots or to analyse the balance of a map, without any
+'Player' or 'Tool' object: the state of the games is kept in numpy arrays
+(one item per game), and each step plays one action in every game
+with a few vectorized operations.
+
+The rules are the ones of 'GameSession', in the same order: the player
+moves if the passability table allows it, then the tools on the new
+location are found (cf. 'Labyrinth.find_tool'), then the player wins
+or loses if next to the guard (cf. 'Labyrinth.analyze_game_status').
+The same seed gives the same tools positions as 'GameSession.reset',
+thus a game of the batch gives the same states as a session.
+
+The positions are flat indices (y * width + x), the found tools are
+bitmasks (first tool: bit 0), and the actions are the codes of
+'GameSession.ACTION_CODES'. All the games share one read-only copy
+of the passability table, thus the labyrinth grid must not be modified
+while the environment is used.
+
+Please execute this file with Python to measure the throughput
+of random agents on a map, e.g.:
+    python batchenv.py data/grid.csv --games 10000 --steps 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from grid import Grid
+from labyrinth import Labyrinth
+from session import GameSession, GameState
+from tool import Tool
+
+
+MAX_TOOLS = 32  # the found tools are stored on 32 bits
+# the events of a step, in the same order as their codes
+# (cf. 'GameSession.step'); the games already over get the code -1
+EVENTS = ("blocked", "moved", "tool", "win", "lose")
+EVENT_CODES = {event: code for code, event in enumerate(EVENTS)}
+
+
+class BatchEnv:
+    """This class plays 'size' games on the same labyrinth in lockstep."""
+
+    def __init__(self, labyrinth, size, tools_qty=None):
+        """This special method is the class constructor.
+        'tools_qty' is the number of tools per game
+        (by default, one per tool name). The games are started
+        with random seeds (cf. 'reset')."""
+        if size < 1:
+            raise ValueError(size)
+        if tools_qty is None:
+            tools_qty = len(Tool.TOOLS_NAMES)
+        if not 0 <= tools_qty <= MAX_TOOLS:
+            raise ValueError(tools_qty)
+        grid = labyrinth.grid
+        starts = grid.locate(3)
+        if not starts:
+            raise ValueError("There is no start point!")
+        self.labyrinth = labyrinth  # type is <class 'Labyrinth'>
+        self.size = size  # type is int (number of games)
+        self.tools_qty = tools_qty  # type is int
+        width = grid.width
+        # the start point is the last one, as 'initialize_player_location'
+        x_start, y_start = starts[-1]
+        self._start = y_start * width + x_start
+        # the shared tables, one item per cell (flat index)
+        self._passability = grid.passability.ravel().copy()
+        self._passability.flags.writeable = False
+        self._near_exit = self._build_near_exit(labyrinth)
+        # the move and the passability bit of each action code
+        actions = GameSession.ACTIONS
+        self._offsets = np.array([{"up": -width, "down": width, "left": -1,
+                                   "right": 1}[action] for action in actions],
+                                 dtype=np.intp)
+        self._bits = np.array([Grid.DIRECTION_BITS[action]
+                               for action in actions], dtype=np.uint8)
+        self._all_found = np.uint32((1 << tools_qty) - 1)
+        # the games states (cf. 'state')
+        self.positions = np.full(size, self._start, dtype=np.intp)
+        self.found = np.zeros(size, dtype=np.uint32)
+        self.is_alive = np.ones(size, dtype=bool)
+        self.wins = np.zeros(size, dtype=bool)
+        self.steps = np.zeros(size, dtype=np.uint32)
+        self.seeds = np.zeros(size, dtype=np.uint64)
+        # the tools locations, one row per tool (flat indices)
+        self.tools = np.zeros((tools_qty, size), dtype=np.intp)
+        self.reset()
+
+    @property
+    def is_over(self):
+        """This property returns a boolean array, which is True
+        for each game won or lost."""
+        return self.wins | ~self.is_alive
+
+    def reset(self, seeds=None, games=None):
+        """This method starts new games: the games 'games' (indices or
+        boolean mask, by default all the games), with the seeds 'seeds'
+        (by default, random seeds), thus each game is the same as
+        a session started with the same seed (cf. 'GameSession.reset')."""
+        if games is None:
+            games = np.arange(self.size)
+        else:
+            games = np.arange(self.size)[games]
+        if seeds is None:
+            seeds = [random.randrange(GameSession.MAX_SEED) for _ in games]
+        elif len(seeds) != len(games):
+            raise ValueError("{} seeds for {} games".format(len(seeds),
+                                                            len(games)))
+        # the tools are positioned by the labyrinth, one game at a time,
+        # to use the same random draws as a session
+        width = self.labyrinth.width
+        position_tools = self.labyrinth.position_tools_randomly
+        for game, seed in zip(games.tolist(), seeds):
+            tools = position_tools(random.Random(int(seed)), self.tools_qty)
+            self.tools[:, game] = [tool.y_pos * width + tool.x_pos
+                                   for tool in tools]
+        self.seeds[games] = seeds
+        self.positions[games] = self._start
+        self.found[games] = 0
+        self.is_alive[games] = True
+        self.wins[games] = False
+        self.steps[games] = 0
+
+    def step(self, actions):
+        """This method plays one action in each game: 'actions' is an array
+        of action codes, one per game. The games already over are not
+        played. It returns the events, as an array of event codes
+        (cf. EVENTS, -1 for the games already over)."""
+        actions = np.asarray(actions)
+        if actions.shape != (self.size,):
+            raise ValueError(actions.shape)
+        # the negative codes are also caught, as huge unsigned integers
+        if (actions.astype(np.uintp, copy=False) >= len(self._bits)).any():
+            raise ValueError("unknown action code")
+        active = self.is_alive & ~self.wins
+        positions = self.positions
+        # we move the players, if the neighbour location is passable
+        moved = self._passability[positions] & self._bits[actions]
+        moved = moved.astype(bool) & active
+        positions += self._offsets[actions] * moved
+        # we find the tools on the new locations, if not found yet
+        gained = np.zeros(self.size, dtype=np.uint32)
+        for bit, tool_positions in enumerate(self.tools):
+            gained |= (tool_positions == positions).astype(np.uint32) << bit
+        gained &= ~self.found
+        gained *= active
+        self.found |= gained
+        # the player wins or loses when next to the guard
+        near = self._near_exit[positions] & active
+        all_found = self.found == self._all_found
+        win = near & all_found
+        lose = near & ~all_found
+        self.wins |= win
+        self.is_alive &= ~lose
+        # only the accepted actions are counted, as in a session
+        self.steps += moved | gained.astype(bool)
+        # the events, with the same priority as 'GameSession.step'
+        events = moved.astype(np.int8)
+        events[gained.astype(bool)] = EVENT_CODES["tool"]
+        events[win] = EVENT_CODES["win"]
+        events[lose] = EVENT_CODES["lose"]
+        events[~active] = -1
+        return events
+
+    def state(self, game):
+        """This method returns the state of the game 'game'
+        (cf. 'GameState'), as given by a session."""
+        y_pos, x_pos = divmod(int(self.positions[game]),
+                              self.labyrinth.width)
+        found = int(self.found[game])
+        return GameState(x_pos, y_pos,
+                         tuple(bool(found >> i & 1)
+                               for i in range(self.tools_qty)),
+                         bool(self.is_alive[game]), bool(self.wins[game]),
+                         int(self.steps[game]))
+
+    @staticmethod
+    def _build_near_exit(labyrinth):
+        """This protected method returns a read-only boolean array
+        (one item per cell, flat indices), which is True for the
+        neighbours of the guard (cf. 'Labyrinth.analyze_game_status')."""
+        width = labyrinth.width
+        height = labyrinth.height
+        near_exit = np.zeros(width * height, dtype=bool)
+        x_exit, y_exit = labyrinth.x_exit, labyrinth.y_exit
+        if x_exit >= 0:
+            for x_pos, y_pos in ((x_exit, y_exit - 1), (x_exit, y_exit + 1),
+                                 (x_exit - 1, y_exit), (x_exit + 1, y_exit)):
+                if 0 <= x_pos < width and 0 <= y_pos < height:
+                    near_exit[y_pos * width + x_pos] = True
+        near_exit.flags.writeable = False
+        return near_exit
+
+
+def main():
+    """This function is the main function to be executed
+    to measure the throughput of random agents."""
+    parser = argparse.ArgumentParser(
+        description="Play random games in lockstep and measure the "
+        "throughput.")
+    parser.add_argument("map_file", nargs="?",
+                        default=os.path.join("data", "grid.csv"),
+                        help="map file (CSV, or binary if '.laby')")
+    parser.add_argument("-n", "--games", type=int, default=10000,
+                        help="number of games (default: 10000)")
+    parser.add_argument("--steps", type=int, default=1000,
+                        help="number of steps (default: 1000)")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="seed of the games and of the actions "
+                        "(default: 0)")
+    args = parser.parse_args()
+    if args.games < 1 or args.steps < 1:
+        parser.error("the numbers of games and steps have to be positive")
+
+    env = BatchEnv(Labyrinth(args.map_file), args.games)
+    env.reset(range(args.seed, args.seed + args.games))
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, len(GameSession.ACTIONS),
+                           size=(args.steps, args.games), dtype=np.uint8)
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    duration = time.perf_counter() - start
+
+    agent_steps = args.games * args.steps
+    sys.stdout.write("{} games, {} steps: {} won, {} lost, "
+                     "{} running\n".format(
+                         args.games, args.steps, int(env.wins.sum()),
+                         int((~env.is_alive).sum()),
+                         int((~env.is_over).sum())))
+    sys.stderr.write("{:.2f} s, {:.1f} million agent-steps/s\n"
+                     .format(duration, agent_steps / duration / 1e6
+                             if duration else 0.0))
+
+
+if __name__ == "__main__":
+    main()
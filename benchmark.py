@@ -0,0 +1,205 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""Please execute this file with Python to measure the performance
+of the labyrinth logic and of the rendering, on generated maps
+from 15x15 up to 2000x2000, e.g.:
+    python benchmark.py --output baseline.json
+then, after a modification:
+    python benchmark.py --compare baseline.json
+
+Each case (cf. CASES) is timed with 'timeit': the number of calls
+is chosen to last at least 0.2 s, then the best of 'repeat' runs is kept,
+as seconds per call. The results are written as JSON:
+{"meta": {...}, "results": {"<size>": {"<case>": seconds, ...}, ...}}
+With '--compare', the exit status is 1 if a case is slower than
+the baseline by more than the threshold (25 % by default).
+
+The rendering is measured off-screen, with the SDL dummy video driver.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+
+# the rendering is measured without any window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+import mapfile
+from assets import ASSETS
+from batchenv import BatchEnv
+from dashboard import Dashboard
+from generator import generate_grid
+from interface import Interface
+from labyrinth import Labyrinth
+from labyviewer import LabyViewer
+
+
+SIZES = (15, 51, 101, 501, 1001, 2000)  # the maps are squares
+CASES = ("labyrinth_csv", "labyrinth_binary", "analyze_playability",
+         "count_paths", "position_tools_randomly",
+         "authorize_player_movements", "find_tool", "batch_step",
+         "display_labyrinth", "display_labyrinth_cached",
+         "dashboard_display", "dashboard_display_retained")
+SEED = 0  # seed of the generated maps and of the tools positions
+BATCH_SIZE = 10000  # number of games played in lockstep (cf. batchenv.py)
+THRESHOLD = 0.25  # maximal slowdown before a regression is reported
+
+
+def time_call(function, repeat):
+    """This function returns the best time of a call of 'function',
+    in seconds, over 'repeat' runs (cf. module docstring)."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def benchmark_size(size, directory, screen, repeat):
+    """This function returns the time of each case (cf. CASES)
+    on a generated map of 'size' x 'size', as a dictionary.
+    The map files are written in 'directory'."""
+    grid = generate_grid(size, size, SEED)
+    csv_file = os.path.join(directory, "{}.csv".format(size))
+    binary_file = os.path.join(directory,
+                               "{}{}".format(size, mapfile.BINARY_EXTENSION))
+    mapfile.save_grid(grid, csv_file)
+    mapfile.save_grid(grid, binary_file)
+
+    laby = Labyrinth(binary_file)
+    laby.tools = laby.position_tools_randomly(random.Random(SEED))
+    laby.initialize_player_location()
+    sprites_dict = ASSETS.laby_sprites()
+
+    def display_labyrinth():
+        # a new viewer composites the visible chunks again
+        viewer = LabyViewer(laby)
+        viewer.camera.center_on(laby.player.x_pos, laby.player.y_pos)
+        viewer.display_labyrinth(screen, sprites_dict)
+
+    cached_viewer = LabyViewer(laby)
+    cached_viewer.camera.center_on(laby.player.x_pos, laby.player.y_pos)
+    dashboard = Dashboard("game")
+
+    def dashboard_display():
+        # a full redraw
+        dashboard.invalidate()
+        dashboard.display(screen, laby.tools)
+
+    batch_env = BatchEnv(laby, BATCH_SIZE)
+    batch_env.reset(range(SEED, SEED + BATCH_SIZE))
+    batch_actions = np.random.default_rng(SEED).integers(
+        0, 4, size=BATCH_SIZE, dtype=np.uint8)
+
+    rng = random.Random(SEED)
+    functions = {
+        "labyrinth_csv": lambda: Labyrinth(csv_file),
+        "labyrinth_binary": lambda: Labyrinth(binary_file),
+        "analyze_playability": laby.analyze_playability,
+        "count_paths": laby.count_paths,
+        "position_tools_randomly": lambda: laby.position_tools_randomly(rng),
+        "authorize_player_movements": laby.authorize_player_movements,
+        "find_tool": laby.find_tool,
+        "batch_step": lambda: batch_env.step(batch_actions),
+        "display_labyrinth": display_labyrinth,
+        "display_labyrinth_cached":
+            lambda: cached_viewer.display_labyrinth(screen, sprites_dict),
+        "dashboard_display": dashboard_display,
+        "dashboard_display_retained":
+            lambda: dashboard.display(screen, laby.tools)}
+    results = {}
+    for case in CASES:
+        results[case] = time_call(functions[case], repeat)
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """This function returns the list of the cases of 'results'
+    slower than in 'baseline' by more than 'threshold',
+    as tuples (size, case, baseline time, time)."""
+    regressions = []
+    for size, cases in results.items():
+        for case, seconds in cases.items():
+            reference = baseline.get(size, {}).get(case)
+            if reference and seconds > reference * (1 + threshold):
+                regressions.append((size, case, reference, seconds))
+    return regressions
+
+
+def main():
+    """This function is the main function to be executed
+    to run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Measure the performance of the labyrinth logic "
+        "and rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="map sizes (default: {})"
+                        .format(" ".join(map(str, SIZES))))
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="number of runs per case, the best one is kept "
+                        "(default: 3)")
+    parser.add_argument("-o", "--output",
+                        help="JSON file where the results are written")
+    parser.add_argument("-c", "--compare", metavar="BASELINE",
+                        help="JSON file of the results to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=THRESHOLD,
+                        help="maximal slowdown before a regression "
+                        "is reported (default: {})".format(THRESHOLD))
+    args = parser.parse_args()
+    if min(args.sizes) < 5:
+        parser.error("the maps have to be at least 5x5")
+    if args.repeat < 1:
+        parser.error("the number of runs has to be positive")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    pygame.init()
+    screen = pygame.display.set_mode((Interface.SCREEN_WIDTH,
+                                      Interface.SCREEN_HEIGHT))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            sys.stderr.write("{0}x{0}...\n".format(size))
+            results[str(size)] = benchmark_size(size, directory, screen,
+                                                args.repeat)
+    pygame.quit()
+
+    # one line per case, with the baseline time and the ratio if any
+    for size, cases in results.items():
+        for case, seconds in cases.items():
+            line = "{:>5} {:<28} {:>12.3f} us".format(size, case,
+                                                      seconds * 1e6)
+            reference = (baseline or {}).get(size, {}).get(case)
+            if reference:
+                line += "  (baseline {:.3f} us, x{:.2f})".format(
+                    reference * 1e6, seconds / reference)
+            sys.stdout.write(line + "\n")
+    if args.output:
+        meta = {"python": platform.python_version(),
+                "numpy": np.__version__, "pygame": pygame.version.ver,
+                "machine": platform.machine(), "system": platform.system(),
+                "repeat": args.repeat}
+        with open(args.output, "w") as output_file:
+            json.dump({"meta": meta, "results": results}, output_file,
+                      indent=2)
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for size, case, reference, seconds in regressions:
+        sys.stderr.write("regression: {}x{} {} {:.3f} us -> {:.3f} us\n"
+                         .format(size, size, case, reference * 1e6,
+                                 seconds * 1e6))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
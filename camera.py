@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'Camera' class.
+The camera is the part of the labyrinth displayed on the screen
+(the viewport), thus the labyrinth can be larger than the window.
+
+The camera moves by whole sprites: its location is the labyrinth cell
+displayed at the top left angle of the viewport.
+This module does not depend on pygame.
+"""
+
+
+class Camera:
+    """This class allows to move a viewport over a labyrinth,
+    and to convert the labyrinth locations to screen locations."""
+
+    FOLLOW_MARGIN = 4  # minimal distance (in sprites) between the followed
+    #                   location and the viewport sides
+
+    def __init__(self, laby_width, laby_height, view_width, view_height,
+                 origin, sprite_size):
+        """This special method is the class constructor.
+        The viewport is 'view_width' x 'view_height' sprites large,
+        or smaller if the labyrinth is smaller,
+        and its top left angle is located at 'origin' on the screen."""
+        self.laby_width = laby_width  # type is int
+        self.laby_height = laby_height  # type is int
+        self.width = min(view_width, laby_width)  # type is int (in sprites)
+        self.height = min(view_height, laby_height)  # type is int (in sprites)
+        self.origin = origin  # type is tuple (x, y) in pixels
+        self.sprite_size = sprite_size  # type is int (in pixels)
+        # top left visible cell
+        self.x_min = 0  # type is int
+        self.y_min = 0  # type is int
+
+    @property
+    def x_max(self):
+        """This property returns the first column on the right of the
+        viewport."""
+        return self.x_min + self.width
+
+    @property
+    def y_max(self):
+        """This property returns the first row under the viewport."""
+        return self.y_min + self.height
+
+    @property
+    def area(self):
+        """This property returns the viewport on the screen,
+        as a tuple (x, y, width, height) in pixels."""
+        return (self.origin[0], self.origin[1],
+                self.width * self.sprite_size, self.height * self.sprite_size)
+
+    def is_visible(self, x_pos, y_pos):
+        """This method returns True if the cell (x_pos, y_pos) is displayed."""
+        return self.x_min <= x_pos < self.x_max\
+            and self.y_min <= y_pos < self.y_max
+
+    def move_to(self, x_min, y_min):
+        """This method moves the camera, thus the cell (x_min, y_min)
+        is displayed at the top left angle of the viewport.
+        The camera stays inside the labyrinth.
+        It returns True if the camera moved."""
+        x_min = max(0, min(x_min, self.laby_width - self.width))
+        y_min = max(0, min(y_min, self.laby_height - self.height))
+        if (x_min, y_min) == (self.x_min, self.y_min):
+            return False
+        self.x_min = x_min
+        self.y_min = y_min
+        return True
+
+    def pan(self, x_step, y_step):
+        """This method moves the camera by (x_step, y_step) sprites.
+        It returns True if the camera moved."""
+        return self.move_to(self.x_min + x_step, self.y_min + y_step)
+
+    def center_on(self, x_pos, y_pos):
+        """This method moves the camera, thus the cell (x_pos, y_pos)
+        is displayed in the middle of the viewport (if possible).
+        It returns True if the camera moved."""
+        return self.move_to(x_pos - self.width // 2,
+                            y_pos - self.height // 2)
+
+    def follow(self, x_pos, y_pos):
+        """This method moves the camera only if the cell (x_pos, y_pos)
+        is too close to the viewport sides (cf. FOLLOW_MARGIN),
+        thus the camera does not move at each player step.
+        It returns True if the camera moved."""
+        x_min = self._follow_axis(x_pos, self.x_min, self.width)
+        y_min = self._follow_axis(y_pos, self.y_min, self.height)
+        return self.move_to(x_min, y_min)
+
+    def cell_to_screen(self, x_pos, y_pos):
+        """This method returns the screen location (in pixels)
+        of the top left angle of the cell (x_pos, y_pos)."""
+        return (self.origin[0] + (x_pos - self.x_min) * self.sprite_size,
+                self.origin[1] + (y_pos - self.y_min) * self.sprite_size)
+
+    def screen_to_cell(self, x_pixel, y_pixel):
+        """This method returns the cell (x, y) displayed at the screen
+        location (x_pixel, y_pixel), or None outside the viewport."""
+        x_view = (x_pixel - self.origin[0]) // self.sprite_size
+        y_view = (y_pixel - self.origin[1]) // self.sprite_size
+        if 0 <= x_view < self.width and 0 <= y_view < self.height:
+            return (self.x_min + x_view, self.y_min + y_view)
+        return None
+
+    def _follow_axis(self, pos, view_min, view_size):
+        """This protected method returns the new viewport start on one axis,
+        thus 'pos' stays at least at the margin from the viewport sides."""
+        margin = min(self.FOLLOW_MARGIN, (view_size - 1) // 2)
+        if pos < view_min + margin:
+            return pos - margin
+        if pos >= view_min + view_size - margin:
+            return pos - view_size + margin + 1
+        return view_min
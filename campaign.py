@@ -0,0 +1,126 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'Campaign' class.
+A campaign plays the levels of a map pack in turn (cf. mappack module).
+
+While a level is played, the next one is prepared by a background thread:
+its cells are read and decoded, checked (checksum and playability),
+and its indexes are built (landmarks, passability, paths), thus the
+transition to the next level does not wait for the disk nor for the
+validation, even for large maps. The levels which are not playable
+are skipped, with a warning on the standard error.
+"""
+
+import concurrent.futures
+import sys
+
+import numpy as np
+
+from grid import Grid
+from labyrinth import Labyrinth
+from mappack import MapPack
+from session import GameSession
+from validator import PlayabilityValidator
+
+
+class Campaign:
+    """This class gives the playable levels of a map pack in turn,
+    each one prepared in background while the previous one is played."""
+
+    def __init__(self, pack_file, seed=None):
+        """This special method is the class constructor.
+        Only the pack index is read. If 'seed' is given, it replaces
+        the seeds of the levels."""
+        self.pack = MapPack(pack_file)  # type is <class 'MapPack'>
+        self.seed = seed  # type is int or None
+        self.level = None  # type is int (index of the current level)
+        # 'self.skipped' type is list containing the indexes of the levels
+        # which are not playable
+        self.skipped = []
+        # the levels are prepared one at a time, in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="campaign")
+        self._pending = None  # type is concurrent.futures.Future or None
+
+    def __len__(self):
+        """This special method returns the number of levels."""
+        return len(self.pack)
+
+    def info(self):
+        """This method returns the metadata of the current level
+        (cf. 'LevelInfo')."""
+        return self.pack.info(self.level)
+
+    def start(self, level=0):
+        """This method returns the game session of the first playable
+        level from 'level' (cf. 'next_level')."""
+        self._cancel()
+        self._pending = self._executor.submit(self._prepare_from, level)
+        return self.next_level()
+
+    def next_level(self):
+        """This method returns the game session of the next playable level,
+        ready to be played, or None if the campaign is over.
+        The level after it is prepared in background."""
+        if self._pending is None:
+            return None
+        result = self._pending.result()
+        self._pending = None
+        if result is None:
+            return None
+        self.level, session = result
+        if self.level + 1 < len(self.pack):
+            self._pending = self._executor.submit(self._prepare_from,
+                                                  self.level + 1)
+        return session
+
+    def close(self):
+        """This method stops the background preparation,
+        and closes the pack."""
+        self._cancel()
+        self._executor.shutdown(wait=True)
+        self.pack.close()
+
+    def _cancel(self):
+        """This protected method forgets the level being prepared."""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def _prepare_from(self, level):
+        """This protected method returns a tuple (level, game session)
+        for the first playable level from 'level', or None if there is
+        no playable level anymore. It is run by the background thread."""
+        for level in range(level, len(self.pack)):
+            session = self._prepare(level)
+            if session is not None:
+                return level, session
+            self.skipped.append(level)
+            sys.stderr.write("level {} of {} is not playable: skipped\n"
+                             .format(level, self.pack.pack_file))
+        return None
+
+    def _prepare(self, level):
+        """This protected method loads the level 'level', and returns its
+        game session, started with the level seed, or None if the level
+        is corrupted or not playable."""
+        try:
+            grid = self.pack.load_grid(level, verify=True)
+        except (OSError, ValueError):
+            return None
+        # the cells are decoded in memory now (they can be memory-mapped),
+        # thus the first frames do not read the disk
+        grid = Grid(np.array(grid.cells))
+        # the validation also builds the landmark index
+        if not PlayabilityValidator(grid).is_playable():
+            return None
+        # the passability table is built now, rather than on the first move
+        grid.passability
+        labyrinth = Labyrinth.from_grid(grid)
+        session = GameSession(labyrinth)
+        seed = self.seed
+        if seed is None:
+            seed = self.pack.info(level).seed
+        session.reset(seed)
+        return session
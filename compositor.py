@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'FrameCompositor' class.
+The display components (labyrinth viewer, dashboard, loops) report
+the screen areas they modify ("dirty rectangles") to the compositor,
+which pushes only these areas to the screen, once per frame.
+This module uses pygame as main support.
+"""
+
+import pygame
+from pygame.locals import *
+
+
+class FrameCompositor:
+    """This class collects the dirty rectangles of a frame,
+    and updates the display once per frame."""
+
+    def __init__(self):
+        """This special method is the class constructor."""
+        # 'self._rects' type is list containing items of <class 'pygame.Rect'>
+        self._rects = []
+        self._full_update = False  # True if the whole screen has to be pushed
+        # statistics
+        self.frames = 0  # type is int (number of frames pushed)
+        self.pushed_rects = 0  # type is int (number of rectangles pushed)
+
+    def add(self, rect):
+        """This method reports a modified screen area.
+        'rect' can be None (nothing modified), e.g. the result of a method
+        which did not draw anything."""
+        if rect is not None:
+            self._rects.append(pygame.Rect(rect))
+
+    def add_all(self, rects):
+        """This method reports several modified screen areas."""
+        for rect in rects:
+            self.add(rect)
+
+    def invalidate_all(self):
+        """This method reports that the whole screen has been modified."""
+        self._full_update = True
+
+    def present(self):
+        """This method pushes the modified areas to the screen,
+        then starts a new frame. Nothing is done if nothing was modified."""
+        if self._full_update:
+            pygame.display.flip()
+        elif self._rects:
+            pygame.display.update(self._rects)
+            self.pushed_rects += len(self._rects)
+        else:
+            return
+        self.frames += 1
+        self._rects = []
+        self._full_update = False
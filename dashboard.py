@@ -4,191 +4,260 @@
 """This module contains the 'Dashboard' class.
 This allows to display a labyrinth.
 This module uses pygame as main support.
+
+The dashboard is retained: its static parts (titles, labels, squares)
+are drawn once on a layer, then only the tool slots whose 'found' state
+changed and the logic light are drawn again.
 """
 
-import os
+import threading
 
 import pygame
 from pygame.locals import *
 
+from assets import ASSETS
 from interface import Interface
 
 
 class Dashboard:
     """This class allows to create and modify a dashoard."""
 
+    # Our fonts, loaded once (cf. '_load_fonts'),
+    # possibly in a background thread (cf. 'preload_fonts')
+    _fonts = None
+    _fonts_lock = threading.Lock()
+    # Vertical location of each logic light, in sprites
+    LIGHTS_ROWS = {"red": 9, "yellow": 10.5, "green": 12}
+    LIGHTS_COLOURS = {"red": (255, 0, 0), "yellow": (255, 242, 0),
+                      "green": (0, 255, 0)}
+
     def __init__(self, mode):
         """This special method is the class constructor."""
+        if mode not in ["game", "edit"]:
+            raise ValueError("This mode is not permitted!")
         self.mode = mode  # type is str
         self.origin = Interface.DASHBOARD_ORIGIN
         self.logic_light = "yellow"  # possible values: "red"/"yellow"/"green"
+        # 'self._static_layer' type is pygame.Surface (built on first display)
+        self._static_layer = None
+        self._layer_names = None  # type is list of str (tools on the layer)
+        # what is currently displayed on the screen
+        self._shown_found = None  # type is list of bool (one item per tool)
+        self._shown_light = None  # type is str
+
+    @property
+    def area(self):
+        """This property returns the screen area of the dashboard."""
+        return pygame.Rect(self.origin,
+                           (Interface.SCREEN_WIDTH - self.origin[0],
+                            Interface.SCREEN_HEIGHT - self.origin[1]))
 
     def display(self, screen, tools=[]):
-        """This method displays the dashboard.
+        """This method displays the dashboard,
+        and returns the list of the modified screen areas (pygame.Rect).
+        Only the parts which changed since the last call are drawn.
+        We assume that pygame has been initialized."""
+        if self.logic_light not in self.LIGHTS_ROWS:
+            raise ValueError(self.logic_light)
+        found = [tool.found for tool in tools]
+        names = [tool.name for tool in tools]
+        if self._static_layer is None or names != self._layer_names:
+            self._static_layer = self._build_static_layer(tools)
+            self._layer_names = names
+            self._shown_found = None
+        if self._shown_found is None:
+            # full redraw
+            screen.blit(self._static_layer, self.origin)
+            for i, tool in enumerate(tools):
+                if tool.found:
+                    self._draw_tool(screen, i, tool)
+            self._draw_light(screen, self.logic_light, True)
+            self._shown_found = found
+            self._shown_light = self.logic_light
+            return [self.area]
+        rects = []
+        # 1.2. Items: the tools found since the last call
+        for i, tool in enumerate(tools):
+            if found[i] != self._shown_found[i]:
+                rects.append(self._draw_tool(screen, i, tool))
+        self._shown_found = found
+        # 2.2. Logic light (red/yellow/green)
+        if self.logic_light != self._shown_light:
+            rects.append(self._draw_light(screen, self._shown_light, False))
+            rects.append(self._draw_light(screen, self.logic_light, True))
+            self._shown_light = self.logic_light
+        return rects
+
+    def invalidate(self):
+        """This method forces a full redraw on the next display,
+        e.g. after the screen has been restored."""
+        self._shown_found = None
+
+    @classmethod
+    def preload_fonts(cls):
+        """This method looks up our fonts in a background thread,
+        thus the first display does not wait for the whole lookup.
+        We assume that the pygame font module has been initialized."""
+        thread = threading.Thread(target=cls._load_fonts, daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def _load_fonts(cls):
+        """This protected method returns our fonts (title, text),
+        loaded only once since the system font lookup is slow.
+        We assume that pygame has been initialized."""
+        with cls._fonts_lock:
+            if cls._fonts is None:
+                font_title = pygame.font.SysFont('Arial', 16, bold=True)
+                font_txt = pygame.font.SysFont('Arial', 14)
+                cls._fonts = (font_title, font_txt)
+        return cls._fonts
+
+    def _build_static_layer(self, tools):
+        """This protected method draws the static parts of the dashboard
+        on a transparent layer, with the same size as the dashboard area.
         We assume that pygame has been initialized."""
         side = Interface.SPRITE_SIZE
-        # Our fonts
-        font_title = pygame.font.SysFont('Arial', 16, bold=True)
-        font_txt = pygame.font.SysFont('Arial', 14)
-        fonts = (font_title, font_txt)
+        fonts = self._load_fonts()
+        layer = pygame.Surface(self.area.size, SRCALPHA)
         # 1. First section
         # 1.1. Title
-        title_1 = ""
         if self.mode == "game":
             title_1 = "Tools found until now:"
-        elif self.mode == "edit":
-            title_1 = "Click to select, right click to release:"
         else:
-            raise ValueError("This mode is not permitted!")
-        screen.blit(fonts[0].render(title_1, False, (0, 0, 0)),
-                    (self.origin[0], self.origin[1]))
+            title_1 = "Click to select, right click to release:"
+        layer.blit(fonts[0].render(title_1, False, (0, 0, 0)), (0, 0))
         # 1.2. Items
         # This depends on mode (cf. _game_display and _edit_display)
         # 2. Second section
         # 2.1. Title
-        screen.blit(fonts[0].render('Status:', False, (0, 0, 0)),
-                    (self.origin[0], self.origin[1] + 8 * side))
+        layer.blit(fonts[0].render('Status:', False, (0, 0, 0)),
+                   (0, 8 * side))
         # Draw the black squares
-        pygame.draw.rect(screen, (0, 0, 0),
-                         (self.origin[0], self.origin[1] + 9 * side,
-                          side, side))
-        pygame.draw.rect(screen, (0, 0, 0),
-                         (self.origin[0], self.origin[1] + 10.5 * side,
-                          side, side))
-        pygame.draw.rect(screen, (0, 0, 0),
-                         (self.origin[0], self.origin[1] + 12 * side,
-                          side, side))
+        for row in self.LIGHTS_ROWS.values():
+            pygame.draw.rect(layer, (0, 0, 0), (0, row * side, side, side))
+            self._draw_square(layer, 0, row * side)
         # 2.2. Logic light (red/yellow/green)
-        if self.logic_light == "red":
-            y_light = self.origin[1] + 9 * side
-            colour = (255, 0, 0)
-        elif self.logic_light == "yellow":
-            y_light = self.origin[1] + 10.5 * side
-            colour = (255, 242, 0)
-        elif self.logic_light == "green":
-            y_light = self.origin[1] + 12 * side
-            colour = (0, 255, 0)
-        else:
-            raise ValueError(self.logic_light)
-        # Draw the logic light
-        pygame.draw.rect(screen, colour, (self.origin[0], y_light, side, side))
-        self._draw_square(screen, 0, 9 * side)
-        self._draw_square(screen, 0, 10.5 * side)
-        self._draw_square(screen, 0, 12 * side)
+        # This is drawn on the screen (cf. _draw_light)
         # 2.3. Logic light description
         # This depends on mode (cf. _game_display and _edit_display)
         # 3. Third section
-        screen.blit(fonts[0].render("Press 'Esc' to quit",
-                                    False, (0, 0, 0)),
-                    (self.origin[0], self.origin[1] + 14 * side))
+        layer.blit(fonts[0].render("Press 'Esc' to quit", False, (0, 0, 0)),
+                   (0, 14 * side))
         # We call the protected methods
         if self.mode == "game":
-            self._game_display(screen, tools, side, fonts)
-        elif self.mode == "edit":
-            self._edit_display(screen, side, fonts)
+            self._game_display(layer, tools, side, fonts)
         else:
-            raise ValueError("This mode is not permitted!")
-        # Screen refresh
-        pygame.display.flip()
+            self._edit_display(layer, side, fonts)
+        return layer
 
-    def _draw_square(self, screen, x_pos, y_pos):
+    def _draw_light(self, screen, light, lit):
+        """This protected method draws the logic light 'light',
+        with its colour if 'lit', otherwise in black.
+        It returns the modified screen area (pygame.Rect)."""
+        side = Interface.SPRITE_SIZE
+        y_light = self.LIGHTS_ROWS[light] * side
+        colour = self.LIGHTS_COLOURS[light] if lit else (0, 0, 0)
+        pygame.draw.rect(screen, colour, (self.origin[0],
+                                          self.origin[1] + y_light,
+                                          side, side))
+        self._draw_square(screen, self.origin[0], self.origin[1] + y_light)
+        return pygame.Rect(self.origin[0], self.origin[1] + y_light,
+                           side + 1, side + 1)
+
+    def _draw_tool(self, screen, index, tool):
+        """This protected method fills the square of the tool 'index'
+        with the tool sprite.
+        It returns the modified screen area (pygame.Rect)."""
+        y_tool = self.origin[1] + self._slot_y(index)
+        return screen.blit(ASSETS.get("tools", tool.name),
+                           (self.origin[0], y_tool))
+
+    @staticmethod
+    def _slot_y(index):
+        """This protected method returns the vertical location of the item
+        'index' of the first section, relatively to the dashboard origin."""
+        return (2*index + (1 - 0.5*index)) * Interface.SPRITE_SIZE
+
+    @staticmethod
+    def _draw_square(surface, x_pos, y_pos):
         """This protected method displays a transparent square,
         with the same size as the sprites.
-        The top left angle is located at (x_pos, y_pos).
+        The top left angle is located at (x_pos, y_pos) on 'surface'.
         We assume that pygame has been initialized."""
         # We draw an "empty" square by drawing only the sides
         black = (0, 0, 0)
         side = Interface.SPRITE_SIZE
         # top side
-        pygame.draw.rect(screen, black, (self.origin[0] + x_pos,
-                                         self.origin[1] + y_pos,
-                                         side, 1))
+        pygame.draw.rect(surface, black, (x_pos, y_pos, side, 1))
         # bottom side
-        pygame.draw.rect(screen, black, (self.origin[0] + x_pos,
-                                         self.origin[1] + y_pos + side,
-                                         side, 1))
+        pygame.draw.rect(surface, black, (x_pos, y_pos + side, side, 1))
         # left side
-        pygame.draw.rect(screen, black, (self.origin[0] + x_pos,
-                                         self.origin[1] + y_pos,
-                                         1, side))
+        pygame.draw.rect(surface, black, (x_pos, y_pos, 1, side))
         # right side
-        pygame.draw.rect(screen, black, (self.origin[0] + x_pos + side,
-                                         self.origin[1] + y_pos,
-                                         1, side))
-        # Screen refresh
-        pygame.display.flip()
-
-    def _edit_display(self, screen, side, fonts):
-        """This protected method displays the dashboard in edit mode.
-        This protected method can be only called by the method "game_display".
+        pygame.draw.rect(surface, black, (x_pos + side, y_pos, 1, side))
+
+    def _edit_display(self, layer, side, fonts):
+        """This protected method draws the static layer in edit mode.
+        This protected method can be only called by the method
+        "_build_static_layer".
         We assume that pygame has been initialized."""
         # 1.2. Items
-        red_cross = pygame.image.load("sprites\\edit\\red_cross.png").convert()
         for i in range(4):
-            y_sprite = self.origin[1] + ((2*i + (1 - 0.5*i)) * side)
-            # We fill the square with the sprite if the tool is found
+            y_sprite = self._slot_y(i)
             if i == 0:
-                spr = pygame.image.load("sprites\\laby\\wall.png").convert()
+                spr = ASSETS.get("laby", "wall")
                 sprite_name = "Wall"
             elif i == 1:
-                spr = pygame.image.load("sprites\\laby\\path.png").convert()
+                spr = ASSETS.get("laby", "path")
                 sprite_name = "Path"
             elif i == 2:
-                spr = pygame.image.load("sprites\\laby\\m_gyver.png").convert()
+                spr = ASSETS.get("laby", "m_gyver")
                 sprite_name = "Start"
             elif i == 3:
-                spr = pygame.image.load("sprites\\laby\\guard.png").convert()
+                spr = ASSETS.get("laby", "guard")
                 sprite_name = "Exit"
-            screen.blit(spr, (self.origin[0], y_sprite))
+            layer.blit(spr, (0, y_sprite))
             # We draw a square
-            self._draw_square(screen, 0, y_sprite - self.origin[1])
+            self._draw_square(layer, 0, y_sprite)
             # We display the sprite name
-            screen.blit(fonts[1].render(sprite_name, False, (0, 0, 0)),
-                        (self.origin[0] + side + 10,
-                         y_sprite + 10))
+            layer.blit(fonts[1].render(sprite_name, False, (0, 0, 0)),
+                       (side + 10, y_sprite + 10))
         # 2.3. Logic light description
-        screen.blit(fonts[1].render("=> Warning: this labyrinth may be wrong!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 9 * side + 10))
-        screen.blit(fonts[1].render("=> Feel free to edit this labyrinth!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 10.5 * side + 10))
-        screen.blit(fonts[1].render("=> This labyrinth is playable!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 12 * side + 10))
-
-    def _game_display(self, screen, tools, side, fonts):
-        """This protected method displays the dashboard in game mode.
-        This protected method can be only called by the method "game_display".
+        layer.blit(fonts[1].render("=> Warning: this labyrinth may be wrong!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 9 * side + 10))
+        layer.blit(fonts[1].render("=> Feel free to edit this labyrinth!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 10.5 * side + 10))
+        layer.blit(fonts[1].render("=> This labyrinth is playable!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 12 * side + 10))
+
+    def _game_display(self, layer, tools, side, fonts):
+        """This protected method draws the static layer in game mode.
+        This protected method can be only called by the method
+        "_build_static_layer".
         We assume that pygame has been initialized."""
         # 1.2. Items
         for i, tool in enumerate(tools):
-            y_tool = self.origin[1] + ((2*i + (1 - 0.5*i)) * side)
+            y_tool = self._slot_y(i)
             # We draw an "empty" square
-            self._draw_square(screen, 0, y_tool - self.origin[1])
+            self._draw_square(layer, 0, y_tool)
             # We display the tool name
-            screen.blit(fonts[1].render(tool.name, False, (0, 0, 0)),
-                        (self.origin[0] + side + 10, y_tool + 10))
-            # We fill the square with the sprite if the tool is found
-            if tool.found:
-                sprite_path = os.path.join("sprites", "tools",
-                                           tool.name + ".png")
-                screen.blit(pygame.image.load(sprite_path).convert(),
-                            (self.origin[0], y_tool))
+            layer.blit(fonts[1].render(tool.name, False, (0, 0, 0)),
+                       (side + 10, y_tool + 10))
+            # The square is filled with the sprite if the tool is found
+            # (cf. _draw_tool)
         # 2. Second section
         # 2.3. Logic light description
-        screen.blit(fonts[1].render("=> You lose... The guard kills you!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 9 * side + 10))
-        screen.blit(fonts[1].render("=> You are alive, good luck!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 10.5 * side + 10))
-        screen.blit(fonts[1].render("=> You win! Congratulations!",
-                                    False, (0, 0, 0)),
-                    (self.origin[0] + side + 10,
-                     self.origin[1] + 12 * side + 10))
+        layer.blit(fonts[1].render("=> You lose... The guard kills you!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 9 * side + 10))
+        layer.blit(fonts[1].render("=> You are alive, good luck!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 10.5 * side + 10))
+        layer.blit(fonts[1].render("=> You win! Congratulations!",
+                                   False, (0, 0, 0)),
+                   (side + 10, 12 * side + 10))
@@ -3,44 +3,175 @@
 
 """Please execute this file with Python to edit the labyrinth map."""
 
+# the startup module is imported first, to time the next imports
+# (cf. '--startup-profile')
+import startup
+
+import argparse
 import os
 
 import pygame
 from pygame.locals import *
 
+import instrument
+from assets import ASSETS, WHITE
 from interface import Interface
 from labyrinth import Labyrinth
 from labyviewer import LabyViewer
+from autosave import AutoSaver
 from dashboard import Dashboard
+from history import EditHistory
+from scheduler import FrameScheduler
+from validator import PlayabilityValidator
+
+
+# logic light colour in the dashboard, depending on the labyrinth playability
+LOGIC_LIGHTS = {True: "green", False: "red"}
+# delay (in seconds) without any edit before saving the labyrinth
+AUTOSAVE_DELAY = 0.5
+# camera moves (in sprites) for the arrow keys
+PAN_STEPS = {K_UP: (0, -1), K_DOWN: (0, 1), K_LEFT: (-1, 0), K_RIGHT: (1, 0)}
+FRAME_RATE = 60  # maximal number of frames per second
+# memory (in bytes) used to undo and redo the edits (cf. history module)
+HISTORY_BUDGET = 1 << 20
+# grid value of each sprite which can be selected
+SPRITES_INT = {"sand_path": 0, "wall": 1, "guard": 2, "m_gyver": 3}
+# the sprites decoded in background at startup
+EDIT_SPRITES = [("backs", "sea"), ("edit", "green_tick"),
+                ("edit", "red_cross")]\
+    + [("laby", name) for name in ("wall", "path", "guard", "m_gyver")]
+
+
+def line_cells(x_0, y_0, x_1, y_1):
+    """This function returns the locations of the segment from (x_0, y_0)
+    to (x_1, y_1), both included, each one next to the previous one
+    (horizontally or vertically), thus a fast mouse move paints
+    a continuous line."""
+    cells = [(x_0, y_0)]
+    dx = abs(x_1 - x_0)
+    dy = abs(y_1 - y_0)
+    x_step = 1 if x_1 > x_0 else -1
+    y_step = 1 if y_1 > y_0 else -1
+    error = dx - dy
+    while (x_0, y_0) != (x_1, y_1):
+        if 2 * error > -dy and (2 * error >= dx or error > 0):
+            error -= dy
+            x_0 += x_step
+        else:
+            error += dx
+            y_0 += y_step
+        cells.append((x_0, y_0))
+    return cells
+
+
+def paint_cell(window, edit_interface, edit_laby, validator, x_cell, y_cell,
+               value):
+    """This function assigns 'value' to the cell (x_cell, y_cell),
+    updates the playability state and the display of this cell only,
+    and returns the old value (None if the cell is not modified)."""
+    old_value = edit_laby.grid.get(x_cell, y_cell)
+    if old_value == value:
+        return None
+    # we update the labyrinth
+    edit_laby.grid.set(x_cell, y_cell, value)
+    # we update the playability state for this cell only
+    validator.apply(x_cell, y_cell, old_value, value)
+    # we update the labyrinth viewer:
+    # only this cell is composited again
+    edit_interface.compositor.add(edit_interface.laby_viewer.update_cell(
+        window, x_cell, y_cell))
+    return old_value
+
 
+def paint_cells(window, edit_interface, edit_laby, validator, history,
+                cells, value):
+    """This function assigns 'value' to the cells 'cells' (list of (x, y)),
+    records the modified cells in the current stroke of 'history',
+    and returns True if a cell is modified."""
+    modified = False
+    for x_cell, y_cell in cells:
+        old_value = paint_cell(window, edit_interface, edit_laby, validator,
+                               x_cell, y_cell, value)
+        if old_value is not None:
+            history.record(x_cell, y_cell, old_value, value)
+            modified = True
+    return modified
 
-def edit_loop(window, edit_interface, edit_laby, sprites_dict, csv_path):
+
+def edit_loop(window, edit_interface, edit_laby, sprites_dict, csv_path,
+              fps=FRAME_RATE):
     """This function is the main loop used in edit module.
+    The events are read once per frame (cf. scheduler module).
+    The cells are painted with the left button (click or drag),
+    each stroke can be undone (Ctrl+Z) and redone (Ctrl+Y).
     We assume that pygame has been initialized."""
 
     # we enable key repeat
     pygame.key.set_repeat(200, 40)
     # we set some variables
     db_origin = Interface.DASHBOARD_ORIGIN
-    laby_origin = Interface.LABY_ORIGIN
+    camera = edit_interface.laby_viewer.camera
     side = Interface.SPRITE_SIZE
     select_spr = ""
-    green_tick = pygame.image.load("sprites\\edit\\green_tick.png").convert()
-    red_cross = pygame.image.load("sprites\\edit\\red_cross.png").convert()
+    # the validator is updated incrementally for each modified cell
+    validator = PlayabilityValidator(edit_laby.grid)
+    laby_changed = True
+    # the labyrinth is saved in the background, once the edits stop
+    autosaver = AutoSaver(edit_laby.grid, csv_path, AUTOSAVE_DELAY)
+    # the edits, to undo and redo them
+    history = EditHistory(edit_laby.width, HISTORY_BUDGET)
+    painting = None  # grid value painted while the left button is pressed
+    last_cell = None  # last cell painted by the current stroke
+    green_tick = ASSETS.get("edit", "green_tick")
+    red_cross = ASSETS.get("edit", "red_cross")
+    # the screen is updated once per frame, with the modified areas only
+    compositor = edit_interface.compositor
     # we display a red cross next to each item
     for i in range(4):
-        window.blit(red_cross, (db_origin[0] + side * 4,
-                                db_origin[1] + ((2*i + (1 - 0.5*i)) * side)))
+        compositor.add(window.blit(red_cross,
+                                   (db_origin[0] + side * 4,
+                                    db_origin[1]
+                                    + ((2*i + (1 - 0.5*i)) * side))))
     # screen refresh
-    pygame.display.flip()
+    compositor.present()
+    # the events are read frame by frame, without busy waiting
+    scheduler = FrameScheduler(fps)
 
     while True:
-        for event in pygame.event.get():
-            if event.type not in [QUIT, KEYDOWN, MOUSEBUTTONDOWN]:
+        camera_moved = False
+        laby_edited = False
+        for event in scheduler.wait_events():
+            if event.type not in [QUIT, KEYDOWN, MOUSEBUTTONDOWN,
+                                  MOUSEBUTTONUP, MOUSEMOTION]:
                 continue
             elif (event.type == KEYDOWN and event.key == K_ESCAPE)\
                     or event.type == QUIT:
+                # we save the last edits before quitting
+                if laby_edited:
+                    autosaver.request_save()
+                autosaver.close()
                 exit()
+            # if we undo (Ctrl+Z) or redo (Ctrl+Y, Ctrl+Shift+Z) a stroke
+            elif event.type == KEYDOWN and event.mod & KMOD_CTRL\
+                    and event.key in [K_z, K_y]:
+                painting = None
+                if event.key == K_y or event.mod & KMOD_SHIFT:
+                    deltas = [(x_cell, y_cell, new) for x_cell, y_cell, _, new
+                              in history.redo()]
+                else:
+                    deltas = [(x_cell, y_cell, old) for x_cell, y_cell, old, _
+                              in history.undo()]
+                # only the cells of the stroke are displayed and checked
+                for x_cell, y_cell, value in deltas:
+                    paint_cell(window, edit_interface, edit_laby, validator,
+                               x_cell, y_cell, value)
+                if deltas:
+                    laby_changed = True
+                    laby_edited = True
+            # if we move the camera with the arrow keys
+            elif event.type == KEYDOWN and event.key in PAN_STEPS:
+                if camera.pan(*PAN_STEPS[event.key]):
+                    camera_moved = True
             # if we click left
             elif event.type == MOUSEBUTTONDOWN and event.button == 1:
                 x_click = event.pos[0]
@@ -52,135 +183,169 @@ def edit_loop(window, edit_interface, edit_laby, sprites_dict, csv_path):
                     if y_click >= db_origin[1] + side * 1\
                             and y_click < db_origin[1] + side * 2:
                         select_spr = "wall"
-                        window.blit(green_tick,
-                                    (db_origin[0] + side * 4,
-                                     db_origin[1] + side * 1))
+                        compositor.add(window.blit(green_tick,
+                                                   (db_origin[0] + side * 4,
+                                                    db_origin[1] + side * 1)))
                     # if we click on the "Path" sprite
                     elif y_click >= db_origin[1] + side * 2.5\
                             and y_click < db_origin[1] + side * 3.5:
                         select_spr = "sand_path"
-                        window.blit(green_tick,
-                                    (db_origin[0] + side * 4,
-                                     db_origin[1] + side * 2.5))
+                        compositor.add(window.blit(
+                            green_tick, (db_origin[0] + side * 4,
+                                         db_origin[1] + side * 2.5)))
                     # if we click on the "Start" sprite (m_gyver)
                     elif y_click >= db_origin[1] + side * 4\
                             and y_click < db_origin[1] + side * 5:
                         select_spr = "m_gyver"
-                        window.blit(green_tick,
-                                    (db_origin[0] + side * 4,
-                                     db_origin[1] + side * 4))
+                        compositor.add(window.blit(green_tick,
+                                                   (db_origin[0] + side * 4,
+                                                    db_origin[1] + side * 4)))
                     # if we click on the "Exit" sprite (guard)
                     elif y_click >= db_origin[1] + side * 5.5\
                             and y_click < db_origin[1] + side * 6.5:
                         select_spr = "guard"
-                        window.blit(green_tick,
-                                    (db_origin[0] + side * 4,
-                                     db_origin[1] + side * 5.5))
-                    # screen refresh
-                    pygame.display.flip()
+                        compositor.add(window.blit(
+                            green_tick, (db_origin[0] + side * 4,
+                                         db_origin[1] + side * 5.5)))
                 # if we want to replace a sprite in the map
-                elif x_click >= laby_origin[0]\
-                        and x_click < laby_origin[0] + side * edit_laby.width\
-                        and y_click >= laby_origin[1]\
-                        and y_click < laby_origin[1] + side * edit_laby.height:
-                    sprites_int = {"sand_path": 0, "wall": 1,
-                                   "guard": 2, "m_gyver": 3}
-                    # if a sprite is selected
-                    if select_spr != "":
-                        # we update the labyrinth
-                        edit_laby.grid.iloc[int((y_click -\
-                                                 laby_origin[1]) / side),
-                                            int((x_click -\
-                                                 laby_origin[0]) / side)]\
-                                            = sprites_int[select_spr]
-                        # we save the labyrinth
-                        edit_laby.save_grid_to_file(csv_path)
-                        # we update the labyrinth viewer
-                        # this first blit is useful for "m_gyver" and "guard"
-                        window.blit(sprites_dict["sand_path"],
-                                    (int((x_click - laby_origin[0]) / side)\
-                                            * side + laby_origin[0],
-                                     int((y_click - laby_origin[1]) / side)\
-                                            * side + laby_origin[1]))
-                        # this second blit is the "main" blit
-                        window.blit(sprites_dict[select_spr],
-                                    (int((x_click - laby_origin[0]) / side)\
-                                            * side + laby_origin[0],
-                                     int((y_click - laby_origin[1]) / side)\
-                                            * side + laby_origin[1]))
-
+                # (the click is located through the camera),
+                # a stroke starts, until the button is released
+                elif camera.screen_to_cell(x_click, y_click) is not None\
+                        and select_spr != "":
+                    painting = SPRITES_INT[select_spr]
+                    last_cell = camera.screen_to_cell(x_click, y_click)
+                    history.begin_stroke()
+                    if paint_cells(window, edit_interface, edit_laby,
+                                   validator, history, [last_cell],
+                                   painting):
+                        laby_changed = True
+                        laby_edited = True
+            # if we drag with the left button, the stroke goes on
+            elif event.type == MOUSEMOTION and painting is not None:
+                cell = camera.screen_to_cell(*event.pos)
+                if cell is not None and cell != last_cell:
+                    # the cells between the mouse positions are painted too
+                    if paint_cells(window, edit_interface, edit_laby,
+                                   validator, history,
+                                   line_cells(*last_cell, *cell)[1:],
+                                   painting):
+                        laby_changed = True
+                        laby_edited = True
+                    last_cell = cell
+            # if we release the left button, the stroke ends
+            elif event.type == MOUSEBUTTONUP and event.button == 1:
+                painting = None
+                history.end_stroke()
             # if we click right
             elif event.type == MOUSEBUTTONDOWN and event.button == 3:
                 # we unselect the selected sprite
                 select_spr = ""
                 # we erase the "green tick"
-                window.blit(red_cross,
-                            (db_origin[0] + side * 4,
-                             db_origin[1] + side * 1))
-                window.blit(red_cross,
-                            (db_origin[0] + side * 4,
-                             db_origin[1] + side * 2.5))
-                window.blit(red_cross,
-                            (db_origin[0] + side * 4,
-                             db_origin[1] + side * 4))
-                window.blit(red_cross,
-                            (db_origin[0] + side * 4,
-                             db_origin[1] + side * 5.5))
-            # we analyze the map to update the logic light in the dashboard
-            if edit_laby.analyze_playability():
-                edit_interface.dashboard.logic_light = "green"
-            else:
-                edit_interface.dashboard.logic_light = "red"
+                compositor.add(window.blit(red_cross,
+                                           (db_origin[0] + side * 4,
+                                            db_origin[1] + side * 1)))
+                compositor.add(window.blit(red_cross,
+                                           (db_origin[0] + side * 4,
+                                            db_origin[1] + side * 2.5)))
+                compositor.add(window.blit(red_cross,
+                                           (db_origin[0] + side * 4,
+                                            db_origin[1] + side * 4)))
+                compositor.add(window.blit(red_cross,
+                                           (db_origin[0] + side * 4,
+                                            db_origin[1] + side * 5.5)))
+        # we save the labyrinth (in the background), once per frame
+        # as the grid is copied for the saver
+        if laby_edited:
+            autosaver.request_save()
+        # the labyrinth is displayed again once per frame, if needed
+        if camera_moved:
+            compositor.add(edit_interface.laby_viewer.display_labyrinth(
+                window, sprites_dict))
+        # we analyze the map to update the logic light in the dashboard,
+        # only if the labyrinth has been modified
+        if laby_changed:
+            edit_interface.dashboard.logic_light =\
+                LOGIC_LIGHTS[validator.is_playable()]
+            laby_changed = False
             # we display our dashboard
             edit_interface.display_dashboard(window)
-            # screen refresh
-            pygame.display.flip()
+        # screen refresh, with the modified areas only
+        compositor.present()
+        scheduler.end_frame()
 
 
 def main():
     """This function is the main function to be executed to edit the map."""
 
-    pygame.init()
+    # the map file can be given on the command line
+    parser = argparse.ArgumentParser(description="Edit a labyrinth.")
+    parser.add_argument("map_file", nargs="?",
+                        default=os.path.join("data", "grid.csv"),
+                        help="map file (CSV, or binary if '.laby')")
+    parser.add_argument("--fps", type=int, default=FRAME_RATE,
+                        help="maximal number of frames per second "
+                        "(default: {})".format(FRAME_RATE))
+    parser.add_argument("--profile", nargs="?",
+                        const=instrument.DEFAULT_OUTPUT, metavar="OUTPUT",
+                        help="count and time the key calls, and write them "
+                        "to OUTPUT.json and OUTPUT.trace.json on exit "
+                        "(default: {}, cf. instrument.py)"
+                        .format(instrument.DEFAULT_OUTPUT))
+    parser.add_argument(startup.OPTION, action="store_true",
+                        help="print the imports and startup phases "
+                        "durations")
+    args = parser.parse_args()
+    if args.fps <= 0:
+        parser.error("the frame rate has to be positive")
+    # the instrumentation is disabled, unless it is required
+    instrument.setup(args.profile)
+    csv_path = args.map_file
+
+    startup.PROFILE.mark("imports, arguments")
+
+    # the sprites are decoded and the fonts are looked up in background,
+    # while the labyrinth is built and the window is opened;
+    # only the pygame modules we need are initialized
+    # (the events are initialized with the display)
+    ASSETS.preload(EDIT_SPRITES)
+    pygame.font.init()
+    Dashboard.preload_fonts()
 
     # we build the labyrinth
-    csv_path = os.path.join("data", "grid.csv")
-    edit_laby = Labyrinth(LabyViewer.LABY_WIDTH, LabyViewer.LABY_HEIGHT,
-                          csv_path)
+    edit_laby = Labyrinth(csv_path)
+    startup.PROFILE.mark("labyrinth")
 
     # we initialize the main window with our game interface
+    pygame.display.init()
     window = pygame.display.set_mode((Interface.SCREEN_WIDTH,
                                       Interface.SCREEN_HEIGHT))
-    edit_back = pygame.image.load("sprites\\backs\\sea.png").convert()
+    pygame.display.set_caption("Mac Gyverinth - edit mode - by etienne86")
+    startup.PROFILE.mark("window")
+    edit_back = ASSETS.get("backs", "sea")
     edit_labyviewer = LabyViewer(edit_laby)
     edit_dashboard = Dashboard("edit")
     edit_interface = Interface(edit_back, edit_labyviewer, edit_dashboard)
     window.blit(edit_back, Interface.SCREEN_ORIGIN)
 
-    # we load our sprites
-    m_gyver = pygame.image.load("sprites\\laby\\m_gyver.png").convert()
-    m_gyver.set_colorkey((255, 255, 255))  # set white as transparent
-    sand_path = pygame.image.load("sprites\\laby\\path.png").convert()
-    wall = pygame.image.load("sprites\\laby\\wall.png").convert()
-    guard = pygame.image.load("sprites\\laby\\guard.png").convert()
-    guard.set_colorkey((255, 255, 255))  # set white as transparent
-
     # we improve our window
-    mac_g_a = pygame.image.load("sprites\\laby\\m_gyver.png").convert_alpha()
-    mac_g_a.set_colorkey((255, 255, 255))  # set white as transparent
+    mac_g_a = ASSETS.get("laby", "m_gyver", WHITE, alpha=True)
     pygame.display.set_icon(mac_g_a)
-    pygame.display.set_caption("Mac Gyverinth - edit mode - by etienne86")
-    pygame.display.flip()
 
     # we display our labyrinth with walls, paths, guard and player
-    sprites_dict = {"wall": wall, "sand_path": sand_path,
-                    "guard": guard, "m_gyver": m_gyver}
+    sprites_dict = ASSETS.laby_sprites()
     edit_labyviewer.display_labyrinth(window, sprites_dict)
 
     # we display our dashboard
     edit_interface.display_dashboard(window)
+    # screen refresh
+    edit_interface.compositor.invalidate_all()
+    edit_interface.compositor.present()
+    startup.PROFILE.mark("first frame")
+    startup.PROFILE.report(background={"sprites": ASSETS.preload_time})
 
     # we execute our edit loop
-    edit_loop(window, edit_interface, edit_laby, sprites_dict, csv_path)
+    edit_loop(window, edit_interface, edit_laby, sprites_dict, csv_path,
+              args.fps)
 
     pygame.quit()
 
@@ -3,76 +3,122 @@
 
 """Please execute this file with Python to launch a labyrinth game."""
 
+# the startup module is imported first, to time the next imports
+# (cf. '--startup-profile')
+import startup
+
+import argparse
 import os
 
 import pygame
 from pygame.locals import *
 
+import instrument
+import mappack
+from assets import ASSETS, ASSETS_READY, WHITE
+from campaign import Campaign
 from interface import Interface
 from labyrinth import Labyrinth
 from labyviewer import LabyViewer
 from dashboard import Dashboard
+from scheduler import FrameScheduler
+from session import GameSession
+from solver import RouteSolver
+from tool import Tool
+
+
+# player moves for the arrow keys
+KEY_ACTIONS = {K_UP: "up", K_DOWN: "down", K_LEFT: "left", K_RIGHT: "right"}
+HINT_LENGTH = 8  # number of moves displayed by the hint
+DEMO_DELAY = 150  # delay (in milliseconds) between two moves in demo mode
+FRAME_RATE = 60  # maximal number of frames per second
+GAME_BACK = ("backs", "blue_sky")  # background sprite (category, name)
+BACK_PLACEHOLDER = (110, 165, 225)  # background colour until it is decoded
+# the sprites decoded in background at startup
+GAME_SPRITES = [GAME_BACK] + [("laby", name) for name in ("wall", "path",
+                                                          "guard", "m_gyver")]\
+    + [("tools", name) for name in Tool.TOOLS_NAMES]
+
 
+def hint_cells(solver, player):
+    """This function returns the next locations of the best route
+    from the player location, to the next target (tool or guard)."""
+    try:
+        order, _ = solver.plan(player.x_pos, player.y_pos)
+    except ValueError:
+        # the labyrinth is not playable: no hint
+        return []
+    return solver.path(player.x_pos, player.y_pos, order[0], HINT_LENGTH)
 
-def game_loop(window, game_interface, game_laby, game_player, sprites_dict):
-    """This function is the main loop used in game module.
+
+def game_loop(window, game_interface, session, sprites_dict, solver,
+              hint=False, demo=False, fps=FRAME_RATE):
+    """This function is the main loop used in game module,
+    it returns when the game is over (the player wins or loses).
+    The game rules are applied by the game session (cf. session module),
+    this loop only reads the keys and updates the screen, once per frame
+    (cf. scheduler module).
+    If 'hint' is True, the next moves of the best route are displayed
+    ('h' key to switch). If 'demo' is True, the game plays alone.
     We assume that pygame has been initialized."""
 
     # we enable key repeat
     pygame.key.set_repeat(200, 40)
 
     # we set some variables:
-    # graphic variables
-    x_0 = Interface.LABY_ORIGIN[0]
-    y_0 = Interface.LABY_ORIGIN[1]
-    # labyrinth variables
-    x_player = x_0 + (game_player.x_pos * Interface.SPRITE_SIZE)
-    y_player = y_0 + (game_player.y_pos * Interface.SPRITE_SIZE)
-
-    cont = True
-    while cont and game_player.is_alive and not game_player.wins:
-        for event in pygame.event.get():
-            # we update the authorized movements for the player
-            game_laby.authorize_player_movements()
+    # the screen is updated once per frame, with the modified areas only
+    compositor = game_interface.compositor
+    laby_viewer = game_interface.laby_viewer
+    game_laby = session.labyrinth
+    game_player = session.player
+    # the events are read frame by frame, without busy waiting
+    scheduler = FrameScheduler(fps)
+    next_demo_move = pygame.time.get_ticks()
+    if hint:
+        compositor.add_all(laby_viewer.display_hint(
+            window, hint_cells(solver, game_player)))
+        compositor.present()
+
+    while not session.is_over:
+        timeout = None
+        if demo:
+            timeout = next_demo_move - pygame.time.get_ticks()
+        actions = []
+        for event in scheduler.wait_events(timeout):
             if (event.type == KEYDOWN and event.key == K_ESCAPE)\
                     or event.type == QUIT:
                 exit()
-            elif event.type == KEYDOWN and event.key == K_UP\
-                    and game_player.authorized_movements["up"]:
-                # we erase the player sprite
-                window.blit(sprites_dict["sand_path"], (x_player, y_player))
-                # we update the player location in the labyrinth
-                game_player.move("up")
-            elif event.type == KEYDOWN and event.key == K_DOWN\
-                    and game_player.authorized_movements["down"]:
-                # we erase the player sprite
-                window.blit(sprites_dict["sand_path"], (x_player, y_player))
-                # we update the player location in the labyrinth
-                game_player.move("down")
-            elif event.type == KEYDOWN and event.key == K_LEFT\
-                    and game_player.authorized_movements["left"]:
-                # we erase the player sprite
-                window.blit(sprites_dict["sand_path"], (x_player, y_player))
-                # we update the player location in the labyrinth
-                game_player.move("left")
-            elif event.type == KEYDOWN and event.key == K_RIGHT\
-                    and game_player.authorized_movements["right"]:
-                # we erase the player sprite
-                window.blit(sprites_dict["sand_path"], (x_player, y_player))
-                # we update the player location in the labyrinth
-                game_player.move("right")
-            # we check if the player find a tool
-            game_laby.find_tool()
-            # we check if the player wins or loses
-            game_laby.analyze_game_status()
-            # we update the player location on the screen
-            x_player = x_0 + (game_player.x_pos * Interface.SPRITE_SIZE)
-            y_player = y_0 + (game_player.y_pos * Interface.SPRITE_SIZE)
-            window.blit(sprites_dict["m_gyver"], (x_player, y_player))
-            # we update the dashboard
-            game_interface.display_dashboard(window, game_laby.tools)
-            # screen refresh
-            pygame.display.flip()
+            elif event.type == KEYDOWN and event.key == K_h:
+                # we show or hide the hint
+                hint = not hint
+                cells = hint_cells(solver, game_player) if hint else []
+                compositor.add_all(laby_viewer.display_hint(window, cells))
+            elif event.type == KEYDOWN and event.key in KEY_ACTIONS\
+                    and not demo:
+                actions.append(KEY_ACTIONS[event.key])
+            elif event.type == ASSETS_READY\
+                    and ASSETS.get(*GAME_BACK) is not game_interface.back:
+                # the background placeholder is replaced by the sprite
+                game_interface.back = ASSETS.get(*GAME_BACK)
+                display_all(window, game_interface, session, sprites_dict)
+                if hint:
+                    compositor.add_all(laby_viewer.display_hint(
+                        window, hint_cells(solver, game_player)))
+        if demo and pygame.time.get_ticks() >= next_demo_move:
+            # the solver chooses the move (its distance fields are cached)
+            try:
+                actions.append(solver.next_move(game_player.x_pos,
+                                                game_player.y_pos))
+            except ValueError:
+                # the labyrinth is not playable: the player takes over
+                demo = False
+            next_demo_move = pygame.time.get_ticks() + DEMO_DELAY
+        if actions:
+            play_actions(window, game_interface, session, sprites_dict,
+                         solver, actions, hint)
+        # screen refresh, with the modified areas only
+        compositor.present()
+        scheduler.end_frame()
 
     if game_player.wins:
         game_interface.dashboard.logic_light = "green"
@@ -81,62 +127,242 @@ def game_loop(window, game_interface, game_laby, game_player, sprites_dict):
     # we display our dashboard
     game_interface.display_dashboard(window, game_laby.tools)
     # screen refresh
-    pygame.display.flip()
+    compositor.present()
+
+
+def wait_for_exit():
+    """This function waits for the player to quit, at the end of the game
+    (the scheduler blocks between events)."""
+    scheduler = FrameScheduler()
     while True:
-        for event in pygame.event.get():
+        for event in scheduler.wait_events():
             if (event.type == KEYDOWN and event.key == K_ESCAPE)\
                     or event.type == QUIT:
                 exit()
 
 
+def display_all(window, game_interface, session, sprites_dict):
+    """This function displays the whole window: the background,
+    the visible part of the labyrinth with the tools and the player,
+    and the dashboard."""
+    laby_viewer = game_interface.laby_viewer
+    player = session.player
+    window.blit(game_interface.back, Interface.SCREEN_ORIGIN)
+    game_interface.display_labyrinth_with_tools(window, sprites_dict)
+    window.blit(sprites_dict["m_gyver"],
+                laby_viewer.camera.cell_to_screen(player.x_pos,
+                                                  player.y_pos))
+    game_interface.dashboard.invalidate()
+    game_interface.display_dashboard(window, session.labyrinth.tools)
+    game_interface.compositor.invalidate_all()
+
+
+def play_actions(window, game_interface, session, sprites_dict, solver,
+                 actions, hint):
+    """This function plays the moves 'actions' of a frame,
+    then updates the screen once."""
+    compositor = game_interface.compositor
+    laby_viewer = game_interface.laby_viewer
+    game_player = session.player
+    x_old = game_player.x_pos
+    y_old = game_player.y_pos
+    # we play the moves
+    moved = False
+    for action in actions:
+        if action is None:
+            continue
+        state, game_event = session.step(action)
+        if game_event != "blocked":
+            moved = True
+        if game_event == "tool":
+            # we erase the tool sprite
+            compositor.add(laby_viewer.restore_cell(window, state.x_pos,
+                                                    state.y_pos))
+        if session.is_over:
+            break
+    if not moved:
+        return
+    # we erase the player sprite
+    compositor.add(laby_viewer.restore_cell(window, x_old, y_old))
+    # the camera follows the player: if it moves,
+    # we display again the visible part of the labyrinth
+    if laby_viewer.camera.follow(game_player.x_pos, game_player.y_pos):
+        game_interface.display_labyrinth_with_tools(window, sprites_dict)
+    # we update the hint
+    if hint:
+        compositor.add_all(laby_viewer.display_hint(
+            window, hint_cells(solver, game_player)))
+    # we update the player location on the screen
+    compositor.add(window.blit(
+        sprites_dict["m_gyver"],
+        laby_viewer.camera.cell_to_screen(game_player.x_pos,
+                                          game_player.y_pos)))
+    # we update the dashboard (only the changes are drawn)
+    game_interface.display_dashboard(window, session.labyrinth.tools)
+
+
+def window_caption(campaign=None):
+    """This function returns the window caption,
+    with the level number and its par in a campaign."""
+    if campaign is None:
+        return "Mac Gyverinth - game mode - by etienne86"
+    info = campaign.info()
+    par = "" if info.par is None else " (par: {})".format(info.par)
+    return "Mac Gyverinth - game mode - level {}/{}{} - by etienne86"\
+        .format(info.index + 1, len(campaign), par)
+
+
+def start_level(window, game_back, session, sprites_dict):
+    """This function builds the game interface of the labyrinth
+    of 'session', displays it around the player, and returns it."""
+    # the player sprite is displayed separately from the labyrinth
+    game_labyviewer = LabyViewer(session.labyrinth, show_start=False)
+    game_dashboard = Dashboard("game")
+    game_interface = Interface(game_back, game_labyviewer, game_dashboard)
+    game_labyviewer.camera.center_on(session.player.x_pos,
+                                     session.player.y_pos)
+    display_all(window, game_interface, session, sprites_dict)
+    # screen refresh
+    game_interface.compositor.present()
+    return game_interface
+
+
+def save_level_run(session, run_file, map_file, level=None):
+    """This function records the game of 'session' in 'run_file'
+    (cf. replay module). In a campaign, each level is recorded
+    in its own run file, e.g. 'run-3.run' for the level 3 of the pack
+    'map_file'."""
+    from replay import save_run
+    if level is not None:
+        root, extension = os.path.splitext(run_file)
+        run_file = "{}-{}{}".format(root, level, extension)
+        map_file = mappack.level_name(map_file, level)
+    save_run(session, run_file, map_file)
+
+
 def main():
     """This function is the main function to be executed to play the game."""
 
-    pygame.init()
+    # the map file can be given on the command line
+    parser = argparse.ArgumentParser(description="Play a labyrinth.")
+    parser.add_argument("map_file", nargs="?",
+                        default=os.path.join("data", "grid.csv"),
+                        help="map file (CSV, or binary if '.laby'), "
+                        "or map pack (cf. mappack.py) to play its levels "
+                        "in turn")
+    parser.add_argument("--level", type=int, default=0,
+                        help="first level played in a map pack "
+                        "(default: 0)")
+    parser.add_argument("--hint", action="store_true",
+                        help="display the next moves of the best route "
+                        "(or press 'h' during the game)")
+    parser.add_argument("--demo", action="store_true",
+                        help="the game plays alone, with the best route")
+    parser.add_argument("--seed", type=int,
+                        help="seed of the tools positions "
+                        "(default: the level seed in a map pack, "
+                        "otherwise a random seed)")
+    parser.add_argument("--record", metavar="RUN_FILE",
+                        help="record the game in a run file, "
+                        "which can be replayed with replay.py "
+                        "(one run file per level in a map pack)")
+    parser.add_argument("--fps", type=int, default=FRAME_RATE,
+                        help="maximal number of frames per second "
+                        "(default: {})".format(FRAME_RATE))
+    parser.add_argument("--profile", nargs="?",
+                        const=instrument.DEFAULT_OUTPUT, metavar="OUTPUT",
+                        help="count and time the key calls, and write them "
+                        "to OUTPUT.json and OUTPUT.trace.json on exit "
+                        "(default: {}, cf. instrument.py)"
+                        .format(instrument.DEFAULT_OUTPUT))
+    parser.add_argument(startup.OPTION, action="store_true",
+                        help="print the imports and startup phases "
+                        "durations")
+    args = parser.parse_args()
+    if args.fps <= 0:
+        parser.error("the frame rate has to be positive")
+    if args.seed is not None and not 0 <= args.seed < GameSession.MAX_SEED:
+        parser.error("the seed has to be between 0 and {}"
+                     .format(GameSession.MAX_SEED - 1))
+    if args.level < 0:
+        parser.error("the level has to be positive")
+    # the instrumentation is disabled, unless it is required
+    instrument.setup(args.profile)
+    startup.PROFILE.mark("imports, arguments")
 
-    # we build the labyrinth, with the player and the tools to be found
-    csv_path = os.path.join("data", "grid.csv")
-    game_laby = Labyrinth(LabyViewer.LABY_WIDTH, LabyViewer.LABY_HEIGHT,
-                          csv_path)
-    game_laby.initialize_player_location()
-    game_player = game_laby.player
-    game_tools = game_laby.tools
+    # the sprites are decoded and the fonts are looked up in background,
+    # while the labyrinth is built and the window is opened;
+    # only the pygame modules we need are initialized
+    # (the events are initialized with the display)
+    ASSETS.preload(GAME_SPRITES)
+    pygame.font.init()
+    Dashboard.preload_fonts()
+
+    # we build the labyrinth, with the player and the tools to be found:
+    # with a map pack, the levels are played in turn (cf. campaign module)
+    campaign = None
+    if mappack.is_map_pack(args.map_file):
+        campaign = Campaign(args.map_file, args.seed)
+        session = campaign.start(args.level)
+        if session is None:
+            parser.error("no playable level in {}".format(args.map_file))
+    else:
+        session = GameSession(Labyrinth(args.map_file))
+        session.reset(args.seed)
+    startup.PROFILE.mark("labyrinth")
 
     # we initialize the main window with our game interface
+    pygame.display.init()
     window = pygame.display.set_mode((Interface.SCREEN_WIDTH,
                                       Interface.SCREEN_HEIGHT))
-    game_back = pygame.image.load("sprites\\backs\\blue_sky.png").convert()
-    game_labyviewer = LabyViewer(game_laby)
-    game_dashboard = Dashboard("game")
-    game_interface = Interface(game_back, game_labyviewer, game_dashboard)
-    window.blit(game_back, Interface.SCREEN_ORIGIN)
-
-    # we load our sprites
-    m_gyver = pygame.image.load("sprites\\laby\\m_gyver.png").convert()
-    m_gyver.set_colorkey((255, 255, 255))  # set white as transparent
-    sand_path = pygame.image.load("sprites\\laby\\path.png").convert()
-    wall = pygame.image.load("sprites\\laby\\wall.png").convert()
-    guard = pygame.image.load("sprites\\laby\\guard.png").convert()
-    guard.set_colorkey((255, 255, 255))  # set white as transparent
+    pygame.display.set_caption(window_caption(campaign))
+    startup.PROFILE.mark("window")
+    # the background is displayed once decoded (cf. 'game_loop'),
+    # we do not wait for it
+    if ASSETS.is_ready(*GAME_BACK):
+        game_back = ASSETS.get(*GAME_BACK)
+    else:
+        game_back = pygame.Surface(window.get_size())
+        game_back.fill(BACK_PLACEHOLDER)
 
     # we improve our window
-    mac_g_a = pygame.image.load("sprites\\laby\\m_gyver.png").convert_alpha()
-    mac_g_a.set_colorkey((255, 255, 255))  # set white as transparent
+    mac_g_a = ASSETS.get("laby", "m_gyver", WHITE, alpha=True)
     pygame.display.set_icon(mac_g_a)
-    pygame.display.set_caption("Mac Gyverinth - game mode - by etienne86")
-    pygame.display.flip()
-
-    # we display our labyrinth with walls, paths, guard and player
-    sprites_dict = {"wall": wall, "sand_path": sand_path,
-                    "guard": guard, "m_gyver": m_gyver}
-    game_labyviewer.display_labyrinth(window, sprites_dict)
-    # we display our tools in the labyrinth
-    game_labyviewer.display_tools_in_labyrinth(window)
-    # we display our dashboard
-    game_interface.display_dashboard(window, game_tools)
 
-    # we execute our game loop
-    game_loop(window, game_interface, game_laby, game_player, sprites_dict)
+    # we display our labyrinth with walls, paths, guard, tools and player,
+    # around the player, and our dashboard
+    sprites_dict = ASSETS.laby_sprites()
+    game_interface = start_level(window, game_back, session, sprites_dict)
+    startup.PROFILE.mark("first frame")
+    startup.PROFILE.report(background={"sprites": ASSETS.preload_time})
+
+    # we execute our game loop, level after level in a campaign
+    try:
+        while True:
+            game_loop(window, game_interface, session, sprites_dict,
+                      RouteSolver(session.labyrinth), args.hint, args.demo,
+                      args.fps)
+            if campaign is None or not session.player.wins:
+                break
+            if args.record:
+                save_level_run(session, args.record, args.map_file,
+                               campaign.level)
+            # the next level is already prepared
+            next_session = campaign.next_level()
+            if next_session is None:
+                break
+            session = next_session
+            pygame.display.set_caption(window_caption(campaign))
+            game_interface = start_level(window, game_interface.back,
+                                         session, sprites_dict)
+        wait_for_exit()
+    finally:
+        # the game is recorded when the player quits
+        if args.record:
+            save_level_run(session, args.record, args.map_file,
+                           None if campaign is None else campaign.level)
+        if campaign is not None:
+            campaign.close()
 
     pygame.quit()
 
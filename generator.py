@@ -0,0 +1,284 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module generates playable labyrinths, of any size
+(at least MIN_SIZE x MIN_SIZE), which respect all the rules
+of 'Labyrinth.analyze_playability'.
+
+The maze is carved with numpy, without any loop over the cells:
+- the rooms are the locations with odd coordinates,
+- each room opens the wall on its right or below it, randomly
+("binary tree" maze), thus every room is connected to the others,
+- the maze is flipped randomly, thus the long corridors of the binary
+tree are not always on the same sides,
+- 'loop_density' opens other walls between rooms (i.e. creates loops),
+- 'corridor_density' fills dead ends with walls, until the free locations
+are this fraction of the carved ones (1.0 keeps them all),
+- the location to win is a dead end room next to an edge, and the guard
+is on the edge next to it, thus rule #6 is respected,
+- the start point is a random free location.
+If a dimension is even, a column (or a row) of walls is added on the side
+opposite to the guard.
+
+Please execute this file with Python to generate map files, e.g.:
+    python generator.py 101 101 --count 100 --seed 1 --output generated
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import numpy as np
+
+import mapfile
+from grid import Grid
+
+
+MIN_SIZE = 5
+# the edges: name -> (x, y) step from the location to win to the guard
+EDGES = {"left": (-1, 0), "right": (1, 0), "top": (0, -1), "bottom": (0, 1)}
+
+
+def generate_cells(width, height, seed=None, loop_density=0.0,
+                   corridor_density=1.0):
+    """This function returns the cells of a new playable labyrinth,
+    as a numpy array (uint8, shape (height, width)).
+    The same 'seed' always gives the same labyrinth."""
+    if width < MIN_SIZE or height < MIN_SIZE:
+        raise ValueError((width, height))
+    if not 0 <= loop_density <= 1:
+        raise ValueError(loop_density)
+    if not 0 <= corridor_density <= 1:
+        raise ValueError(corridor_density)
+    rng = np.random.default_rng(seed)
+    # the maze is carved with odd dimensions, then padded if needed
+    cells = _carve_maze(rng, width - 1 + width % 2, height - 1 + height % 2)
+    x_win, y_win, edge = _choose_win_location(rng, cells)
+    if loop_density:
+        _open_loops(rng, cells, loop_density, x_win, y_win)
+    if corridor_density < 1:
+        _fill_dead_ends(rng, cells, corridor_density, x_win, y_win)
+    # the guard, on the edge next to the location to win
+    cells[y_win + EDGES[edge][1], x_win + EDGES[edge][0]] = 2
+    # the start point, anywhere except on the location to win
+    # (the guard and the player cannot be neighbours, rule #5)
+    free = cells == 0
+    free[y_win, x_win] = False
+    rows, cols = np.nonzero(free)
+    k = rng.integers(len(rows))
+    cells[rows[k], cols[k]] = 3
+    # the padding is added on the side opposite to the guard
+    if width % 2 == 0:
+        pad = (1, 0) if edge == "right" else (0, 1)
+        cells = np.pad(cells, ((0, 0), pad), constant_values=1)
+    if height % 2 == 0:
+        pad = (1, 0) if edge == "bottom" else (0, 1)
+        cells = np.pad(cells, (pad, (0, 0)), constant_values=1)
+    return cells
+
+
+def generate_grid(width, height, seed=None, loop_density=0.0,
+                  corridor_density=1.0):
+    """This function returns a new playable labyrinth as a 'Grid'
+    (cf. 'generate_cells')."""
+    return Grid(generate_cells(width, height, seed, loop_density,
+                               corridor_density))
+
+
+def generate_files(count, width, height, output, seed=0, loop_density=0.0,
+                   corridor_density=1.0, extension=mapfile.BINARY_EXTENSION,
+                   jobs=1):
+    """This generator writes 'count' labyrinths in the directory 'output',
+    with the seeds 'seed', 'seed + 1', etc. (one file per seed),
+    in 'jobs' processes, and yields the paths of the written files."""
+    os.makedirs(output, exist_ok=True)
+    tasks = [(os.path.join(output, "maze_{:08d}{}".format(seed + i,
+                                                          extension)),
+              width, height, seed + i, loop_density, corridor_density)
+             for i in range(count)]
+    if jobs == 1 or count < 2:
+        for task in tasks:
+            yield _generate_file(task)
+        return
+    chunksize = max(1, count // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        for map_file in executor.map(_generate_file, tasks,
+                                     chunksize=chunksize):
+            yield map_file
+
+
+def _generate_file(task):
+    """This protected function generates a labyrinth and writes it,
+    with 'task' = (map_file, width, height, seed, loop_density,
+    corridor_density). It returns the map file path."""
+    map_file = task[0]
+    mapfile.save_grid(generate_grid(*task[1:]), map_file)
+    return map_file
+
+
+def _carve_maze(rng, width, height):
+    """This protected function returns a "binary tree" maze,
+    with odd dimensions, and flipped randomly."""
+    rows = (height - 1) // 2  # number of rooms in a column
+    cols = (width - 1) // 2  # number of rooms in a row
+    cells = np.ones((height, width), dtype=np.uint8)
+    cells[1::2, 1::2] = 0
+    # each room opens the wall on its right or below it,
+    # except in the last row (right only) and in the last column (below)
+    east = rng.random((rows, cols)) < 0.5
+    east[-1, :] = True
+    east[:, -1] = False
+    south = ~east
+    south[-1, :] = False
+    # the walls between the rooms are at one odd and one even coordinate
+    cells[1::2, 2::2][east] = 0
+    cells[2::2, 1::2][south] = 0
+    # we flip the maze randomly (the rooms stay at odd coordinates)
+    if rng.random() < 0.5:
+        cells = cells[:, ::-1]
+    if rng.random() < 0.5:
+        cells = cells[::-1, :]
+    if width == height and rng.random() < 0.5:
+        cells = cells.T
+    return np.ascontiguousarray(cells)
+
+
+def _free_neighbours(cells):
+    """This protected function returns the number of free neighbours
+    (up, down, left, right) of each location."""
+    free = np.pad(cells != 1, 1).astype(np.uint8)
+    return free[:-2, 1:-1] + free[2:, 1:-1] + free[1:-1, :-2] + free[1:-1, 2:]
+
+
+def _choose_win_location(rng, cells):
+    """This protected function returns the location to win (x, y),
+    which is a dead end room next to an edge, and the edge name.
+    The corner rooms where the carving starts always are dead ends,
+    thus there is at least one candidate."""
+    height, width = cells.shape
+    dead_ends = (cells == 0) & (_free_neighbours(cells) == 1)
+    # the rooms next to each edge
+    candidates = []
+    for edge, dead_end_rooms in (("left", dead_ends[:, 1]),
+                                 ("right", dead_ends[:, width - 2]),
+                                 ("top", dead_ends[1, :]),
+                                 ("bottom", dead_ends[height - 2, :])):
+        for i in np.nonzero(dead_end_rooms)[0].tolist():
+            if edge == "left":
+                candidates.append((1, i, edge))
+            elif edge == "right":
+                candidates.append((width - 2, i, edge))
+            elif edge == "top":
+                candidates.append((i, 1, edge))
+            else:
+                candidates.append((i, height - 2, edge))
+    return candidates[rng.integers(len(candidates))]
+
+
+def _open_loops(rng, cells, loop_density, x_win, y_win):
+    """This protected function opens each wall between two rooms
+    with the probability 'loop_density', except the walls around
+    the location to win (rule #6)."""
+    walls = np.zeros(cells.shape, dtype=bool)
+    walls[1:-1:2, 2:-1:2] = True  # between two rooms of the same row
+    walls[2:-1:2, 1:-1:2] = True  # between two rooms of the same column
+    walls &= cells == 1
+    walls[max(0, y_win - 1):y_win + 2, max(0, x_win - 1):x_win + 2] = False
+    cells[walls & (rng.random(cells.shape) < loop_density)] = 0
+
+
+def _fill_dead_ends(rng, cells, corridor_density, x_win, y_win):
+    """This protected function fills dead ends with walls,
+    until the free locations are 'corridor_density' times
+    the initial ones. Filling a dead end never splits the labyrinth.
+    We keep at least 4 free locations (the player and 3 tools).
+
+    The dead ends are filled layer by layer, from a queue: only the
+    neighbours of the filled locations can become new dead ends, thus
+    each location is handled once, whatever the corridors length.
+    When a layer has more dead ends than needed, they are chosen
+    randomly."""
+    free_qty = np.count_nonzero(cells == 0)
+    excess = free_qty - max(4, int(free_qty * corridor_density))
+    if excess <= 0:
+        return
+    width = cells.shape[1]
+    flat = cells.reshape(-1)  # a view of the cells (flat indices)
+    counts = _free_neighbours(cells).reshape(-1)
+    win = y_win * width + x_win
+    # the dead ends are inside the labyrinth, thus their neighbours
+    # are inside the grid; the queue is kept sorted (row by row)
+    offsets = np.array([-width, width, -1, 1])
+    dead_ends = np.flatnonzero((flat == 0) & (counts == 1))
+    dead_ends = dead_ends[dead_ends != win]
+    while excess > 0 and len(dead_ends):
+        if len(dead_ends) > excess:
+            dead_ends = dead_ends[rng.choice(len(dead_ends), excess,
+                                             replace=False)]
+        flat[dead_ends] = 1
+        excess -= len(dead_ends)
+        # the free neighbours lose a free neighbour
+        neighbours = (dead_ends[:, np.newaxis] + offsets).ravel()
+        neighbours = neighbours[flat[neighbours] != 1]
+        np.subtract.at(counts, neighbours, 1)
+        neighbours = np.unique(neighbours)
+        dead_ends = neighbours[(flat[neighbours] == 0)
+                               & (counts[neighbours] == 1)
+                               & (neighbours != win)]
+
+
+def main():
+    """This function is the main function to be executed
+    to generate map files."""
+    parser = argparse.ArgumentParser(
+        description="Generate playable labyrinth map files.")
+    parser.add_argument("width", type=int, help="number of columns")
+    parser.add_argument("height", type=int, help="number of rows")
+    parser.add_argument("-n", "--count", type=int, default=1,
+                        help="number of labyrinths (default: 1)")
+    parser.add_argument("-s", "--seed", type=int, default=None,
+                        help="seed of the first labyrinth "
+                        "(the next ones use the next seeds)")
+    parser.add_argument("--loops", type=float, default=0.0,
+                        help="loop density, from 0 (perfect maze) to 1")
+    parser.add_argument("--corridors", type=float, default=1.0,
+                        help="corridor density, from 1 (all the dead ends) "
+                        "down to 0 (no dead end)")
+    parser.add_argument("-f", "--format", choices=["laby", "csv"],
+                        default="laby",
+                        help="map file format (default: binary, "
+                        "the fastest to load)")
+    parser.add_argument("-o", "--output", default="generated",
+                        help="output directory (default: generated)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of processes (default: one per core)")
+    args = parser.parse_args()
+    if min(args.width, args.height) < MIN_SIZE:
+        parser.error("the labyrinth has to be at least {0}x{0}"
+                     .format(MIN_SIZE))
+    if not 0 <= args.loops <= 1 or not 0 <= args.corridors <= 1:
+        parser.error("the densities have to be between 0 and 1")
+    if args.jobs < 1:
+        parser.error("the number of processes has to be positive")
+    seed = args.seed
+    if seed is None:
+        seed = int(np.random.default_rng().integers(2 ** 31))
+    extension = ".csv" if args.format == "csv" else mapfile.BINARY_EXTENSION
+
+    start = time.perf_counter()
+    for map_file in generate_files(args.count, args.width, args.height,
+                                   args.output, seed, args.loops,
+                                   args.corridors, extension,
+                                   min(args.jobs, args.count)):
+        sys.stdout.write(map_file + "\n")
+    duration = time.perf_counter() - start
+    cells = args.count * args.width * args.height
+    sys.stderr.write("{} labyrinths, {:.2f} s, {:.1f} million cells/s\n"
+                     .format(args.count, duration,
+                             cells / duration / 1e6 if duration else 0.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'Grid' class.
+This is the storage engine of the labyrinth map.
+
+The cells are stored in a contiguous numpy array of unsigned bytes,
+with one row per labyrinth row, i.e. the cell (x, y) is 'cells[y, x]'.
+The grid also maintains a landmark index: the number of cells for each
+value, and the locations of the exit ('2') and start ('3') cells.
+This index is built on first use, then updated in O(1) on every write,
+thus all the writes have to go through 'set' or 'set_block'.
+These writes also increment the grid version, which allows the users
+of the grid to keep data computed from it until it changes.
+
+The grid also maintains a passability table: for each cell, a mask of 4 bits
+(cf. DIRECTION_BITS) telling if each neighbour is a passable cell
+(cf. PASSABLE_VALUES). It is built in one vectorized pass on first use,
+then only the neighbours of a modified cell are patched.
+
+The CSV file format is the historical one:
+a header row (e.g. 'a;b;c;...'), then one line per row,
+with the cell values separated by semicolons.
+"""
+
+import contextlib
+import os
+import string
+import tempfile
+import zlib
+
+import numpy as np
+
+
+@contextlib.contextmanager
+def atomic_write(file_path, mode="w"):
+    """This function opens a temporary file next to 'file_path' for writing,
+    then renames it as 'file_path' once it is completely written.
+    Thus a crash never leaves a half-written file."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_desc, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        newline = None if "b" in mode else ""
+        with os.fdopen(file_desc, mode, newline=newline) as stream:
+            yield stream
+            stream.flush()
+            os.fsync(stream.fileno())
+        # the new file keeps the permissions of the replaced one
+        try:
+            permissions = os.stat(file_path).st_mode & 0o777
+        except FileNotFoundError:
+            permissions = 0o644
+        os.chmod(tmp_path, permissions)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class Grid:
+    """This class stores the labyrinth cells and gives typed access to them."""
+
+    LANDMARK_VALUES = (2, 3)  # values whose locations are indexed
+    PASSABLE_VALUES = (0, 3)  # values of the cells where the player can go
+    # bit of each direction in the passability masks
+    DIRECTION_BITS = {"up": 1, "down": 2, "left": 4, "right": 8}
+
+    def __init__(self, cells, header=None):
+        """This special method is the class constructor."""
+        # 'self.cells' type is numpy.ndarray (uint8, shape (height, width))
+        self.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        if self.cells.ndim != 2 or not self.cells.size:
+            raise ValueError(self.cells.shape)
+        # 'self.header' type is list containing items of <class 'str'>
+        if header is None:
+            header = self.default_header(self.width)
+        self.header = header
+        self.version = 0  # type is int (incremented by each write)
+        # landmark index, built on first use (cf. '_build_index')
+        self._counts = None  # type is list of int (one item per byte value)
+        self._landmarks = None  # type is dict: value -> dict of (x, y)
+        # passability table, built on first use (cf. 'passability')
+        self._passability = None  # type is numpy.ndarray (uint8)
+
+    @property
+    def width(self):
+        """This property returns the number of columns."""
+        return self.cells.shape[1]
+
+    @property
+    def height(self):
+        """This property returns the number of rows."""
+        return self.cells.shape[0]
+
+    @property
+    def passability(self):
+        """This property returns the passability table: an array with the
+        same shape as the cells, whose item (y, x) is the mask of the
+        directions (cf. DIRECTION_BITS) where the neighbour is passable."""
+        if self._passability is None:
+            self._passability = self._build_passability()
+        return self._passability
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """This method builds a grid from a CSV file
+        (header row, then the cell values separated with ';')."""
+        with open(csv_file, "r") as csv_stream:
+            header = csv_stream.readline().strip().split(";")
+            cells = np.loadtxt(csv_stream, delimiter=";", dtype=np.uint8,
+                               ndmin=2)
+        return cls(cells, header)
+
+    @staticmethod
+    def default_header(width):
+        """This method returns a header row with 'width' unique names:
+        'a' to 'z', then 'aa', 'ab', etc."""
+        header = []
+        letters = string.ascii_lowercase
+        for i in range(width):
+            name = ""
+            i += 1
+            while i > 0:
+                i, rest = divmod(i - 1, len(letters))
+                name = letters[rest] + name
+            header.append(name)
+        return header
+
+    def checksum(self):
+        """This method returns the CRC-32 of the cells (one byte per cell,
+        row by row), which identifies the map."""
+        return zlib.crc32(self.cells.tobytes())
+
+    def copy(self):
+        """This method returns an independent copy of the grid."""
+        return Grid(self.cells.copy(), list(self.header))
+
+    def get(self, x_pos, y_pos):
+        """This method returns the value of the cell (x_pos, y_pos)."""
+        return self.cells.item(y_pos, x_pos)
+
+    def set(self, x_pos, y_pos, value):
+        """This method assigns 'value' to the cell (x_pos, y_pos)."""
+        old_value = self.cells.item(y_pos, x_pos)
+        self.cells[y_pos, x_pos] = value
+        self.version += 1
+        # we update the landmark index, if it is built
+        if self._counts is not None:
+            value = self.cells.item(y_pos, x_pos)
+            self._counts[old_value] -= 1
+            self._counts[value] += 1
+            if old_value in self._landmarks:
+                del self._landmarks[old_value][(x_pos, y_pos)]
+            if value in self._landmarks:
+                self._landmarks[value][(x_pos, y_pos)] = None
+        # we patch the passability table of the neighbours, if it is built
+        if self._passability is not None:
+            value = self.cells.item(y_pos, x_pos)
+            is_passable = value in self.PASSABLE_VALUES
+            if is_passable != (old_value in self.PASSABLE_VALUES):
+                self._patch_passability(x_pos, y_pos, is_passable)
+
+    def get_row(self, y_pos):
+        """This method returns a read-only view on the row 'y_pos'."""
+        return self._read_only(self.cells[y_pos, :])
+
+    def get_column(self, x_pos):
+        """This method returns a read-only view on the column 'x_pos'."""
+        return self._read_only(self.cells[:, x_pos])
+
+    def get_block(self, x_min, y_min, x_max, y_max):
+        """This method returns a read-only view on the cells (x, y)
+        with x_min <= x < x_max and y_min <= y < y_max."""
+        return self._read_only(self.cells[y_min:y_max, x_min:x_max])
+
+    def set_block(self, x_min, y_min, values):
+        """This method copies the 2D array 'values' into the grid,
+        with its top left cell located at (x_min, y_min)."""
+        values = np.asarray(values, dtype=np.uint8)
+        height, width = values.shape
+        self.cells[y_min:y_min + height, x_min:x_min + width] = values
+        self.version += 1
+        # the landmark index and the passability table
+        # will be rebuilt on next use
+        self._counts = None
+        self._landmarks = None
+        self._passability = None
+
+    def count(self, value):
+        """This method returns the number of cells equal to 'value'."""
+        if self._counts is None:
+            self._build_index()
+        return self._counts[value]
+
+    def locate(self, value):
+        """This method returns the locations (x, y) of the cells
+        equal to 'value', row by row.
+        'value' has to be one of the LANDMARK_VALUES."""
+        if self._counts is None:
+            self._build_index()
+        # there is usually one location only, so the sort is cheap
+        return sorted(self._landmarks[value], key=lambda loc: (loc[1], loc[0]))
+
+    def flood_fill(self, x_pos, y_pos, values):
+        """This method returns a boolean array (one item per cell),
+        which is True for each cell connected to (x_pos, y_pos)
+        through horizontal or vertical neighbours whose value is in 'values'.
+        The fill is iterative (no recursion limit) and linear in the grid size.
+        """
+        width = self.width + 2
+        # we surround the grid with a border of blocked cells,
+        # thus we do not have to check the grid limits
+        free = np.zeros((self.height + 2, width), dtype=np.uint8)
+        free[1:-1, 1:-1] = np.isin(self.cells, values)
+        free = bytearray(free.tobytes())
+        # the cells are numbered row by row in the bordered grid,
+        # a free cell is marked with 1 and a reached cell with 2
+        start = (y_pos + 1) * width + x_pos + 1
+        if free[start]:
+            free[start] = 2
+            stack = [start]
+            pop = stack.pop
+            push = stack.append
+            # the four neighbours are unrolled, since this is the hot loop
+            while stack:
+                i = pop()
+                j = i - width
+                if free[j] == 1:
+                    free[j] = 2
+                    push(j)
+                j = i + width
+                if free[j] == 1:
+                    free[j] = 2
+                    push(j)
+                j = i - 1
+                if free[j] == 1:
+                    free[j] = 2
+                    push(j)
+                j = i + 1
+                if free[j] == 1:
+                    free[j] = 2
+                    push(j)
+        reached = np.frombuffer(free, dtype=np.uint8)
+        reached = reached.reshape(self.height + 2, width)[1:-1, 1:-1]
+        return reached == 2
+
+    def to_csv(self, csv_file):
+        """This method saves the grid to a CSV file,
+        with the same format as the one read by 'from_csv'.
+        The file is replaced atomically."""
+        with atomic_write(csv_file) as csv_stream:
+            csv_stream.write(";".join(self.header) + "\n")
+            np.savetxt(csv_stream, self.cells, fmt="%d", delimiter=";")
+
+    def to_dataframe(self):
+        """This method returns a copy of the grid as a pandas.DataFrame.
+        pandas is only required by this method."""
+        import pandas as pd
+        return pd.DataFrame(self.cells.copy(), columns=self.header)
+
+    def _build_index(self):
+        """This protected method builds the landmark index with a full scan."""
+        self._counts = np.bincount(self.cells.ravel(), minlength=256).tolist()
+        self._landmarks = {}
+        for value in self.LANDMARK_VALUES:
+            rows, cols = np.nonzero(self.cells == value)
+            self._landmarks[value] = dict.fromkeys(zip(cols.tolist(),
+                                                       rows.tolist()))
+
+    def _build_passability(self):
+        """This protected method builds the passability table
+        with a vectorized pass over the whole grid."""
+        bits = self.DIRECTION_BITS
+        passable = np.isin(self.cells, self.PASSABLE_VALUES).astype(np.uint8)
+        mask = np.zeros(self.cells.shape, dtype=np.uint8)
+        mask[1:, :] |= passable[:-1, :] * np.uint8(bits["up"])
+        mask[:-1, :] |= passable[1:, :] * np.uint8(bits["down"])
+        mask[:, 1:] |= passable[:, :-1] * np.uint8(bits["left"])
+        mask[:, :-1] |= passable[:, 1:] * np.uint8(bits["right"])
+        return mask
+
+    def _patch_passability(self, x_pos, y_pos, is_passable):
+        """This protected method updates the masks of the neighbours
+        of the cell (x_pos, y_pos), whose passability changed."""
+        bits = self.DIRECTION_BITS
+        mask = self._passability
+        # each neighbour, with the direction of (x_pos, y_pos) from it
+        for (x_n, y_n, direction) in ((x_pos, y_pos - 1, "down"),
+                                      (x_pos, y_pos + 1, "up"),
+                                      (x_pos - 1, y_pos, "right"),
+                                      (x_pos + 1, y_pos, "left")):
+            if 0 <= x_n < self.width and 0 <= y_n < self.height:
+                if is_passable:
+                    mask[y_n, x_n] |= bits[direction]
+                else:
+                    mask[y_n, x_n] &= ~bits[direction] & 0xFF
+
+    @staticmethod
+    def _read_only(view):
+        """This protected method protects a view against writes,
+        since the writes have to go through 'set' or 'set_block'."""
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'EditHistory' class.
+The edit mode keeps the modifications of the labyrinth to undo and redo
+them, as cell deltas (x, y, old value, new value) grouped into strokes
+(e.g. all the cells painted while the mouse button is pressed).
+
+The deltas are packed in a ring buffer of RECORD_SIZE bytes per delta
+(cf. RECORD_FORMAT: the cell index y * width + x, the old value and
+the new value), allocated once: the memory is bounded by the budget,
+whatever the labyrinth size. When the buffer is full, the oldest strokes
+are dropped (they cannot be undone anymore). A stroke which does not fit
+in the whole buffer is not kept.
+"""
+
+import collections
+import struct
+
+
+RECORD_FORMAT = "<IBB"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+DEFAULT_BUDGET = 1 << 20  # bytes, i.e. about 170 000 deltas
+
+
+class EditHistory:
+    """This class records the modifications of a labyrinth grid,
+    stroke by stroke, to undo and redo them."""
+
+    def __init__(self, width, budget=DEFAULT_BUDGET):
+        """This special method is the class constructor.
+        'width' is the grid width, 'budget' the memory (in bytes)
+        used by the deltas."""
+        if budget < RECORD_SIZE:
+            raise ValueError(budget)
+        self.width = width  # type is int
+        self.capacity = budget // RECORD_SIZE  # type is int (deltas)
+        self._buffer = bytearray(self.capacity * RECORD_SIZE)
+        # the deltas are numbered since the beginning, their location
+        # in the buffer is their number modulo 'self.capacity':
+        self._first = 0  # number of the oldest delta kept
+        self._end = 0  # number after the last delta kept
+        # 'self._strokes' type is deque containing lists [first delta
+        # number, number of deltas], from the oldest to the newest
+        self._strokes = collections.deque()
+        self._applied = 0  # number of strokes done (the next are undone)
+        self._stroke = None  # type is list (stroke being recorded)
+        self._stroke_lost = False  # True if the current stroke is too big
+        self.dropped_strokes = 0  # type is int (strokes not kept)
+
+    @property
+    def can_undo(self):
+        """This property returns True if a stroke can be undone."""
+        return self._applied > 0
+
+    @property
+    def can_redo(self):
+        """This property returns True if a stroke can be redone."""
+        return self._applied < len(self._strokes)
+
+    def begin_stroke(self):
+        """This method starts a new stroke; the undone strokes
+        cannot be redone anymore."""
+        self.end_stroke()
+        while len(self._strokes) > self._applied:
+            self._strokes.pop()
+        if self._strokes:
+            self._end = self._strokes[-1][0] + self._strokes[-1][1]
+        else:
+            self._end = self._first
+        self._stroke = [self._end, 0]
+        self._stroke_lost = False
+
+    def record(self, x_pos, y_pos, old, new):
+        """This method records the modification of the cell
+        (x_pos, y_pos) from 'old' to 'new' in the current stroke
+        (a stroke is started if needed)."""
+        if self._stroke is None and not self._stroke_lost:
+            self.begin_stroke()
+        if self._stroke_lost or old == new:
+            return
+        while self._end - self._first >= self.capacity:
+            if not self._strokes:
+                # the stroke alone fills the buffer: we do not keep it
+                self._end = self._stroke[0]
+                self._stroke = None
+                self._stroke_lost = True
+                self.dropped_strokes += 1
+                return
+            # we drop the oldest stroke
+            first, count = self._strokes.popleft()
+            self._first = first + count
+            self._applied -= 1
+            self.dropped_strokes += 1
+        struct.pack_into(RECORD_FORMAT, self._buffer,
+                         (self._end % self.capacity) * RECORD_SIZE,
+                         y_pos * self.width + x_pos, old, new)
+        self._end += 1
+        self._stroke[1] += 1
+
+    def end_stroke(self):
+        """This method ends the current stroke, if any.
+        An empty stroke is not kept."""
+        if self._stroke is not None and self._stroke[1]:
+            self._strokes.append(self._stroke)
+            self._applied = len(self._strokes)
+        self._stroke = None
+        self._stroke_lost = False
+
+    def undo(self):
+        """This method returns the deltas (x, y, old, new) of the last
+        stroke done, in the reverse order, to be undone by the caller
+        (by assigning 'old' to each cell), or an empty list."""
+        self.end_stroke()
+        if not self.can_undo:
+            return []
+        self._applied -= 1
+        return self._deltas(*self._strokes[self._applied])[::-1]
+
+    def redo(self):
+        """This method returns the deltas (x, y, old, new) of the first
+        stroke undone, in order, to be done again by the caller
+        (by assigning 'new' to each cell), or an empty list."""
+        self.end_stroke()
+        if not self.can_redo:
+            return []
+        self._applied += 1
+        return self._deltas(*self._strokes[self._applied - 1])
+
+    def clear(self):
+        """This method forgets all the strokes."""
+        self._strokes.clear()
+        self._first = self._end
+        self._applied = 0
+        self._stroke = None
+        self._stroke_lost = False
+
+    def stats(self):
+        """This method returns the history statistics as a dictionary."""
+        return {"budget": len(self._buffer), "deltas": self._end - self._first,
+                "strokes": len(self._strokes), "undoable": self._applied,
+                "dropped_strokes": self.dropped_strokes}
+
+    def _deltas(self, first, count):
+        """This protected method returns the deltas (x, y, old, new)
+        numbered from 'first' to 'first + count' (excluded)."""
+        start = (first % self.capacity) * RECORD_SIZE
+        end = start + count * RECORD_SIZE
+        # the deltas can go round the end of the buffer
+        if end <= len(self._buffer):
+            payload = self._buffer[start:end]
+        else:
+            payload = self._buffer[start:]\
+                + self._buffer[:end - len(self._buffer)]
+        deltas = []
+        for index, old, new in struct.iter_unpack(RECORD_FORMAT, payload):
+            y_pos, x_pos = divmod(index, self.width)
+            deltas.append((x_pos, y_pos, old, new))
+        return deltas
@@ -0,0 +1,264 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'Instrumentation' class,
+and the instrumentation shared by the whole application: 'PROFILER'.
+
+The instrumentation counts and times the key calls of the application
+(grid reads, playability analysis, flood fills, dashboard display,
+screen updates, image loads, etc., cf. TARGETS), and the frame times
+(cf. 'FrameScheduler.end_frame').
+It is disabled by default: nothing is wrapped, thus there is no overhead.
+It is enabled with the '--profile' option of the game and edit modes,
+or with the environment variable LABY_PROFILE, e.g.:
+    LABY_PROFILE=profile python game.py
+On exit, two files are written:
+- '<output>.json': the summary (calls, times, frame times histogram),
+- '<output>.trace.json': the calls in the Chrome trace format,
+which can be opened with 'chrome://tracing' or 'https://ui.perfetto.dev'.
+
+The blits cannot be counted directly ('pygame.Surface.blit' is a C method):
+the screen areas reported to the compositor are counted instead
+('FrameCompositor.add'), one per blit on the screen.
+"""
+
+import atexit
+import functools
+import importlib
+import inspect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+ENV_VARIABLE = "LABY_PROFILE"  # environment variable enabling the profiler
+DEFAULT_OUTPUT = "profile"  # output files prefix if the variable is "1"
+# the instrumented calls: (module, class or None for a function, name)
+TARGETS = (("grid", "Grid", "get"),
+           ("grid", "Grid", "set"),
+           ("grid", "Grid", "flood_fill"),
+           ("labyrinth", "Labyrinth", "analyze_playability"),
+           ("validator", "PlayabilityValidator", "is_playable"),
+           ("validator", "PlayabilityValidator", "failures"),
+           ("validator", "PlayabilityValidator", "apply"),
+           ("session", "GameSession", "step"),
+           ("solver", "RouteSolver", "plan"),
+           ("solver", None, "distance_field"),
+           ("dashboard", "Dashboard", "display"),
+           ("labyviewer", "LabyViewer", "display_labyrinth"),
+           ("labyviewer", "LabyViewer", "update_cell"),
+           ("labyviewer", "LabyViewer", "restore_cell"),
+           ("compositor", "FrameCompositor", "add"),
+           ("compositor", "FrameCompositor", "present"),
+           ("assets", "AssetRegistry", "get"),
+           ("pygame.display", None, "flip"),
+           ("pygame.display", None, "update"),
+           ("pygame.image", None, "load"))
+# the values measured on the results: name -> function(result)
+# (the flood fill is iterative, its size bounds the former recursion depth)
+MEASURES = {"Grid.flood_fill": lambda reached: int(np.count_nonzero(reached))}
+# upper bounds (in milliseconds) of the frame times histogram
+FRAME_BUCKETS = (1, 2, 4, 8, 16, 33, 66, 100)
+MAX_TRACE_EVENTS = 500000  # the next calls are counted, but not traced
+
+
+class Instrumentation:
+    """This class wraps the key calls to count and time them,
+    and writes the results on exit."""
+
+    def __init__(self):
+        """This special method is the class constructor."""
+        self.enabled = False  # type is bool
+        self.output = None  # type is str (output files prefix)
+        # 'self.calls' type is dict: name -> [count, total, max] (seconds)
+        self.calls = {}
+        # 'self.measures' type is dict: name -> [count, total, max]
+        self.measures = {}
+        # 'self.frame_times' type is list containing float items (seconds)
+        self.frame_times = []
+        self.scheduler_stats = None  # type is dict (cf. 'FrameScheduler')
+        # 'self._trace' type is list containing tuples
+        # (name, thread id, start, end)
+        self._trace = []
+        self.dropped_events = 0  # type is int (calls not traced)
+        # 'self._originals' type is list containing tuples
+        # (owner, attribute, original value), to restore them
+        self._originals = []
+        self._origin = time.perf_counter()  # time origin of the trace
+
+    def enable(self, output=DEFAULT_OUTPUT, targets=TARGETS):
+        """This method wraps the calls of 'targets', and writes
+        the results to the files '<output>.json' and '<output>.trace.json'
+        on exit. It does nothing if the instrumentation is enabled."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self.output = output
+        self._origin = time.perf_counter()
+        for module_name, class_name, attribute in targets:
+            owner = importlib.import_module(module_name)
+            name = module_name + "." + attribute
+            if class_name is not None:
+                owner = getattr(owner, class_name)
+                name = class_name + "." + attribute
+            self._wrap(owner, attribute, name)
+        self._wrap_end_frame()
+        atexit.register(self.write)
+
+    def disable(self):
+        """This method restores the original calls (the results are kept)."""
+        for owner, attribute, original in reversed(self._originals):
+            setattr(owner, attribute, original)
+        self._originals = []
+        self.enabled = False
+
+    def record(self, name, start, end, thread_id=None):
+        """This method records a call of 'name', from 'start' to 'end'
+        (time.perf_counter values)."""
+        duration = end - start
+        stats = self.calls.get(name)
+        if stats is None:
+            self.calls[name] = [1, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            if duration > stats[2]:
+                stats[2] = duration
+        if len(self._trace) < MAX_TRACE_EVENTS:
+            if thread_id is None:
+                thread_id = threading.get_ident()
+            self._trace.append((name, thread_id, start, end))
+        else:
+            self.dropped_events += 1
+
+    def measure(self, name, value):
+        """This method records the value 'value' measured for 'name'."""
+        stats = self.measures.get(name)
+        if stats is None:
+            self.measures[name] = [1, value, value]
+        else:
+            stats[0] += 1
+            stats[1] += value
+            if value > stats[2]:
+                stats[2] = value
+
+    def summary(self):
+        """This method returns the results as a dictionary."""
+        calls = {}
+        for name, (count, total, maximum) in sorted(self.calls.items()):
+            calls[name] = {"calls": count, "total_ms": total * 1000,
+                           "mean_ms": total / count * 1000,
+                           "max_ms": maximum * 1000}
+        measures = {}
+        for name, (count, total, maximum) in sorted(self.measures.items()):
+            measures[name] = {"count": count, "mean": total / count,
+                              "max": maximum}
+        return {"calls": calls, "measures": measures,
+                "frames": self.frame_summary(),
+                "scheduler": self.scheduler_stats,
+                "dropped_trace_events": self.dropped_events}
+
+    def frame_summary(self):
+        """This method returns the frame times statistics (milliseconds)
+        and their histogram, as a dictionary."""
+        times = np.array(self.frame_times) * 1000
+        # one bucket per upper bound, then one for the slower frames
+        counts = np.bincount(np.searchsorted(FRAME_BUCKETS, times),
+                             minlength=len(FRAME_BUCKETS) + 1)
+        labels = ["<={}".format(bound) for bound in FRAME_BUCKETS]
+        labels.append(">{}".format(FRAME_BUCKETS[-1]))
+        summary = {"count": len(times),
+                   "histogram_ms": dict(zip(labels, counts.tolist()))}
+        if len(times):
+            summary.update({"mean_ms": float(times.mean()),
+                            "p50_ms": float(np.percentile(times, 50)),
+                            "p95_ms": float(np.percentile(times, 95)),
+                            "p99_ms": float(np.percentile(times, 99)),
+                            "max_ms": float(times.max())})
+        return summary
+
+    def trace_events(self):
+        """This method returns the recorded calls as a list of
+        Chrome trace events ("complete" events, in microseconds)."""
+        pid = os.getpid()
+        origin = self._origin
+        return [{"name": name, "ph": "X", "pid": pid, "tid": thread_id,
+                 "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6}
+                for name, thread_id, start, end in self._trace]
+
+    def write(self, output=None):
+        """This method writes the summary and the trace files
+        (cf. module docstring)."""
+        output = output or self.output or DEFAULT_OUTPUT
+        with open(output + ".json", "w") as summary_file:
+            json.dump(self.summary(), summary_file, indent=2)
+        with open(output + ".trace.json", "w") as trace_file:
+            json.dump({"traceEvents": self.trace_events(),
+                       "displayTimeUnit": "ms"}, trace_file)
+
+    def _wrap(self, owner, attribute, name):
+        """This protected method replaces the function 'attribute'
+        of 'owner' (class or module) by a function timing its calls."""
+        original = inspect.getattr_static(owner, attribute)
+        function = getattr(owner, attribute)
+        record = self.record
+        measure = self.measure
+        measure_result = MEASURES.get(name)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                record(name, start, perf_counter())
+            if measure_result is not None:
+                measure(name, measure_result(result))
+            return result
+
+        if isinstance(original, staticmethod):
+            wrapper = staticmethod(wrapper)
+        setattr(owner, attribute, wrapper)
+        self._originals.append((owner, attribute, original))
+
+    def _wrap_end_frame(self):
+        """This protected method replaces 'FrameScheduler.end_frame'
+        by a method recording the frame times."""
+        from scheduler import FrameScheduler
+        end_frame = FrameScheduler.end_frame
+        profiler = self
+
+        @functools.wraps(end_frame)
+        def wrapper(scheduler):
+            end_frame(scheduler)
+            end = time.perf_counter()
+            profiler.frame_times.append(scheduler.last_frame_time)
+            profiler.record("frame", end - scheduler.last_frame_time, end)
+            profiler.scheduler_stats = scheduler.stats()
+
+        FrameScheduler.end_frame = wrapper
+        self._originals.append((FrameScheduler, "end_frame", end_frame))
+
+
+def setup(output=None):
+    """This function enables the instrumentation shared by the application
+    if 'output' (the output files prefix, e.g. given with '--profile')
+    or the environment variable LABY_PROFILE is set.
+    It returns True if the instrumentation is enabled."""
+    if output is None:
+        output = os.environ.get(ENV_VARIABLE)
+        if output == "1":
+            output = DEFAULT_OUTPUT
+        elif output == "0":
+            output = None
+    if output:
+        PROFILER.enable(output)
+    return PROFILER.enabled
+
+
+# the instrumentation shared by the whole application
+PROFILER = Instrumentation()
@@ -9,6 +9,8 @@ This module uses pygame as main support.
 import pygame
 from pygame.locals import *
 
+from compositor import FrameCompositor
+
 
 class Interface:
     """This class allows to create and modify an interface."""
@@ -18,6 +20,8 @@ class Interface:
     SCREEN_HEIGHT = 550  # number of pixels
     SCREEN_ORIGIN = (0, 0)
     LABY_ORIGIN = (50, 50)
+    VIEW_WIDTH = 15  # this is the viewport width in sprites
+    VIEW_HEIGHT = 15  # this is the viewport height in sprites
     DASHBOARD_ORIGIN = (550, 50)
 
     def __init__(self, back, laby_viewer, dashboard):
@@ -26,19 +30,31 @@ class Interface:
         self.screen = self.initialize_interface()  # type is pygame.Surface
         self.laby_viewer = laby_viewer  # type is <class 'LabyViewer'>
         self.dashboard = dashboard  # type is <class 'Dashboard'>
+        # the screen is updated once per frame, with the modified areas only
+        self.compositor = FrameCompositor()
 
     def display_dashboard(self, screen, tools=[]):
-        """This method displays the dashboard."""
-        self.dashboard.display(screen, tools)
+        """This method displays the dashboard,
+        and reports the modified screen areas to the compositor."""
+        self.compositor.add_all(self.dashboard.display(screen, tools))
 
     def display_labyrinth_with_tools(self, screen, sprites_dict):
-        """This method displays the labyrinth with the tools.
+        """This method displays the labyrinth with the tools,
+        and reports the modified screen areas to the compositor.
         We assume that pygame has been initialized."""
-        self.laby_viewer.display_labyrinth(screen, sprites_dict)
-        self.laby_viewer.display_tools_in_labyrinth(screen)
+        self.compositor.add(self.laby_viewer.display_labyrinth(screen,
+                                                               sprites_dict))
+        self.compositor.add_all(
+            self.laby_viewer.display_tools_in_labyrinth(screen))
 
     @classmethod
     def initialize_interface(cls):
-        """This method initialize the interface."""
-        screen = pygame.display.set_mode((cls.SCREEN_WIDTH, cls.SCREEN_HEIGHT))
+        """This method initialize the interface.
+        The window is opened only once: if it is already opened
+        with our size, it is kept."""
+        screen = pygame.display.get_surface()
+        if screen is None\
+                or screen.get_size() != (cls.SCREEN_WIDTH, cls.SCREEN_HEIGHT):
+            screen = pygame.display.set_mode((cls.SCREEN_WIDTH,
+                                              cls.SCREEN_HEIGHT))
         return screen
@@ -3,76 +3,208 @@
 
 """This module contains the 'LabyViewer' class.
 This allows to display a labyrinth.
+The labyrinth can be larger than the window: only its part inside
+the viewport of the camera is displayed (cf. camera module).
 This module uses pygame as main support.
 """
 
-import os
+import collections
 
 import pygame
 from pygame.locals import *
 
+from assets import ASSETS, WHITE
+from camera import Camera
 from interface import Interface
 
 
 class LabyViewer:
     """This class allows to create and modify an labyrinth viewer."""
 
-    LABY_WIDTH = 15  # this is the labyrinth width in sprites
-    #                 (number of sprites per side)
-    LABY_HEIGHT = 15  # this is the labyrinth height in sprites
-    #                 (number of sprites per side)
+    CHUNK_TILES = 16  # this is the chunk width/height in sprites
+    MAX_CHUNKS = 16  # maximal number of chunks kept in memory,
+    #                 thus the memory does not grow with the labyrinth size
+    HINT_COLOUR = (255, 242, 0)  # colour of the hint marks (yellow)
 
-    def __init__(self, labyrinth):
-        """This special method is the class constructor."""
+    def __init__(self, labyrinth, show_start=True):
+        """This special method is the class constructor.
+        If 'show_start' is False, the start point is displayed as a path
+        (in game mode, the player sprite is displayed separately)."""
         self.labyrinth = labyrinth  # type is <class 'Labyrinth'>
+        self.show_start = show_start  # type is bool
+        # the part of the labyrinth displayed on the screen
+        self.camera = Camera(labyrinth.width, labyrinth.height,
+                             Interface.VIEW_WIDTH, Interface.VIEW_HEIGHT,
+                             Interface.LABY_ORIGIN, Interface.SPRITE_SIZE)
+        # The labyrinth is composited off-screen, in square chunks,
+        # on first display; the least recently used chunks are dropped:
+        # 'self._chunks' type is OrderedDict: (x_chunk, y_chunk) -> Surface
+        self._chunks = collections.OrderedDict()
+        self._sprites_dict = None  # sprites used to composite the chunks
+        # 'self._hint_cells' type is list of (x, y): displayed hint marks
+        self._hint_cells = []
 
     def display_labyrinth(self, screen, sprites_dict):
-        """This method displays the labyrinth.
+        """This method displays the visible part of the labyrinth
+        (cf. 'self.camera'), and returns the modified screen area
+        (pygame.Rect).
+        Only the chunks inside the viewport are used, thus the cost
+        does not depend on the labyrinth size.
         We assume that pygame has been initialized."""
-        x_0 = Interface.LABY_ORIGIN[0]
-        y_0 = Interface.LABY_ORIGIN[1]
-        for j in range(self.LABY_WIDTH):  # iteration over columns
-            for i in range(self.LABY_HEIGHT):  # iteration over rows
-                x_pos = x_0 + (j * Interface.SPRITE_SIZE)
-                y_pos = y_0 + (i * Interface.SPRITE_SIZE)
-                item = self.labyrinth.grid.iloc[i, j]
-                if item == 0:
-                    sprite = sprites_dict["sand_path"]
-                elif item == 1:
-                    sprite = sprites_dict["wall"]
-                elif item == 2:
-                    sprite = sprites_dict["sand_path"]
-                    screen.blit(sprite, (x_pos, y_pos))
-                    sprite = sprites_dict["guard"]
-                elif item == 3:
-                    sprite = sprites_dict["sand_path"]
-                    screen.blit(sprite, (x_pos, y_pos))
-                    sprite = sprites_dict["m_gyver"]
-                elif str(item).isalpha():
-                    pass
-                else:
-                    raise ValueError(item)
-                if not str(item).isalpha():
-                    screen.blit(sprite, (x_pos, y_pos))
-        pygame.display.flip()
+        if sprites_dict is not self._sprites_dict:
+            self._sprites_dict = sprites_dict
+            self._chunks.clear()
+        camera = self.camera
+        side = Interface.SPRITE_SIZE
+        tiles = self.CHUNK_TILES
+        for y_chunk in range(camera.y_min // tiles,
+                             (camera.y_max - 1) // tiles + 1):
+            for x_chunk in range(camera.x_min // tiles,
+                                 (camera.x_max - 1) // tiles + 1):
+                # the visible cells of this chunk
+                x_min = max(camera.x_min, x_chunk * tiles)
+                y_min = max(camera.y_min, y_chunk * tiles)
+                x_max = min(camera.x_max, (x_chunk + 1) * tiles)
+                y_max = min(camera.y_max, (y_chunk + 1) * tiles)
+                area = pygame.Rect((x_min % tiles) * side,
+                                   (y_min % tiles) * side,
+                                   (x_max - x_min) * side,
+                                   (y_max - y_min) * side)
+                screen.blit(self._get_chunk(x_chunk, y_chunk),
+                            camera.cell_to_screen(x_min, y_min), area)
+        return pygame.Rect(camera.area)
+
+    def update_cell(self, screen, x_l, y_l):
+        """This method composites again the cell (x_l, y_l),
+        e.g. after its modification in edit mode, then displays it.
+        It returns the modified screen area (pygame.Rect),
+        or None if the cell is outside the viewport.
+        We assume that the labyrinth is already displayed."""
+        key = (x_l // self.CHUNK_TILES, y_l // self.CHUNK_TILES)
+        if key in self._chunks:
+            self._composite_cell(self._chunks[key], x_l % self.CHUNK_TILES,
+                                 y_l % self.CHUNK_TILES,
+                                 self.labyrinth.grid.get(x_l, y_l))
+        return self.restore_cell(screen, x_l, y_l)
+
+    def restore_cell(self, screen, x_l, y_l):
+        """This method displays again the cell (x_l, y_l) from the composited
+        labyrinth, e.g. to erase the player sprite.
+        It returns the modified screen area (pygame.Rect),
+        or None if the cell is outside the viewport.
+        We assume that the labyrinth is already displayed."""
+        if not self.camera.is_visible(x_l, y_l):
+            return None
+        side = Interface.SPRITE_SIZE
+        chunk = self._get_chunk(x_l // self.CHUNK_TILES,
+                                y_l // self.CHUNK_TILES)
+        area = pygame.Rect((x_l % self.CHUNK_TILES) * side,
+                           (y_l % self.CHUNK_TILES) * side, side, side)
+        return screen.blit(chunk, self.camera.cell_to_screen(x_l, y_l), area)
+
+    def redraw_cell(self, screen, x_l, y_l):
+        """This method displays again the cell (x_l, y_l)
+        with its tool if it is not found, e.g. to erase a hint mark.
+        It returns the modified screen area (pygame.Rect),
+        or None if the cell is outside the viewport."""
+        rect = self.restore_cell(screen, x_l, y_l)
+        if rect is not None:
+            for tool in self.labyrinth.tools:
+                if not tool.found and tool.x_pos == x_l and tool.y_pos == y_l:
+                    screen.blit(ASSETS.get("tools", tool.name, WHITE), rect)
+        return rect
+
+    def display_hint(self, screen, cells):
+        """This method erases the previous hint marks, then displays
+        a mark on each location of 'cells' inside the viewport
+        (e.g. the next moves of the best route).
+        It returns the list of the modified screen areas (pygame.Rect).
+        We assume that the labyrinth is already displayed."""
+        rects = [self.redraw_cell(screen, x_l, y_l)
+                 for (x_l, y_l) in self._hint_cells]
+        self._hint_cells = [(x_l, y_l) for (x_l, y_l) in cells
+                            if self.camera.is_visible(x_l, y_l)]
+        side = Interface.SPRITE_SIZE
+        for (x_l, y_l) in self._hint_cells:
+            x_pos, y_pos = self.camera.cell_to_screen(x_l, y_l)
+            rects.append(pygame.draw.circle(screen, self.HINT_COLOUR,
+                                            (x_pos + side // 2,
+                                             y_pos + side // 2),
+                                            side // 6))
+        return rects
+
+    def invalidate_chunk(self, x_chunk, y_chunk):
+        """This method drops the chunk (x_chunk, y_chunk),
+        which will be composited again on next use."""
+        self._chunks.pop((x_chunk, y_chunk), None)
+
+    def _get_chunk(self, x_chunk, y_chunk):
+        """This protected method returns the chunk (x_chunk, y_chunk),
+        composited on first use.
+        The least recently used chunk is dropped beyond MAX_CHUNKS."""
+        key = (x_chunk, y_chunk)
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk = self._composite_chunk(x_chunk, y_chunk)
+            self._chunks[key] = chunk
+            if len(self._chunks) > self.MAX_CHUNKS:
+                self._chunks.popitem(last=False)
+        else:
+            self._chunks.move_to_end(key)
+        return chunk
+
+    def _composite_chunk(self, x_chunk, y_chunk):
+        """This protected method composites the chunk (x_chunk, y_chunk)
+        on a new off-screen surface."""
+        side = Interface.SPRITE_SIZE
+        x_min = x_chunk * self.CHUNK_TILES
+        y_min = y_chunk * self.CHUNK_TILES
+        x_max = min(x_min + self.CHUNK_TILES, self.labyrinth.width)
+        y_max = min(y_min + self.CHUNK_TILES, self.labyrinth.height)
+        chunk = pygame.Surface(((x_max - x_min) * side,
+                                (y_max - y_min) * side)).convert()
+        # we read the whole block at once, as python integers
+        block = self.labyrinth.grid.get_block(x_min, y_min,
+                                              x_max, y_max).tolist()
+        for i, row in enumerate(block):  # iteration over rows
+            for j, item in enumerate(row):  # iteration over columns
+                self._composite_cell(chunk, j, i, item)
+        return chunk
+
+    def _composite_cell(self, chunk, j, i, item):
+        """This protected method draws the cell value 'item'
+        at the location (j, i) of 'chunk' (in sprites)."""
+        sprites_dict = self._sprites_dict
+        x_pos = j * Interface.SPRITE_SIZE
+        y_pos = i * Interface.SPRITE_SIZE
+        if item == 0:
+            sprite = sprites_dict["sand_path"]
+        elif item == 1:
+            sprite = sprites_dict["wall"]
+        elif item == 2:
+            sprite = sprites_dict["sand_path"]
+            chunk.blit(sprite, (x_pos, y_pos))
+            sprite = sprites_dict["guard"]
+        elif item == 3:
+            sprite = sprites_dict["sand_path"]
+            if self.show_start:
+                chunk.blit(sprite, (x_pos, y_pos))
+                sprite = sprites_dict["m_gyver"]
+        else:
+            raise ValueError(item)
+        chunk.blit(sprite, (x_pos, y_pos))
 
     def display_tools_in_labyrinth(self, screen):
-        """This method displays the tools in the labyrinth.
+        """This method displays the tools inside the viewport,
+        and returns the list of the modified screen areas (pygame.Rect).
         We assume that the labyrinth is already displayed.
         We assume that pygame has been initialized."""
-        x_0 = Interface.LABY_ORIGIN[0]
-        y_0 = Interface.LABY_ORIGIN[1]
+        camera = self.camera
+        rects = []
         for tool in self.labyrinth.tools:
-            if not tool.found:
-                x_tool = x_0 + (tool.x_pos * Interface.SPRITE_SIZE)
-                y_tool = y_0 + (tool.y_pos * Interface.SPRITE_SIZE)
-                sprite_png = tool.name + ".png"
-                try:
-                    sprite_path = os.path.join("sprites", "tools", sprite_png)
-                    sprite = pygame.image.load(sprite_path).convert()
-                    # set white as transparent
-                    sprite.set_colorkey((255, 255, 255))
-                    screen.blit(sprite, (x_tool, y_tool))
-                except pygame.error:
-                    raise NameError("{}.png introuvable".format(tool.name))
-        pygame.display.flip()
+            if not tool.found and camera.is_visible(tool.x_pos, tool.y_pos):
+                # the sprite is loaded once, white is transparent
+                sprite = ASSETS.get("tools", tool.name, WHITE)
+                rects.append(screen.blit(
+                    sprite, camera.cell_to_screen(tool.x_pos, tool.y_pos)))
+        return rects
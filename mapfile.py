@@ -0,0 +1,162 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module reads and writes the labyrinth map files.
+
+Two formats are supported, and detected automatically when loading:
+- the CSV format (cf. 'Grid.from_csv'), e.g. 'data/grid.csv'
+- a versioned binary format, with the extension '.laby'
+
+The binary format starts with a header of HEADER_SIZE bytes
+(little-endian, cf. HEADER_FORMAT):
+    magic number     4 bytes   b"MGLB"
+    format version   uint16    FORMAT_VERSION
+    packing          uint16    RAW (one byte per cell)
+                               or PACKED (2 bits per cell, 4 cells per byte)
+    width            uint32    number of columns
+    height           uint32    number of rows
+    checksum         uint32    CRC-32 of the cells, one byte per cell,
+                               row by row (cf. 'Grid.checksum')
+then the cells, row by row.
+A raw map is memory-mapped: opening it does not read the cells,
+only the pages of the touched cells are read from the disk.
+
+Please execute this file with Python to convert a map file, e.g.:
+    python mapfile.py data/grid.csv data/grid.laby
+"""
+
+import argparse
+import mmap
+import struct
+
+import numpy as np
+
+from grid import Grid, atomic_write
+
+
+MAGIC = b"MGLB"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<4sHHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RAW = 0
+PACKED = 1
+BINARY_EXTENSION = ".laby"
+
+
+def is_binary_map(map_file):
+    """This function returns 'True' if 'map_file' is a binary map file."""
+    with open(map_file, "rb") as stream:
+        return stream.read(len(MAGIC)) == MAGIC
+
+
+def load_grid(map_file, verify=False):
+    """This function loads a grid from a CSV or a binary map file."""
+    if is_binary_map(map_file):
+        return load_binary(map_file, verify)
+    return Grid.from_csv(map_file)
+
+
+def save_grid(grid, map_file, packing=RAW):
+    """This function saves a grid to 'map_file', in the binary format
+    if its extension is BINARY_EXTENSION, otherwise in the CSV format."""
+    if map_file.endswith(BINARY_EXTENSION):
+        save_binary(grid, map_file, packing)
+    else:
+        grid.to_csv(map_file)
+
+
+def read_header(stream):
+    """This function reads a binary map header from 'stream', and returns
+    a tuple (version, packing, width, height, checksum)."""
+    header = stream.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("truncated map header")
+    magic, version, packing, width, height, checksum =\
+        struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise ValueError("not a binary map: {!r}".format(magic))
+    if version > FORMAT_VERSION:
+        raise ValueError("unsupported map format version: {}".format(version))
+    if packing not in (RAW, PACKED):
+        raise ValueError("unsupported map packing: {}".format(packing))
+    return (version, packing, width, height, checksum)
+
+
+def load_binary(map_file, verify=False):
+    """This function loads a grid from a binary map file.
+    A raw map is memory-mapped (copy-on-write, the file is never modified).
+    If 'verify' is True, the checksum is checked, which reads all the cells.
+    """
+    with open(map_file, "rb") as stream:
+        _, packing, width, height, checksum = read_header(stream)
+        if packing == RAW:
+            # the file can be closed, the mapping stays valid
+            payload = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_COPY)
+            cells = np.frombuffer(payload, dtype=np.uint8,
+                                  count=width * height, offset=HEADER_SIZE)
+        else:
+            payload = np.frombuffer(stream.read(), dtype=np.uint8)
+            cells = unpack_cells(payload, width * height)
+    grid = Grid(cells.reshape(height, width))
+    if verify and grid.checksum() != checksum:
+        raise ValueError("corrupted map file: {}".format(map_file))
+    return grid
+
+
+def save_binary(grid, map_file, packing=RAW):
+    """This function saves a grid to a binary map file.
+    The file is replaced atomically."""
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, packing,
+                         grid.width, grid.height, grid.checksum())
+    with atomic_write(map_file, "wb") as stream:
+        stream.write(header)
+        if packing == RAW:
+            stream.write(grid.cells.tobytes())
+        else:
+            stream.write(pack_cells(grid.cells).tobytes())
+
+
+def pack_cells(cells):
+    """This function packs the cells (values from 0 to 3) on 2 bits each,
+    4 cells per byte, the first cell in the lowest bits."""
+    cells = np.ravel(cells)
+    if cells.size and cells.max() > 3:
+        raise ValueError("only values from 0 to 3 can be packed")
+    padded = np.zeros(-(-cells.size // 4) * 4, dtype=np.uint8)
+    padded[:cells.size] = cells
+    quads = padded.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4)\
+        | (quads[:, 3] << 6)
+
+
+def unpack_cells(payload, size):
+    """This function unpacks 'size' cells packed with 'pack_cells'."""
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    cells = (payload[:, np.newaxis] >> shifts) & 3
+    if cells.size < size:
+        raise ValueError("truncated map payload")
+    return cells.ravel()[:size]
+
+
+def convert(source, target, packing=RAW):
+    """This function converts the map file 'source' to 'target'
+    (the formats depend on the files, cf. 'load_grid' and 'save_grid')."""
+    save_grid(load_grid(source, verify=True), target, packing)
+
+
+def main():
+    """This function is the main function to convert a map file."""
+    parser = argparse.ArgumentParser(description="Convert a labyrinth map "
+                                     "between the CSV and binary formats.")
+    parser.add_argument("source", help="map file to read (CSV or binary)")
+    parser.add_argument("target", help="map file to write (binary if the "
+                        "extension is {}, otherwise CSV)"
+                        .format(BINARY_EXTENSION))
+    parser.add_argument("--packed", action="store_true",
+                        help="pack the binary cells on 2 bits")
+    args = parser.parse_args()
+    convert(args.source, args.target, PACKED if args.packed else RAW)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module reads and writes the map packs: one file holding many
+labyrinths (the levels of a campaign), with the extension '.mgpk'.
+
+A map pack starts with a header of HEADER_SIZE bytes
+(little-endian, cf. HEADER_FORMAT):
+    magic number     4 bytes   b"MGPK"
+    format version   uint16    FORMAT_VERSION
+    reserved         uint16    0
+    levels number    uint32
+then the index, one entry of ENTRY_SIZE bytes per level
+(cf. ENTRY_FORMAT):
+    offset           uint64    location of the cells in the file
+    size             uint32    number of bytes of the cells
+    width            uint32    number of columns
+    height           uint32    number of rows
+    checksum         uint32    CRC-32 of the cells (cf. 'Grid.checksum')
+    packing          uint16    RAW or PACKED (cf. mapfile module)
+    seed             int64     seed of the tools positions (cf.
+                               'GameSession.reset'), -1 if unknown
+    par              int32     optimal route length with this seed
+                               (cf. 'RouteSolver'), -1 if unknown
+then the cells of each level, with the same format as the binary map files.
+Opening a pack only reads its header and index; the cells of a level are
+read when it is loaded (and memory-mapped if they are raw).
+
+A level of a pack can be named 'pack.mgpk#3' (the fourth level),
+e.g. in the run files (cf. replay module).
+
+Please execute this file with Python to build or list map packs, e.g.:
+    python mappack.py build campaign.mgpk data/grid.csv generated/*.laby
+    python mappack.py generate campaign.mgpk --count 20 --size 21 101
+    python mappack.py list campaign.mgpk
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+import mapfile
+from grid import Grid, atomic_write
+
+
+MAGIC = b"MGPK"
+FORMAT_VERSION = 1
+HEADER_FORMAT = "<4sHHI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMAT = "<QIIIIHqi"
+ENTRY_SIZE = struct.calcsize(ENTRY_FORMAT)
+PACK_EXTENSION = ".mgpk"
+LEVEL_SEPARATOR = "#"  # cf. 'level_name'
+
+# the metadata of a level (cf. module docstring)
+LevelInfo = collections.namedtuple("LevelInfo", ["index", "width", "height",
+                                                 "seed", "par", "checksum"])
+
+
+def is_map_pack(map_file):
+    """This function returns 'True' if 'map_file' is a map pack."""
+    with open(map_file, "rb") as stream:
+        return stream.read(len(MAGIC)) == MAGIC
+
+
+def level_name(pack_file, level):
+    """This function returns the name of the level 'level' of the pack
+    'pack_file', e.g. 'campaign.mgpk#3'."""
+    return "{}{}{}".format(pack_file, LEVEL_SEPARATOR, level)
+
+
+def parse_level_name(map_name):
+    """This function returns a tuple (map file, level) from a map name,
+    where 'level' is None if the name is not a level of a pack
+    (cf. 'level_name')."""
+    pack_file, separator, level = map_name.rpartition(LEVEL_SEPARATOR)
+    if separator and level.isdigit():
+        return pack_file, int(level)
+    return map_name, None
+
+
+def load_level(pack, level, verify=False):
+    """This function loads the grid of the level 'level' from 'pack',
+    which is a map pack file or an opened 'MapPack'."""
+    if isinstance(pack, MapPack):
+        return pack.load_grid(level, verify)
+    with MapPack(pack) as opened_pack:
+        return opened_pack.load_grid(level, verify)
+
+
+class MapPack:
+    """This class gives access to the levels of a map pack file."""
+
+    def __init__(self, pack_file):
+        """This special method is the class constructor.
+        Only the header and the index are read."""
+        self.pack_file = pack_file  # type is str
+        self._stream = open(pack_file, "rb")
+        try:
+            header = self._stream.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                raise ValueError("truncated map pack header")
+            magic, version, _, count = struct.unpack(HEADER_FORMAT, header)
+            if magic != MAGIC:
+                raise ValueError("not a map pack: {!r}".format(magic))
+            if version > FORMAT_VERSION:
+                raise ValueError("unsupported map pack version: {}"
+                                 .format(version))
+            index = self._stream.read(count * ENTRY_SIZE)
+            if len(index) < count * ENTRY_SIZE:
+                raise ValueError("truncated map pack index")
+        except BaseException:
+            self._stream.close()
+            raise
+        # 'self._entries' type is list containing tuples (cf. ENTRY_FORMAT)
+        self._entries = list(struct.iter_unpack(ENTRY_FORMAT, index))
+
+    def __len__(self):
+        """This special method returns the number of levels."""
+        return len(self._entries)
+
+    def __enter__(self):
+        """This special method allows to use the pack in a 'with' block."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """This special method closes the pack at the end of a 'with' block.
+        """
+        self.close()
+
+    def info(self, level):
+        """This method returns the metadata of the level 'level'
+        (cf. 'LevelInfo')."""
+        _, _, width, height, checksum, _, seed, par = self._entry(level)
+        return LevelInfo(level, width, height, None if seed < 0 else seed,
+                         None if par < 0 else par, checksum)
+
+    def levels(self):
+        """This method returns the metadata of all the levels."""
+        return [self.info(level) for level in range(len(self))]
+
+    def load_grid(self, level, verify=False):
+        """This method loads the grid of the level 'level'.
+        Raw cells are memory-mapped (copy-on-write, the pack is never
+        modified), thus only the touched pages are read.
+        If 'verify' is True, the checksum is checked."""
+        offset, size, width, height, checksum, packing, _, _ =\
+            self._entry(level)
+        if packing == mapfile.RAW:
+            # the mapping stays valid when the pack is closed
+            payload = mmap.mmap(self._stream.fileno(), 0,
+                                access=mmap.ACCESS_COPY)
+            if offset + width * height > len(payload):
+                raise ValueError("truncated level: {}".format(level))
+            cells = np.frombuffer(payload, dtype=np.uint8,
+                                  count=width * height, offset=offset)
+        elif packing == mapfile.PACKED:
+            self._stream.seek(offset)
+            payload = np.frombuffer(self._stream.read(size), dtype=np.uint8)
+            cells = mapfile.unpack_cells(payload, width * height)
+        else:
+            raise ValueError("unsupported map packing: {}".format(packing))
+        grid = Grid(cells.reshape(height, width))
+        if verify and grid.checksum() != checksum:
+            raise ValueError("corrupted level: {}".format(level))
+        return grid
+
+    def close(self):
+        """This method closes the pack file
+        (the loaded grids stay valid)."""
+        self._stream.close()
+
+    def _entry(self, level):
+        """This protected method returns the index entry of 'level'."""
+        if not 0 <= level < len(self._entries):
+            raise ValueError("no level {} in {}".format(level,
+                                                        self.pack_file))
+        return self._entries[level]
+
+
+def write_pack(pack_file, levels, count, packing=mapfile.RAW):
+    """This function writes the map pack 'pack_file' with the 'count'
+    levels given by the iterable 'levels' of tuples (grid, seed, par)
+    ('seed' and 'par' can be None), one level at a time.
+    The file is replaced atomically."""
+    entries = []
+    with atomic_write(pack_file, "wb") as stream:
+        # the index is written once the locations of the levels are known
+        offset = HEADER_SIZE + count * ENTRY_SIZE
+        stream.write(b"\0" * offset)
+        for grid, seed, par in levels:
+            if packing == mapfile.RAW:
+                payload = grid.cells.tobytes()
+            else:
+                payload = mapfile.pack_cells(grid.cells).tobytes()
+            stream.write(payload)
+            entries.append(struct.pack(
+                ENTRY_FORMAT, offset, len(payload), grid.width, grid.height,
+                grid.checksum(), packing, -1 if seed is None else seed,
+                -1 if par is None else par))
+            offset += len(payload)
+        if len(entries) != count:
+            raise ValueError("{} levels instead of {}".format(len(entries),
+                                                              count))
+        stream.seek(0)
+        stream.write(struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, 0,
+                                 count))
+        stream.write(b"".join(entries))
+
+
+def par_length(grid, seed):
+    """This function returns the optimal route length of the grid 'grid'
+    with the tools positioned by 'seed', or None if it is not playable."""
+    from labyrinth import Labyrinth
+    from session import GameSession
+    from solver import RouteSolver
+    session = GameSession(Labyrinth.from_grid(grid))
+    session.reset(seed)
+    try:
+        return RouteSolver(session.labyrinth).solve().length
+    except ValueError:
+        return None
+
+
+def _build_level(task):
+    """This protected function returns a level (grid, seed, par)
+    from 'task' = (map file or None, seed, size, loop density):
+    the map file is loaded, or a labyrinth is generated."""
+    map_file, seed, size, loop_density = task
+    if map_file is None:
+        from generator import generate_grid
+        grid = generate_grid(size, size, seed, loop_density)
+    else:
+        grid = mapfile.load_grid(map_file, verify=True)
+    return grid, seed, par_length(grid, seed)
+
+
+def build_levels(tasks, jobs=1):
+    """This generator yields the levels (grid, seed, par) built from
+    'tasks' (cf. '_build_level'), in the same order, by 'jobs' processes.
+    """
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield _build_level(task)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        for level in executor.map(_build_level, tasks):
+            yield level
+
+
+def main():
+    """This function is the main function to be executed
+    to build or list map packs."""
+    parser = argparse.ArgumentParser(description="Build or list map packs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build", help="build a pack from map files (one level per file)")
+    build_parser.add_argument("pack_file", help="map pack to write")
+    build_parser.add_argument("map_files", nargs="+", help="map files")
+    generate_parser = subparsers.add_parser(
+        "generate", help="build a pack of generated labyrinths")
+    generate_parser.add_argument("pack_file", help="map pack to write")
+    generate_parser.add_argument("-n", "--count", type=int, default=10,
+                                 help="number of levels (default: 10)")
+    generate_parser.add_argument("--size", type=int, nargs=2,
+                                 default=(21, 101), metavar=("FIRST", "LAST"),
+                                 help="size of the first and last levels, "
+                                 "the sizes grow in between "
+                                 "(default: 21 101)")
+    generate_parser.add_argument("--loops", type=float, default=0.0,
+                                 help="loop density, from 0 to 1")
+    for subparser in (build_parser, generate_parser):
+        subparser.add_argument("-s", "--seed", type=int, default=0,
+                               help="seed of the first level, the next "
+                               "levels use the next seeds (default: 0)")
+        subparser.add_argument("--packed", action="store_true",
+                               help="pack the cells on 2 bits")
+        subparser.add_argument("-j", "--jobs", type=int,
+                               default=os.cpu_count(),
+                               help="number of processes "
+                               "(default: one per core)")
+    list_parser = subparsers.add_parser("list", help="list the levels")
+    list_parser.add_argument("pack_file", help="map pack to read")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        with MapPack(args.pack_file) as pack:
+            for info in pack.levels():
+                sys.stdout.write("{}: {}x{}, seed {}, par {}\n".format(
+                    info.index, info.width, info.height, info.seed,
+                    info.par))
+        return
+    if args.jobs < 1:
+        parser.error("the number of processes has to be positive")
+    if args.command == "build":
+        tasks = [(map_file, args.seed + i, None, None)
+                 for i, map_file in enumerate(args.map_files)]
+    else:
+        from generator import MIN_SIZE
+        if args.count < 1:
+            parser.error("the number of levels has to be positive")
+        if min(args.size) < MIN_SIZE:
+            parser.error("the levels have to be at least {0}x{0}"
+                         .format(MIN_SIZE))
+        first, last = args.size
+        tasks = []
+        for i in range(args.count):
+            size = first + (last - first) * i // max(1, args.count - 1)
+            tasks.append((None, args.seed + i, size, args.loops))
+    levels = build_levels(tasks, min(args.jobs, len(tasks)))
+    write_pack(args.pack_file, levels, len(tasks),
+               mapfile.PACKED if args.packed else mapfile.RAW)
+    sys.stdout.write("{}: {} levels\n".format(args.pack_file, len(tasks)))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,28 @@
 
 """This module contains the 'Player' class."""
 
+from grid import Grid
+
 
 class Player:
     """This class is used to represent the player in the labyrinth."""
 
+    # the attributes are stored in slots (no '__dict__'), which is compact
+    __slots__ = ("is_alive", "wins", "x_pos", "y_pos")
+
     def __init__(self, x_pos, y_pos):
         """This special method is the class constructor."""
         self.is_alive = True
         self.wins = False
         self.x_pos = x_pos  # type is int
         self.y_pos = y_pos  # type is int
-        self.authorized_movements = {"up": False, "down": False,
-                                     "left": False, "right": False}
+
+    def can_move(self, passability, direction):
+        """This method returns True if the player can move one step
+        into 'direction', according to the passability table
+        of the labyrinth grid (cf. 'Grid.passability')."""
+        return bool(passability.item(self.y_pos, self.x_pos)
+                    & Grid.DIRECTION_BITS[direction])
 
     def move(self, direction):
         """This method moves the player one step into 'direction',
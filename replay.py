@@ -0,0 +1,211 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module records games in run files, and replays them
+without any display, to check that they give the same final state.
+
+A run file starts with a header of HEADER_SIZE bytes
+(little-endian, cf. HEADER_FORMAT):
+    magic number     4 bytes   b"MGRN"
+    format version   uint16    FORMAT_VERSION
+    seed             uint64    seed of the game (cf. 'GameSession.reset')
+    checksum         uint32    CRC-32 of the map (cf. 'Grid.checksum')
+    moves number     uint32    number of actions accepted
+    x, y             uint32    final player location
+    found            uint32    found tools, one bit per tool (first: bit 0)
+    tools number     uint16
+    is alive         uint8
+    wins             uint8
+    map name size    uint16
+then the map file name (UTF-8, e.g. 'pack.mgpk#3' for a level of a map
+pack, cf. mappack module), then the actions accepted, one byte each
+(cf. 'GameSession.ACTION_CODES'), the blocked actions are not recorded.
+The runs of the format version 1 also hold the blocked actions: they are
+replayed as well, but their number of steps is not checked.
+
+Please execute this file with Python to replay run files, e.g.:
+    python replay.py runs/*.run
+One JSON line is written per run, and the exit status is 1 if a run
+cannot be replayed or does not give the recorded final state.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import struct
+import sys
+import time
+
+from grid import atomic_write
+from labyrinth import Labyrinth
+from mappack import parse_level_name
+from session import GameSession, GameState
+
+
+MAGIC = b"MGRN"
+FORMAT_VERSION = 2
+HEADER_FORMAT = "<4sHQIIIIIHBBH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RUN_EXTENSION = ".run"
+MAX_TOOLS = 32  # the found tools are stored on 32 bits
+
+# a recorded game: the final state is the one of 'GameSession.state'
+# (its number of steps is None if unknown, cf. module docstring)
+Run = collections.namedtuple("Run", ["seed", "checksum", "map_file",
+                                     "moves", "final"])
+
+# the labyrinths already loaded by this process, by map file,
+# since many runs are usually played on the same maps
+_labyrinths = {}
+
+
+def save_run(session, run_file, map_file):
+    """This function writes the game of 'session', played on the map
+    file 'map_file', to the run file 'run_file'.
+    The file is replaced atomically.
+    A ValueError is raised if the game cannot be recorded."""
+    state = session.state()
+    # the player location is (-1, -1) if the map has no start point
+    if state.x_pos < 0 or state.y_pos < 0:
+        raise ValueError("There is no start point!")
+    if len(state.found) > MAX_TOOLS:
+        raise ValueError("Too many tools: {}".format(len(state.found)))
+    found = sum(1 << i for i, tool_found in enumerate(state.found)
+                if tool_found)
+    name = map_file.encode("utf-8")
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, session.seed,
+                         session.labyrinth.grid.checksum(),
+                         len(session.moves), state.x_pos, state.y_pos,
+                         found, len(state.found), state.is_alive, state.wins,
+                         len(name))
+    with atomic_write(run_file, "wb") as stream:
+        stream.write(header)
+        stream.write(name)
+        stream.write(session.moves)
+
+
+def load_run(run_file):
+    """This function reads a run file, and returns a 'Run'."""
+    with open(run_file, "rb") as stream:
+        data = stream.read()
+    if len(data) < HEADER_SIZE:
+        raise ValueError("truncated run header")
+    magic, version, seed, checksum, moves_qty, x_pos, y_pos, found,\
+        tools_qty, is_alive, wins, name_size =\
+        struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise ValueError("not a run file: {!r}".format(magic))
+    if version > FORMAT_VERSION:
+        raise ValueError("unsupported run format version: {}"
+                         .format(version))
+    moves = data[HEADER_SIZE + name_size:]
+    if len(moves) != moves_qty:
+        raise ValueError("truncated run moves")
+    if moves and max(moves) >= len(GameSession.ACTIONS):
+        raise ValueError("unknown action code: {}".format(max(moves)))
+    map_file = data[HEADER_SIZE:HEADER_SIZE + name_size].decode("utf-8")
+    final = GameState(x_pos, y_pos,
+                      tuple(bool(found >> i & 1) for i in range(tools_qty)),
+                      bool(is_alive), bool(wins),
+                      moves_qty if version >= 2 else None)
+    return Run(seed, checksum, map_file, moves, final)
+
+
+def replay(run, labyrinth):
+    """This function replays the run 'run' on 'labyrinth',
+    and returns the final state.
+    It raises ValueError if the labyrinth is not the recorded one."""
+    if labyrinth.grid.checksum() != run.checksum:
+        raise ValueError("the map is not the recorded one")
+    session = GameSession(labyrinth)
+    session.reset(run.seed)
+    return session.play(run.moves)
+
+
+def verify_run(run_file, map_file=None):
+    """This function replays the run file 'run_file', on its map file
+    or on 'map_file' if given, and returns the result as a dictionary:
+    {"run": ..., "ok": ..., "steps": ...} (with "expected" and "replayed"
+    final states if they differ), or {"run": ..., "ok": False, "error": ...}.
+    """
+    try:
+        run = load_run(run_file)
+        map_file = map_file or run.map_file
+        labyrinth = _labyrinths.get(map_file)
+        if labyrinth is None:
+            # the map can be a level of a map pack (e.g. 'pack.mgpk#3')
+            labyrinth = _labyrinths[map_file] =\
+                Labyrinth(*parse_level_name(map_file))
+        final = replay(run, labyrinth)
+        if run.final.steps is None:
+            final = final._replace(steps=None)
+    except (OSError, ValueError) as error:
+        return {"run": run_file, "ok": False, "error": str(error)}
+    result = {"run": run_file, "ok": final == run.final,
+              "steps": len(run.moves)}
+    if not result["ok"]:
+        result["expected"] = run.final._asdict()
+        result["replayed"] = final._asdict()
+    return result
+
+
+def _verify_task(task):
+    """This protected function calls 'verify_run' with 'task'
+    = (run_file, map_file), for the processes pool."""
+    return verify_run(*task)
+
+
+def verify_all(run_files, map_file=None, jobs=1):
+    """This generator yields the result of each run file,
+    in the same order, replayed by 'jobs' processes."""
+    if jobs == 1 or len(run_files) < 2:
+        for run_file in run_files:
+            yield verify_run(run_file, map_file)
+        return
+    # the runs are sent by chunks, since most of them are replayed quickly
+    chunksize = max(1, len(run_files) // (jobs * 4))
+    tasks = [(run_file, map_file) for run_file in run_files]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        for result in executor.map(_verify_task, tasks,
+                                   chunksize=chunksize):
+            yield result
+
+
+def main():
+    """This function is the main function to be executed
+    to replay run files."""
+    parser = argparse.ArgumentParser(
+        description="Replay recorded games and check their final state.")
+    parser.add_argument("run_files", nargs="+", help="run files")
+    parser.add_argument("-m", "--map",
+                        help="map file (default: the recorded one)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of processes (default: one per core)")
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("the number of processes has to be positive")
+
+    jobs = min(args.jobs, len(args.run_files))
+    failed = 0
+    steps = 0
+    start = time.perf_counter()
+    for result in verify_all(args.run_files, args.map, jobs):
+        if not result["ok"]:
+            failed += 1
+        steps += result.get("steps", 0)
+        sys.stdout.write(json.dumps(result) + "\n")
+    duration = time.perf_counter() - start
+
+    # throughput, on the standard error to keep the output parsable
+    sys.stderr.write("{} runs, {} failed, {} steps, {:.2f} s, "
+                     "{:.0f} runs/s\n"
+                     .format(len(args.run_files), failed, steps, duration,
+                             len(args.run_files) / duration
+                             if duration else 0.0))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
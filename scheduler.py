@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'FrameScheduler' class.
+The main loops (game and edit modes) get their events from the scheduler,
+one frame at a time:
+- when there is nothing to do, the scheduler blocks until the next event
+(or a timeout), instead of polling, thus an idle window costs no CPU,
+- the frame rate is limited to 'fps' frames per second,
+- the bursts of repeated keys (key repeat) are merged, thus a frame
+plays one move per key, however late it is; only the repeats of a held
+key are merged (a key pressed again after its release is kept),
+- the frame times are measured (cf. 'stats').
+This module uses pygame as main support.
+"""
+
+import time
+
+import pygame
+from pygame.locals import *
+
+
+class FrameScheduler:
+    """This class gives the events to the main loops, frame by frame."""
+
+    def __init__(self, fps=60):
+        """This special method is the class constructor."""
+        if fps <= 0:
+            raise ValueError(fps)
+        self.fps = fps  # type is int (maximal number of frames per second)
+        self._frame_start = 0.0  # start time of the current frame
+        # statistics
+        self.frames = 0  # type is int
+        self.total_frame_time = 0.0  # type is float (seconds)
+        self.max_frame_time = 0.0  # type is float (seconds)
+        self.last_frame_time = 0.0  # type is float (seconds)
+        self.idle_time = 0.0  # type is float (seconds spent waiting)
+        self.merged_events = 0  # type is int (repeated keys merged)
+        # the keys pressed and not released yet: their next presses
+        # are key repeats
+        self._held_keys = set()
+
+    def wait_events(self, timeout=None):
+        """This method returns the events of the next frame.
+        If there is no pending event, it blocks until the next one,
+        or during 'timeout' milliseconds at most (the list can be empty).
+        We assume that pygame has been initialized."""
+        wait_start = time.perf_counter()
+        # we keep the frame rate under 'fps'
+        delay = self._frame_start + 1 / self.fps - wait_start
+        if delay > 0:
+            pygame.time.wait(int(delay * 1000))
+        events = pygame.event.get()
+        if not events:
+            # nothing to do: we sleep until something happens
+            if timeout is None:
+                event = pygame.event.wait()
+            else:
+                event = pygame.event.wait(max(1, int(timeout)))
+            if event.type != NOEVENT:
+                events = [event] + pygame.event.get()
+        self._frame_start = time.perf_counter()
+        self.idle_time += self._frame_start - wait_start
+        return self.merge_repeated_keys(events)
+
+    def end_frame(self):
+        """This method records the duration of the frame,
+        i.e. the time since the events were returned."""
+        frame_time = time.perf_counter() - self._frame_start
+        self.frames += 1
+        self.last_frame_time = frame_time
+        self.total_frame_time += frame_time
+        self.max_frame_time = max(self.max_frame_time, frame_time)
+
+    def merge_repeated_keys(self, events):
+        """This method returns the events, where each series
+        of consecutive repeats of a held key is merged in one press.
+        A key is held from its press to its release, thus the quick
+        presses of a key (e.g. a double tap) are all kept."""
+        merged = []
+        held_keys = self._held_keys
+        for event in events:
+            if event.type == KEYDOWN:
+                if event.key in held_keys and merged\
+                        and merged[-1].type == KEYDOWN\
+                        and merged[-1].key == event.key:
+                    self.merged_events += 1
+                    continue
+                held_keys.add(event.key)
+            elif event.type == KEYUP:
+                held_keys.discard(event.key)
+            elif event.type == WINDOWFOCUSLOST:
+                # the releases are not received without the focus
+                held_keys.clear()
+            merged.append(event)
+        return merged
+
+    def stats(self):
+        """This method returns the statistics as a dictionary."""
+        mean = self.total_frame_time / self.frames if self.frames else 0.0
+        return {"fps": self.fps, "frames": self.frames,
+                "mean_frame_time": mean,
+                "max_frame_time": self.max_frame_time,
+                "idle_time": self.idle_time,
+                "merged_events": self.merged_events}
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'GameSession' class.
+This is the game logic, without any display: a session plays one game
+on a labyrinth, one action (i.e. one player move) at a time.
+It is used by the game front end (cf. game module), and can be used
+to simulate games (bots, regression tests) without pygame.
+
+The actions are the player moves: "up", "down", "left" and "right".
+A game is deterministic: the same seed (cf. 'reset') and the same actions
+always give the same game. The accepted actions are kept, one byte each
+(cf. 'moves'), thus a game can be recorded and replayed (cf. replay module);
+a blocked action changes nothing, thus it is neither kept nor counted
+as a step.
+Each step returns the new game state and what happened ("event"):
+"blocked" (the move is forbidden by a wall), "moved", "tool" (a tool is
+found), "win" or "lose" (the player reached the guard, with or without
+all the tools).
+"""
+
+import collections
+import random
+
+from player import Player
+
+
+# the game state, which is also a snapshot (cf. 'GameSession.restore')
+GameState = collections.namedtuple("GameState", ["x_pos", "y_pos", "found",
+                                                 "is_alive", "wins", "steps"])
+
+
+class GameSession:
+    """This class allows to play a game on a labyrinth, step by step."""
+
+    ACTIONS = ("up", "down", "left", "right")
+    # the code of each action in 'moves'
+    ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+    MAX_SEED = 2 ** 32  # the random seeds are lower than this one
+
+    def __init__(self, labyrinth):
+        """This special method is the class constructor."""
+        self.labyrinth = labyrinth  # type is <class 'Labyrinth'>
+        self.steps = 0  # type is int (number of actions accepted)
+        self.seed = None  # type is int (seed of the current game)
+        # the codes of the actions accepted (cf. ACTION_CODES)
+        self.moves = bytearray()
+
+    @property
+    def player(self):
+        """This property returns the player of the current game."""
+        return self.labyrinth.player
+
+    @property
+    def is_over(self):
+        """This property returns True if the player wins or loses."""
+        return self.player.wins or not self.player.is_alive
+
+    def reset(self, seed=None):
+        """This method starts a new game: the tools are positioned
+        randomly ('seed' gives the same positions for the same map),
+        and the player is located on the start point.
+        If 'seed' is None, a random seed is chosen, thus the game
+        can still be replayed (cf. 'self.seed').
+        It returns the game state."""
+        if seed is None:
+            seed = random.randrange(self.MAX_SEED)
+        laby = self.labyrinth
+        laby.tools = laby.position_tools_randomly(random.Random(seed))
+        laby.player = Player(-1, -1)
+        laby.initialize_player_location()
+        self.seed = seed
+        self.steps = 0
+        self.moves = bytearray()
+        return self.state()
+
+    def step(self, action):
+        """This method plays the action 'action' (a player move),
+        and returns a tuple (state, event)."""
+        if action not in self.ACTION_CODES:
+            raise ValueError(action)
+        if self.is_over:
+            raise ValueError("The game is over!")
+        moved, found = self._play(action)
+        player = self.labyrinth.player
+        if player.wins:
+            event = "win"
+        elif not player.is_alive:
+            event = "lose"
+        elif found:
+            event = "tool"
+        elif moved:
+            event = "moved"
+        else:
+            event = "blocked"
+        return self.state(), event
+
+    def play(self, moves):
+        """This method plays the actions given by their codes 'moves'
+        (cf. 'self.moves'), without building the intermediate states,
+        and returns the final state.
+        It raises ValueError if an action is played after the game end."""
+        actions = self.ACTIONS
+        play = self._play
+        player = self.labyrinth.player
+        for code in moves:
+            if player.wins or not player.is_alive:
+                raise ValueError("The game is over!")
+            play(actions[code])
+        return self.state()
+
+    def state(self):
+        """This method returns the game state (cf. 'GameState')."""
+        player = self.labyrinth.player
+        return GameState(player.x_pos, player.y_pos,
+                         tuple([tool.found for tool in self.labyrinth.tools]),
+                         player.is_alive, player.wins, self.steps)
+
+    def snapshot(self):
+        """This method returns a snapshot of the current game,
+        i.e. its state, which is immutable."""
+        return self.state()
+
+    def restore(self, snapshot):
+        """This method restores a snapshot taken during the same game
+        (the tools locations are not part of the snapshot)."""
+        player = self.labyrinth.player
+        player.x_pos = snapshot.x_pos
+        player.y_pos = snapshot.y_pos
+        player.is_alive = snapshot.is_alive
+        player.wins = snapshot.wins
+        for tool, found in zip(self.labyrinth.tools, snapshot.found):
+            tool.found = found
+        self.steps = snapshot.steps
+        del self.moves[snapshot.steps:]
+
+    def _play(self, action):
+        """This protected method applies the game rules to 'action',
+        which is valid, and returns a tuple (moved, found tools)."""
+        laby = self.labyrinth
+        player = laby.player
+        # we apply the game rules, in the same order as the game loop
+        moved = player.can_move(laby.grid.passability, action)
+        if moved:
+            player.move(action)
+        found = laby.find_tool()
+        laby.analyze_game_status()
+        # only the accepted actions are counted and kept
+        if moved or found:
+            self.steps += 1
+            self.moves.append(self.ACTION_CODES[action])
+        return moved, found
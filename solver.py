@@ -0,0 +1,411 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'RouteSolver' class,
+and the 'distance_field' function used by it.
+
+A distance field gives, for each location, the number of moves needed
+to reach a given location (or -1 if it cannot be reached).
+The solver computes the distances between the targets (each tool, and
+the location to win next to the guard), one search per target which stops
+once all the targets are reached, then the best order to visit them:
+- with a dynamic programming over the subsets of targets ("bitmask DP")
+if there are at most DP_MAX_TARGETS targets,
+- otherwise with the nearest target first, improved by reversing
+parts of the order ("2-opt").
+Only these distances are kept (not one field per target), with the field
+of the current target (the first one of the order): since the moves are
+symmetric, the next moves towards it are read in its field.
+The order is planned once, then the tools found are removed from it:
+a new order is planned only for new targets (e.g. a new game),
+or if the grid is modified (cf. 'Grid.version').
+
+Please execute this file with Python to print the optimal route length
+of map files (our difficulty metric), e.g.:
+    python solver.py data/grid.csv generated/*.laby
+"""
+
+import argparse
+import collections
+import json
+import sys
+
+import numpy as np
+
+from labyrinth import Labyrinth
+from session import GameSession
+from validator import PlayabilityValidator
+
+
+FREE_VALUES = (0, 3)  # values of the cells where the player can go
+# the player moves: direction -> (x, y) step
+MOVES = {"up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+# a route: the targets in the visiting order (the location to win last),
+# the locations from the start to the location to win, and the moves number
+Route = collections.namedtuple("Route", ["order", "cells", "length"])
+
+
+def distance_field(grid, x_pos, y_pos, values=FREE_VALUES, goals=None):
+    """This function returns an array (int32, one item per cell)
+    with the number of moves from (x_pos, y_pos) to each cell,
+    through the cells whose value is in 'values', or -1 if there is
+    no path. The search is a breadth-first search, level by level.
+    If the locations (x, y) 'goals' are given, the search stops
+    once they are all reached: the farther cells are then -1."""
+    width = grid.width + 2
+    # we surround the grid with a border of blocked cells,
+    # thus we do not have to check the grid limits (cf. 'Grid.flood_fill')
+    free = np.zeros((grid.height + 2, width), dtype=np.uint8)
+    free[1:-1, 1:-1] = np.isin(grid.cells, values)
+    size = free.size
+    free = bytearray(free.tobytes())
+    start = (y_pos + 1) * width + x_pos + 1
+    visited = []  # the reached cells, level by level
+    counts = []  # the number of reached cells of each level
+    if goals is not None:
+        # the goals not reached yet, as indices in the bordered grid
+        goals = {(y_goal + 1) * width + x_goal + 1
+                 for x_goal, y_goal in goals}
+    if free[start]:
+        free[start] = 0
+        frontier = [start]
+        while frontier:
+            visited.extend(frontier)
+            counts.append(len(frontier))
+            if goals is not None:
+                goals.difference_update(frontier)
+                if not goals:
+                    break
+            next_frontier = []
+            push = next_frontier.append
+            # the four neighbours are unrolled, since this is the hot loop
+            for i in frontier:
+                j = i - width
+                if free[j]:
+                    free[j] = 0
+                    push(j)
+                j = i + width
+                if free[j]:
+                    free[j] = 0
+                    push(j)
+                j = i - 1
+                if free[j]:
+                    free[j] = 0
+                    push(j)
+                j = i + 1
+                if free[j]:
+                    free[j] = 0
+                    push(j)
+            frontier = next_frontier
+    distances = np.full(size, -1, dtype=np.int32)
+    distances[np.array(visited, dtype=np.intp)] = np.repeat(
+        np.arange(len(counts), dtype=np.int32), counts)
+    return distances.reshape(grid.height + 2, width)[1:-1, 1:-1]
+
+
+class RouteSolver:
+    """This class computes the shortest route collecting all the tools
+    of a labyrinth, then reaching the guard."""
+
+    DP_MAX_TARGETS = 10  # maximal number of targets for the exact order
+
+    def __init__(self, labyrinth):
+        """This special method is the class constructor."""
+        self.labyrinth = labyrinth  # type is <class 'Labyrinth'>
+        # the field of the current target (cf. 'field')
+        self._field = None  # type is numpy.ndarray
+        self._field_location = None  # type is tuple (x, y)
+        # 'self._distances' type is dict: (x, y) -> dict: (x, y) -> int,
+        # the distances between the targets (cf. '_distances_from')
+        self._distances = {}
+        # the planned order, targets and location to win (cf. 'plan')
+        self._order = None  # type is list containing tuples (x, y)
+        self._version = None  # grid version of the data above
+        self._win_location = None  # type is tuple (x, y)
+        # counters of computed fields and orders (useful for statistics)
+        self.field_computations = 0  # type is int
+        self.plan_computations = 0  # type is int
+
+    @property
+    def win_location(self):
+        """This property returns the location next to the guard."""
+        self._check_version()
+        if self._win_location is None:
+            validator = PlayabilityValidator(self.labyrinth.grid)
+            self._win_location = validator.win_location()
+        return self._win_location
+
+    def field(self, x_pos, y_pos):
+        """This method returns the distance field of (x_pos, y_pos).
+        Only the last field is kept (usually, the one of the current
+        target), until the grid is modified."""
+        self._check_version()
+        if self._field_location != (x_pos, y_pos):
+            self._field = distance_field(self.labyrinth.grid, x_pos, y_pos)
+            self._field_location = (x_pos, y_pos)
+            self.field_computations += 1
+        return self._field
+
+    def distance(self, source, target):
+        """This method returns the number of moves from the location
+        'source' to the location 'target', or -1 if there is no path."""
+        return self.field(*target).item(source[1], source[0])
+
+    def targets(self):
+        """This method returns the locations of the tools not found yet,
+        except the tools on the location to win, which are found
+        when reaching it at the end."""
+        win = self.win_location
+        return [(tool.x_pos, tool.y_pos) for tool in self.labyrinth.tools
+                if not tool.found and (tool.x_pos, tool.y_pos) != win]
+
+    def plan(self, x_pos, y_pos):
+        """This method returns the best order of the targets from
+        (x_pos, y_pos), as a tuple (list of targets ending with the
+        location to win, number of moves).
+        The order is kept while the targets are found (cf. module
+        docstring), thus the next calls cost one field read."""
+        start = (x_pos, y_pos)
+        # several tools can be on the same location
+        targets = list(dict.fromkeys(self.targets()))
+        order = self._kept_order(targets)
+        if order is None:
+            order = self._plan_order(start, targets)
+        # the targets are in the order, thus they can be reached
+        distance = self.distance(start, order[0])
+        if distance < 0:
+            raise ValueError("A target cannot be reached!")
+        length = distance
+        for source, target in zip(order, order[1:]):
+            length += self._distances[source][target]
+        return list(order), length
+
+    def _kept_order(self, targets):
+        """This protected method returns the planned order without the
+        targets found since it was planned, or None if there is no order
+        for these targets (or if the grid was modified).
+        Skipping the targets found on the way never makes the route
+        longer, since the distances respect the triangle inequality."""
+        self._check_version()
+        if self._order is None:
+            return None
+        remaining = set(targets)
+        order = [target for target in self._order[:-1]
+                 if target in remaining]
+        if len(order) != len(remaining):
+            return None
+        self._order = order + self._order[-1:]
+        return self._order
+
+    def _plan_order(self, start, targets):
+        """This protected method computes the best order of the targets
+        from 'start', ending with the location to win, and keeps it."""
+        win = self.win_location
+        # distances between the start (index -1), the targets,
+        # and the location to win (index 'len(targets)')
+        points = targets + [win]
+        start_distances = self._distances_from(start, points, keep=False)
+        matrix = []
+        for source in targets:
+            distances = self._distances_from(source, points)
+            matrix.append([distances[target] for target in points])
+        matrix.append([start_distances[target] for target in points])
+        if any(-1 in row for row in matrix):
+            raise ValueError("A target cannot be reached!")
+        if len(targets) <= self.DP_MAX_TARGETS:
+            order = self._exact_order(matrix)
+        else:
+            order = self._approximate_order(matrix)
+        self._order = [targets[i] for i in order] + [win]
+        self.plan_computations += 1
+        return self._order
+
+    def _distances_from(self, source, points, keep=True):
+        """This protected method returns the distances from 'source'
+        to the locations 'points', as a dictionary (x, y) -> int
+        (-1 if there is no path). They are computed with one search,
+        which stops once all the points are reached, and kept
+        until the grid is modified if 'keep' is True."""
+        self._check_version()
+        distances = self._distances.get(source)
+        if distances is not None and all(point in distances
+                                         for point in points):
+            return distances
+        field = distance_field(self.labyrinth.grid, source[0], source[1],
+                               goals=points)
+        self.field_computations += 1
+        distances = {point: field.item(point[1], point[0])
+                     for point in points}
+        if keep:
+            self._distances[source] = distances
+        return distances
+
+    def solve(self):
+        """This method returns the shortest route (cf. 'Route')
+        from the player location."""
+        player = self.labyrinth.player
+        order, length = self.plan(player.x_pos, player.y_pos)
+        cells = [(player.x_pos, player.y_pos)]
+        for target in order:
+            cells.extend(self.path(cells[-1][0], cells[-1][1], target))
+        return Route(order, cells, length)
+
+    def path(self, x_pos, y_pos, target, limit=None):
+        """This method returns the locations of a shortest path
+        from (x_pos, y_pos) to 'target' (excluded the first one,
+        included the last one), or its first 'limit' locations."""
+        field = self.field(*target)
+        grid = self.labyrinth.grid
+        distance = field.item(y_pos, x_pos)
+        if distance < 0:
+            raise ValueError("The target cannot be reached!")
+        if limit is not None:
+            distance = min(distance, limit)
+        cells = []
+        for _ in range(distance):
+            # a neighbour one move closer to the target
+            closer = field.item(y_pos, x_pos) - 1
+            for x_step, y_step in MOVES.values():
+                x_n = x_pos + x_step
+                y_n = y_pos + y_step
+                if 0 <= x_n < grid.width and 0 <= y_n < grid.height\
+                        and field.item(y_n, x_n) == closer:
+                    break
+            x_pos = x_n
+            y_pos = y_n
+            cells.append((x_pos, y_pos))
+        return cells
+
+    def next_move(self, x_pos, y_pos):
+        """This method returns the first move ("up", "down", "left" or
+        "right") of the best route from (x_pos, y_pos),
+        or None if the player is on the location to win."""
+        order, _ = self.plan(x_pos, y_pos)
+        # the first target which is not the player location
+        steps = []
+        for target in order:
+            steps = self.path(x_pos, y_pos, target, limit=1)
+            if steps:
+                break
+        if not steps:
+            return None
+        move = (steps[0][0] - x_pos, steps[0][1] - y_pos)
+        for direction, direction_step in MOVES.items():
+            if direction_step == move:
+                return direction
+
+    def _check_version(self):
+        """This protected method drops the field, the distances
+        and the order if the grid changed."""
+        version = self.labyrinth.grid.version
+        if version != self._version:
+            self._field = None
+            self._field_location = None
+            self._distances.clear()
+            self._order = None
+            self._win_location = None
+            self._version = version
+
+    @staticmethod
+    def _order_length(matrix, order):
+        """This protected method returns the number of moves
+        to visit the targets in 'order', from the start, then to reach
+        the location to win (cf. 'plan' for 'matrix')."""
+        length = 0
+        previous = -1
+        for i in order:
+            length += matrix[previous][i]
+            previous = i
+        return length + matrix[previous][-1]
+
+    @staticmethod
+    def _exact_order(matrix):
+        """This protected method returns the best order of the targets,
+        with a dynamic programming over the subsets of targets:
+        'costs[mask][i]' is the shortest route from the start visiting
+        the targets of 'mask', and ending on the target 'i'."""
+        targets_qty = len(matrix) - 1
+        if not targets_qty:
+            return []
+        full = (1 << targets_qty) - 1
+        infinite = float("inf")
+        costs = [[infinite] * targets_qty for _ in range(full + 1)]
+        previous = [[-1] * targets_qty for _ in range(full + 1)]
+        for i in range(targets_qty):
+            costs[1 << i][i] = matrix[-1][i]
+        for mask in range(1, full + 1):
+            mask_costs = costs[mask]
+            for i in range(targets_qty):
+                cost = mask_costs[i]
+                if cost == infinite:
+                    continue
+                row = matrix[i]
+                for j in range(targets_qty):
+                    if mask & (1 << j):
+                        continue
+                    new_mask = mask | (1 << j)
+                    if cost + row[j] < costs[new_mask][j]:
+                        costs[new_mask][j] = cost + row[j]
+                        previous[new_mask][j] = i
+        # the route ends at the location to win
+        last = min(range(targets_qty),
+                   key=lambda i: costs[full][i] + matrix[i][-1])
+        order = []
+        mask = full
+        while last != -1:
+            order.append(last)
+            last, mask = previous[mask][last], mask & ~(1 << last)
+        return order[::-1]
+
+    def _approximate_order(self, matrix):
+        """This protected method returns a good order of the targets:
+        the nearest target first, then the order is improved by reversing
+        any part which makes the route shorter (2-opt)."""
+        targets_qty = len(matrix) - 1
+        order = []
+        remaining = set(range(targets_qty))
+        previous = -1
+        while remaining:
+            previous = min(remaining, key=matrix[previous].__getitem__)
+            order.append(previous)
+            remaining.remove(previous)
+        # reversing the part from i to j only changes its two ends, since
+        # the distances between the targets are symmetric: the gain is
+        # computed in O(1) ('-1' is the start row, and the win column)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(targets_qty - 1):
+                before = matrix[order[i - 1] if i else -1]
+                for j in range(i + 1, targets_qty):
+                    after = order[j + 1] if j + 1 < targets_qty else -1
+                    first = order[i]
+                    last = order[j]
+                    if before[last] + matrix[first][after]\
+                            < before[first] + matrix[last][after]:
+                        order[i:j + 1] = order[i:j + 1][::-1]
+                        improved = True
+        return order
+
+
+def main():
+    """This function is the main function to be executed
+    to print the optimal route length of map files."""
+    parser = argparse.ArgumentParser(
+        description="Print the optimal route length of labyrinth map files.")
+    parser.add_argument("map_files", nargs="+", help="map files")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="seed of the tools positions (default: 0)")
+    args = parser.parse_args()
+
+    for map_file in args.map_files:
+        session = GameSession(Labyrinth(map_file))
+        session.reset(args.seed)
+        route = RouteSolver(session.labyrinth).solve()
+        sys.stdout.write(json.dumps({"map": map_file, "seed": args.seed,
+                                     "length": route.length}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'StartupProfile' class,
+and the profile shared by the whole application: 'PROFILE'.
+
+The game and edit modes import this module first, thus it can time
+the next imports, when the option '--startup-profile' is given
+(the imports are done before the options are parsed, thus the option
+is looked for directly in 'sys.argv'). Then the main functions mark
+the startup phases (cf. 'mark'), and the breakdown is written on the
+standard error when the first frame is displayed (cf. 'report').
+Without the option, nothing is timed.
+"""
+
+import builtins
+import sys
+import time
+
+
+OPTION = "--startup-profile"
+TOP_IMPORTS = 10  # number of imports in the breakdown
+
+
+class StartupProfile:
+    """This class times the imports and the phases of the startup."""
+
+    def __init__(self):
+        """This special method is the class constructor."""
+        self.start = time.perf_counter()  # type is float (seconds)
+        self.enabled = False  # type is bool
+        # 'self.phases' type is list containing tuples (name, seconds)
+        self.phases = []
+        # 'self.imports' type is list containing tuples (name, seconds),
+        # for the imports done directly by the main module
+        self.imports = []
+        self._last_mark = self.start
+        self._depth = 0  # nesting level of the current import
+        self._original_import = None
+
+    def enable(self):
+        """This method starts timing the imports."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def mark(self, name):
+        """This method records the phase 'name', which lasted
+        since the previous mark (or since this module import)."""
+        now = time.perf_counter()
+        if self.enabled:
+            self.phases.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    def report(self, stream=None, background=None):
+        """This method stops timing the imports, and writes the breakdown
+        (milliseconds) on 'stream' (the standard error by default).
+        'background' gives the durations of the background tasks:
+        dictionary name -> seconds (None if it is not finished)."""
+        if not self.enabled:
+            return
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        stream = stream or sys.stderr
+        lines = ["startup profile (ms):"]
+        imports = sorted(self.imports, key=lambda item: -item[1])
+        lines.append("  imports: {:.1f}".format(
+            sum(seconds for _, seconds in self.imports) * 1000))
+        for name, seconds in imports[:TOP_IMPORTS]:
+            lines.append("    {:<24} {:8.1f}".format(name, seconds * 1000))
+        for name, seconds in self.phases:
+            lines.append("  {:<26} {:8.1f}".format(name, seconds * 1000))
+        lines.append("  {:<26} {:8.1f}".format(
+            "total", (self._last_mark - self.start) * 1000))
+        for name, seconds in (background or {}).items():
+            name = "{} (background)".format(name)
+            if seconds is None:
+                lines.append("  {:<26} {:>8}".format(name, "running"))
+            else:
+                lines.append("  {:<26} {:8.1f}".format(name,
+                                                        seconds * 1000))
+        stream.write("\n".join(lines) + "\n")
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(),
+                      level=0):
+        """This protected method replaces the built-in '__import__',
+        and times the imports of new modules."""
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist,
+                                         level)
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            return self._original_import(name, globals, locals, fromlist,
+                                         level)
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.imports.append((name, time.perf_counter() - start))
+
+
+# the profile shared by the whole application
+PROFILE = StartupProfile()
+if OPTION in sys.argv[1:]:
+    PROFILE.enable()
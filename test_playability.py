@@ -0,0 +1,227 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module tests the playability check of the labyrinths
+(cf. 'Labyrinth.analyze_playability'), and especially the rule #8
+(the player has to be able to reach the exit from each location),
+against a reference breadth-first search written independently.
+
+The random maps are built to respect the rules #1 to #7, thus only the
+rule #8 decides if they are playable. They are seeded: a failure
+can be reproduced with the seed given in its message.
+
+The incremental updates of the validator (cf. 'PlayabilityValidator.apply')
+are also checked, on random edits of these maps, and on walls painted
+in an open room, which must not need any full recomputation.
+
+Please execute this file with Python (or pytest) to run the tests:
+    python -m pytest test_playability.py
+"""
+
+import collections
+import os
+import random
+import unittest
+
+import numpy as np
+
+from grid import Grid
+from labyrinth import Labyrinth
+from validator import PlayabilityValidator
+
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "data", "grid.csv")
+RANDOM_MAPS = 600  # number of random maps
+MIN_SIZE = 5  # the smallest maps have a 3 x 3 inside
+MAX_SIZE = 12
+WALL_DENSITY = 0.35  # probability of an inside wall
+EDITS = 40  # number of random edits per map
+ROOM_SIZE = 60  # size of the open room map
+ROOM_WALLS = 30  # number of walls painted in the open room
+
+
+def reference_unreachable(cells):
+    """This function returns the set of the free locations (x, y)
+    (paths and start point) from which the location next to the guard
+    cannot be reached, with a plain breadth-first search.
+    We assume that there is one guard, on an edge."""
+    height, width = cells.shape
+    (y_2,), (x_2,) = np.nonzero(cells == 2)
+    if x_2 == 0:
+        win = (1, y_2)
+    elif x_2 == width - 1:
+        win = (width - 2, y_2)
+    elif y_2 == 0:
+        win = (x_2, 1)
+    else:
+        win = (x_2, height - 2)
+    free = {(x, y) for y in range(height) for x in range(width)
+            if cells[y, x] in (0, 3)}
+    reached = {win} if win in free else set()
+    queue = collections.deque(reached)
+    while queue:
+        x, y = queue.popleft()
+        for neighbour in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)):
+            if neighbour in free and neighbour not in reached:
+                reached.add(neighbour)
+                queue.append(neighbour)
+    return free - reached
+
+
+def random_cells(rng):
+    """This function returns the cells of a random map respecting
+    the rules #1 to #7 (cf. 'Labyrinth.analyze_playability'),
+    or None if the random inside has not enough paths."""
+    width = rng.randint(MIN_SIZE, MAX_SIZE)
+    height = rng.randint(MIN_SIZE, MAX_SIZE)
+    cells = np.ones((height, width), dtype=np.uint8)
+    for y in range(1, height - 1):
+        for x in range(1, width - 1):
+            cells[y, x] = rng.random() < WALL_DENSITY
+    # the guard on an edge (not a corner), and the direction inside
+    edge = rng.choice(("left", "right", "top", "bottom"))
+    if edge in ("left", "right"):
+        y_2 = rng.randint(1, height - 2)
+        x_2 = 0 if edge == "left" else width - 1
+        x_step, y_step = (1 if edge == "left" else -1), 0
+    else:
+        x_2 = rng.randint(1, width - 2)
+        y_2 = 0 if edge == "top" else height - 1
+        x_step, y_step = 0, (1 if edge == "top" else -1)
+    cells[y_2, x_2] = 2
+    # rule #6: the location to win is a path, with walls on its sides
+    # and a path in front of it
+    x_win, y_win = x_2 + x_step, y_2 + y_step
+    cells[y_win, x_win] = 0
+    cells[y_win + x_step, x_win + y_step] = 1
+    cells[y_win - x_step, x_win - y_step] = 1
+    cells[y_win + y_step, x_win + x_step] = 0
+    # rules #1 and #5: one start point, which is not the location to win
+    # (the guard has no other neighbour inside)
+    paths = [(x, y) for y in range(1, height - 1)
+             for x in range(1, width - 1)
+             if cells[y, x] == 0 and (x, y) != (x_win, y_win)]
+    # rule #7: at least 3 paths remain for the tools
+    if len(paths) < 4:
+        return None
+    x_3, y_3 = rng.choice(paths)
+    cells[y_3, x_3] = 3
+    return cells
+
+
+class PlayabilityTest(unittest.TestCase):
+    """This class compares the playability check with the reference."""
+
+    def check(self, cells, message):
+        """This method checks the playability of 'cells', and the
+        locations failing the rule #8, against the reference."""
+        unreachable = reference_unreachable(cells)
+        labyrinth = Labyrinth.from_grid(Grid(cells.copy()))
+        self.assertEqual(labyrinth.analyze_playability(), not unreachable,
+                         message)
+        win = PlayabilityValidator(labyrinth.grid).win_location()
+        self.assertEqual(labyrinth.unreachable_cells(*win), unreachable,
+                         message)
+        failures = dict(PlayabilityValidator(labyrinth.grid).failures())
+        self.assertEqual(set(failures.get(8, [])), unreachable, message)
+
+    def test_map_file(self):
+        """This method checks the default map, which is playable."""
+        cells = Labyrinth(MAP_FILE).grid.cells
+        self.assertFalse(reference_unreachable(cells))
+        self.check(cells, MAP_FILE)
+
+    def test_random_maps(self):
+        """This method checks seeded random small maps, playable or not."""
+        checked = 0
+        playable = 0
+        for seed in range(RANDOM_MAPS):
+            cells = random_cells(random.Random(seed))
+            if cells is None:
+                continue
+            failures = PlayabilityValidator(Grid(cells.copy())).failures()
+            # only the rule #8 can fail
+            self.assertLessEqual({rule for rule, _ in failures}, {8},
+                                 "seed {}".format(seed))
+            self.check(cells, "seed {}".format(seed))
+            checked += 1
+            playable += not reference_unreachable(cells)
+        # both cases have to be covered
+        self.assertGreater(checked, RANDOM_MAPS // 2)
+        self.assertGreater(playable, 0)
+        self.assertLess(playable, checked)
+
+
+def open_room_cells(size):
+    """This function returns the cells of a playable map of size x size,
+    which is an open room (no inside wall except around the location
+    to win, cf. rule #6), with the guard on the left edge."""
+    cells = np.ones((size, size), dtype=np.uint8)
+    cells[1:-1, 1:-1] = 0
+    middle = size // 2
+    cells[middle, 0] = 2
+    cells[middle - 1, 1] = 1
+    cells[middle + 1, 1] = 1
+    cells[size - 2, size - 2] = 3
+    return cells
+
+
+class IncrementalTest(unittest.TestCase):
+    """This class checks the incremental updates of the validator."""
+
+    def paint(self, validator, x_pos, y_pos, value):
+        """This method modifies a cell of the validator grid,
+        and updates the validator, as in edit mode."""
+        old = validator.grid.get(x_pos, y_pos)
+        validator.grid.set(x_pos, y_pos, value)
+        validator.apply(x_pos, y_pos, old, value)
+
+    def test_random_edits(self):
+        """This method checks the validator after each random edit
+        against the reference, for seeded random small maps."""
+        for seed in range(RANDOM_MAPS // 4):
+            rng = random.Random(seed)
+            cells = random_cells(rng)
+            if cells is None:
+                continue
+            validator = PlayabilityValidator(Grid(cells.copy()))
+            grid = validator.grid
+            for edit in range(EDITS):
+                x_pos = rng.randint(1, grid.width - 2)
+                y_pos = rng.randint(1, grid.height - 2)
+                if grid.get(x_pos, y_pos) in (0, 1):
+                    self.paint(validator, x_pos, y_pos, rng.randint(0, 1))
+                message = "seed {}, edit {}".format(seed, edit)
+                fresh = PlayabilityValidator(Grid(grid.cells.copy()))
+                self.assertEqual(validator.is_playable(),
+                                 fresh.is_playable(), message)
+                failures = dict(validator.failures())
+                self.assertEqual(failures, dict(fresh.failures()), message)
+                if 8 in failures or not failures:
+                    self.assertEqual(set(failures.get(8, [])),
+                                     reference_unreachable(grid.cells),
+                                     message)
+
+    def test_open_room(self):
+        """This method paints walls in an open room, where the
+        connectivity cannot change: the labelling is never recomputed."""
+        validator = PlayabilityValidator(Grid(open_room_cells(ROOM_SIZE)))
+        self.assertTrue(validator.is_playable())
+        recomputes = validator.full_recomputes
+        rng = random.Random(0)
+        for _ in range(ROOM_WALLS):
+            # the walls stay far from the edges, the start and the guard
+            x_pos = rng.randint(5, ROOM_SIZE - 6)
+            y_pos = rng.randint(5, ROOM_SIZE - 6)
+            self.paint(validator, x_pos, y_pos, 1)
+            self.assertTrue(validator.is_playable())
+        # a line of walls, drawn cell by cell, does not split the room
+        for x_pos in range(3, ROOM_SIZE - 3):
+            self.paint(validator, x_pos, 3, 1)
+            self.assertTrue(validator.is_playable())
+        self.assertEqual(validator.full_recomputes, recomputes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,9 @@ class Tool:
 
     TOOLS_NAMES = ["ether", "needle", "tube"]
 
+    # the attributes are stored in slots (no '__dict__'), which is compact
+    __slots__ = ("found", "name", "x_pos", "y_pos")
+
     def __init__(self, name, x_pos, y_pos):
         """This special method is the class constructor."""
         self.found = False
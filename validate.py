@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""Please execute this file with Python to check the playability
+of labyrinth map files, without any display, e.g.:
+'python validate.py data/ generated/*.laby campaign.mgpk'
+
+Each level of a map pack is checked (cf. mappack module), as the map
+'pack.mgpk#N'; a single level can also be given with this name.
+
+The maps are checked in parallel, with one process per core.
+The result of each map is written on the standard output as a JSON line:
+{"map": ..., "width": ..., "height": ..., "playable": ...,
+"failures": [{"rule": ..., "cells": [[x, y], ...]}, ...]}
+(cf. 'Labyrinth.analyze_playability' for the rules numbers).
+A map which cannot be read gives {"map": ..., "error": ...}.
+The throughput is written on the standard error.
+The exit status is 1 if a map is not playable (or cannot be read).
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+
+import mapfile
+import mappack
+from validator import PlayabilityValidator
+
+
+MAP_EXTENSIONS = (".csv", mapfile.BINARY_EXTENSION, mappack.PACK_EXTENSION)
+
+
+def find_map_files(paths):
+    """This function returns the map files given by 'paths',
+    which can be files, directories (their map files are used,
+    cf. MAP_EXTENSIONS), levels of map packs ('pack.mgpk#N')
+    or glob patterns. The map packs are replaced by their levels."""
+    map_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(MAP_EXTENSIONS):
+                    map_files.extend(pack_levels(os.path.join(path, name)))
+        elif os.path.exists(path):
+            map_files.extend(pack_levels(path))
+        elif is_pack_level(path):
+            map_files.append(path)
+        else:
+            matches = sorted(glob.glob(path, recursive=True))
+            if not matches:
+                raise ValueError("No map file for: {}".format(path))
+            map_files.extend(find_map_files(matches))
+    return map_files
+
+
+def is_pack_level(path):
+    """This function returns 'True' if 'path' is the name of a level
+    of an existing map pack file (cf. 'mappack.level_name')."""
+    pack_file, level = mappack.parse_level_name(path)
+    return level is not None and os.path.isfile(pack_file)
+
+
+def pack_levels(map_file):
+    """This function returns the names of the levels of 'map_file'
+    if it is a map pack (cf. 'mappack.level_name'), otherwise a list
+    containing 'map_file' only (its errors are given by 'validate_map').
+    """
+    try:
+        if not mappack.is_map_pack(map_file):
+            return [map_file]
+        with mappack.MapPack(map_file) as pack:
+            count = len(pack)
+    except (OSError, ValueError):
+        return [map_file]
+    return [mappack.level_name(map_file, level) for level in range(count)]
+
+
+def validate_map(map_file):
+    """This function checks the map file 'map_file' (or the level
+    of a map pack 'pack.mgpk#N'), and returns the result
+    as a dictionary (cf. module docstring)."""
+    try:
+        pack_file, level = mappack.parse_level_name(map_file)
+        if level is not None:
+            grid = mappack.load_level(pack_file, level, verify=True)
+        elif mappack.is_map_pack(map_file):
+            raise ValueError("map pack: use {}"
+                             .format(mappack.level_name(map_file, "N")))
+        else:
+            grid = mapfile.load_grid(map_file)
+        failures = PlayabilityValidator(grid).failures()
+    except (OSError, ValueError) as error:
+        return {"map": map_file, "error": str(error)}
+    return {"map": map_file, "width": grid.width, "height": grid.height,
+            "playable": not failures,
+            "failures": [{"rule": rule, "cells": [list(loc) for loc in cells]}
+                         for rule, cells in failures]}
+
+
+def validate_all(map_files, jobs):
+    """This generator yields the result of each map file,
+    in the same order, checked by 'jobs' processes."""
+    if jobs == 1 or len(map_files) < 2:
+        for map_file in map_files:
+            yield validate_map(map_file)
+        return
+    # the maps are sent by chunks, since most of them are checked quickly
+    chunksize = max(1, len(map_files) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        for result in executor.map(validate_map, map_files,
+                                   chunksize=chunksize):
+            yield result
+
+
+def main():
+    """This function is the main function to be executed
+    to check map files."""
+    parser = argparse.ArgumentParser(
+        description="Check the playability of labyrinth map files.")
+    parser.add_argument("paths", nargs="+",
+                        help="map files, directories or glob patterns")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of processes (default: one per core)")
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("the number of processes has to be positive")
+
+    try:
+        map_files = find_map_files(args.paths)
+    except ValueError as error:
+        parser.error(str(error))
+    jobs = min(args.jobs, max(1, len(map_files)))
+    failed = 0
+    start = time.perf_counter()
+    for result in validate_all(map_files, jobs):
+        if not result.get("playable"):
+            failed += 1
+        sys.stdout.write(json.dumps(result) + "\n")
+    duration = time.perf_counter() - start
+
+    # throughput, on the standard error to keep the output parsable
+    rate = len(map_files) / duration if duration else 0.0
+    sys.stderr.write("{} maps, {} failed, {:.2f} s, {:.0f} maps/s "
+                     "({:.0f} maps/s per core, {} processes)\n"
+                     .format(len(map_files), failed, duration, rate,
+                             rate / jobs, jobs))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
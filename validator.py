@@ -0,0 +1,328 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+"""This module contains the 'PlayabilityValidator' class.
+This checks the playability rules of a labyrinth grid
+(cf. 'Labyrinth.analyze_playability' for the list of rules),
+and keeps its state up to date when a single cell is modified,
+e.g. in edit mode.
+"""
+
+import numpy as np
+
+
+class PlayabilityValidator:
+    """This class checks if a labyrinth grid is playable,
+    with an incremental update for each modified cell."""
+
+    FREE_VALUES = (0, 3)  # values of the cells where the player can go
+    # half size of the window searched around a new wall, to check
+    # that its neighbours are still connected (cf. 'apply')
+    LOCAL_RADIUS = 8
+    # the 8 locations around a cell, in circular order (each one is
+    # a neighbour of the next one), as offsets (x, y)
+    RING = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0),
+            (-1, -1))
+
+    def __init__(self, grid):
+        """This special method is the class constructor."""
+        self.grid = grid  # type is <class 'Grid'>
+        # number of walls and exits on the edges, for rules #3 and #4
+        self._edge_walls = 0  # type is int
+        self._edge_exits = 0  # type is int
+        # reachability labelling for rule #8, computed from '_reach_origin'
+        self._reach_origin = None  # type is tuple (x, y) or None if outdated
+        self._reached = None  # type is numpy.ndarray of bool
+        self._reached_count = 0  # type is int
+        # counter of full reachability computations (useful for statistics)
+        self.full_recomputes = 0  # type is int
+        self.recompute()
+
+    @property
+    def edge_length(self):
+        """This property returns the number of locations on the edges."""
+        return self.grid.width * 2 + self.grid.height * 2 - 4
+
+    def recompute(self):
+        """This method recomputes the whole state from the grid."""
+        grid = self.grid
+        edge_values = np.concatenate((grid.get_row(0),
+                                      grid.get_row(grid.height - 1),
+                                      grid.get_column(0)[1:-1],
+                                      grid.get_column(grid.width - 1)[1:-1]))
+        self._edge_walls = int(np.count_nonzero(edge_values == 1))
+        self._edge_exits = int(np.count_nonzero(edge_values == 2))
+        self._reach_origin = None
+
+    def apply(self, x_pos, y_pos, old, new):
+        """This method updates the state after the modification of the cell
+        (x_pos, y_pos) from the value 'old' to the value 'new'.
+        We assume that the grid has already been modified."""
+        if old == new:
+            return
+        # rules #1, #2 and #7: the counts are maintained by the grid itself
+        # rules #3 and #4: we update the edges tally
+        if self._is_on_edge(x_pos, y_pos):
+            self._edge_walls += (new == 1) - (old == 1)
+            self._edge_exits += (new == 2) - (old == 2)
+        # rules #5 and #6 are local checks, done in 'is_playable'
+        # rule #8: we update the reachability labelling
+        if self._reach_origin is None:
+            return
+        was_free = old in self.FREE_VALUES
+        is_free = new in self.FREE_VALUES
+        if (x_pos, y_pos) == self._reach_origin and was_free != is_free:
+            # the location to win is blocked or freed (the labelling can be
+            # computed from a wall, cf. 'failures'): it is outdated
+            self._reach_origin = None
+        elif not was_free and is_free:
+            # a new free location: it can only extend the reachable area
+            if self._has_reached_neighbour(x_pos, y_pos):
+                self._extend_reached(x_pos, y_pos)
+        elif was_free and not is_free and self._reached[y_pos, x_pos]:
+            self._reached[y_pos, x_pos] = False
+            self._reached_count -= 1
+            # a dead end can be blocked without changing the connectivity,
+            # as well as a cell whose neighbours are connected around it,
+            # otherwise the reachable area may be split
+            if self._count_reached_neighbours(x_pos, y_pos) > 1\
+                    and not self._is_ring_connected(x_pos, y_pos)\
+                    and not self._is_locally_connected(x_pos, y_pos):
+                self._reach_origin = None
+
+    def is_playable(self):
+        """This method returns 'True' if all the rules are respected,
+        otherwise 'False'."""
+        grid = self.grid
+        # we check if rule #1 is true
+        if grid.count(3) != 1:
+            return False
+        (x_3, y_3), = grid.locate(3)
+        # we check if rule #2 is true
+        if grid.count(2) != 1:
+            return False
+        (x_2, y_2), = grid.locate(2)
+        # we check if rule #3 is true
+        x_max = grid.width - 1
+        y_max = grid.height - 1
+        if not (grid.get(0, 0) == 1 and grid.get(0, y_max) == 1
+                and grid.get(x_max, 0) == 1 and grid.get(x_max, y_max) == 1):
+            return False
+        # we check if rule #4 is true
+        if not (self._edge_walls == self.edge_length - 1
+                and self._edge_exits == 1):
+            return False
+        # we check if rule #5 is true
+        if abs(x_2 - x_3) + abs(y_2 - y_3) == 1:
+            return False
+        # we check if rule #6 is true
+        x_win, y_win = self.win_location()
+        if grid.get(x_win, y_win) != 0:
+            return False
+        neighbours = []
+        for (x_n, y_n) in self._neighbours(x_win, y_win):
+            if (x_n, y_n) != (x_2, y_2):
+                neighbours.append(grid.get(x_n, y_n))
+        neighbours.sort()
+        if neighbours not in [[0, 1, 1], [1, 1, 3]]:
+            return False
+        # we check if rule #7 is true
+        if grid.count(0) < 3:
+            return False
+        # we check if rule #8 is true
+        if self._reach_origin != (x_win, y_win):
+            self._compute_reached(x_win, y_win)
+        return self._reached_count == grid.count(0) + grid.count(3)
+
+    def failures(self):
+        """This method returns the list of the rules which are not respected,
+        as tuples (rule number, list of the offending locations (x, y)).
+        Unlike 'is_playable', all the rules are checked, except the rules
+        #6 and #8 which need one, and only one, guard on an edge.
+        The list is empty if the labyrinth is playable."""
+        grid = self.grid
+        failures = []
+        starts = grid.locate(3)
+        exits = grid.locate(2)
+        # rule #1
+        if len(starts) != 1:
+            failures.append((1, starts))
+        # rule #2
+        if len(exits) != 1:
+            failures.append((2, exits))
+        # rule #3
+        x_max = grid.width - 1
+        y_max = grid.height - 1
+        corners = [(0, 0), (x_max, 0), (0, y_max), (x_max, y_max)]
+        cells = [loc for loc in corners if grid.get(*loc) != 1]
+        if cells:
+            failures.append((3, cells))
+        # rule #4: the edge locations which are neither walls nor exits,
+        # and the exits if there is not one, and only one, exit on the edges
+        if not (self._edge_walls == self.edge_length - 1
+                and self._edge_exits == 1):
+            edges = np.ones(grid.cells.shape, dtype=bool)
+            edges[1:-1, 1:-1] = False
+            cells = self._locations(edges & ~np.isin(grid.cells, (1, 2)))
+            if self._edge_exits != 1:
+                cells = sorted(set(cells + exits),
+                               key=lambda loc: (loc[1], loc[0]))
+            failures.append((4, cells))
+        # rule #5
+        if len(starts) == 1 and len(exits) == 1:
+            (x_3, y_3), = starts
+            (x_2, y_2), = exits
+            if abs(x_2 - x_3) + abs(y_2 - y_3) == 1:
+                failures.append((5, [(x_3, y_3), (x_2, y_2)]))
+        guard_on_edge = len(exits) == 1 and self._is_on_edge(*exits[0])
+        # rule #6
+        if guard_on_edge:
+            x_win, y_win = self.win_location()
+            locations = [loc for loc in self._neighbours(x_win, y_win)
+                         if loc != exits[0]]
+            neighbours = sorted([grid.get(*loc) for loc in locations])
+            if grid.get(x_win, y_win) != 0:
+                failures.append((6, [(x_win, y_win)]))
+            elif neighbours not in [[0, 1, 1], [1, 1, 3]]:
+                failures.append((6, locations))
+        # rule #7
+        if grid.count(0) < 3:
+            failures.append((7, []))
+        # rule #8: the free locations from which we cannot reach the exit
+        if guard_on_edge:
+            if self._reach_origin != (x_win, y_win):
+                self._compute_reached(x_win, y_win)
+            if self._reached_count != grid.count(0) + grid.count(3):
+                free = np.isin(grid.cells, self.FREE_VALUES)
+                failures.append((8, self._locations(free & ~self._reached)))
+        return failures
+
+    def win_location(self):
+        """This method returns the location (x, y) next to the guard,
+        inside the labyrinth.
+        We assume that there is one, and only one, guard on an edge."""
+        (x_2, y_2), = self.grid.locate(2)
+        # if the guard is on the left edge
+        if x_2 == 0:
+            return (x_2 + 1, y_2)
+        # if the guard is on the right edge
+        if x_2 == self.grid.width - 1:
+            return (x_2 - 1, y_2)
+        # if the guard is on the top edge
+        if y_2 == 0:
+            return (x_2, y_2 + 1)
+        # if the guard is on the bottom edge
+        if y_2 == self.grid.height - 1:
+            return (x_2, y_2 - 1)
+        raise ValueError((x_2, y_2))
+
+    def _compute_reached(self, x_win, y_win):
+        """This protected method labels all the free locations
+        connected to the location to win, with a full flood fill."""
+        self._reached = self.grid.flood_fill(x_win, y_win, self.FREE_VALUES)
+        self._reached_count = int(np.count_nonzero(self._reached))
+        self._reach_origin = (x_win, y_win)
+        self.full_recomputes += 1
+
+    def _extend_reached(self, x_pos, y_pos):
+        """This protected method labels the free location (x_pos, y_pos),
+        and all the free locations connected to it which were not reached.
+        The cost is proportional to the number of new reached locations."""
+        grid = self.grid
+        reached = self._reached
+        reached[y_pos, x_pos] = True
+        self._reached_count += 1
+        stack = [(x_pos, y_pos)]
+        while stack:
+            x_l, y_l = stack.pop()
+            for (x_n, y_n) in self._neighbours(x_l, y_l):
+                if not reached[y_n, x_n]\
+                        and grid.get(x_n, y_n) in self.FREE_VALUES:
+                    reached[y_n, x_n] = True
+                    self._reached_count += 1
+                    stack.append((x_n, y_n))
+
+    def _has_reached_neighbour(self, x_pos, y_pos):
+        """This protected method returns 'True' if a neighbour location
+        is labelled as reachable."""
+        return self._count_reached_neighbours(x_pos, y_pos) > 0
+
+    def _count_reached_neighbours(self, x_pos, y_pos):
+        """This protected method returns the number of neighbour locations
+        labelled as reachable."""
+        counter = 0
+        for (x_n, y_n) in self._neighbours(x_pos, y_pos):
+            if self._reached[y_n, x_n]:
+                counter += 1
+        return counter
+
+    def _is_ring_connected(self, x_pos, y_pos):
+        """This protected method returns 'True' if the free neighbours of
+        the location are connected through the 8 locations around it,
+        i.e. if they are all in one arc of free locations of the ring."""
+        grid = self.grid
+        free = []
+        for x_step, y_step in self.RING:
+            x_r = x_pos + x_step
+            y_r = y_pos + y_step
+            free.append(0 <= x_r < grid.width and 0 <= y_r < grid.height
+                        and grid.get(x_r, y_r) in self.FREE_VALUES)
+        # we count the arcs holding a neighbour (even index in the ring)
+        arcs = 0
+        for i in range(0, 8, 2):
+            # a neighbour starts an arc if the arc does not go on before it
+            if free[i] and not (free[i - 1] and free[i - 2]):
+                arcs += 1
+        return arcs <= 1
+
+    def _is_locally_connected(self, x_pos, y_pos):
+        """This protected method returns 'True' if the free neighbours of
+        the location are connected by a search limited to a window of
+        LOCAL_RADIUS locations around it (the location is not free)."""
+        grid = self.grid
+        x_min = max(0, x_pos - self.LOCAL_RADIUS)
+        x_max = min(grid.width - 1, x_pos + self.LOCAL_RADIUS)
+        y_min = max(0, y_pos - self.LOCAL_RADIUS)
+        y_max = min(grid.height - 1, y_pos + self.LOCAL_RADIUS)
+        targets = {loc for loc in self._neighbours(x_pos, y_pos)
+                   if grid.get(*loc) in self.FREE_VALUES}
+        start = targets.pop()
+        seen = {start}
+        stack = [start]
+        while stack and targets:
+            x_l, y_l = stack.pop()
+            for (x_n, y_n) in self._neighbours(x_l, y_l):
+                if (x_n, y_n) not in seen and x_min <= x_n <= x_max\
+                        and y_min <= y_n <= y_max\
+                        and grid.get(x_n, y_n) in self.FREE_VALUES:
+                    seen.add((x_n, y_n))
+                    targets.discard((x_n, y_n))
+                    stack.append((x_n, y_n))
+        return not targets
+
+    def _neighbours(self, x_pos, y_pos):
+        """This protected method returns the list of the neighbour locations
+        (up, down, left, right) which are inside the grid."""
+        neighbours = []
+        if y_pos > 0:
+            neighbours.append((x_pos, y_pos - 1))
+        if y_pos < self.grid.height - 1:
+            neighbours.append((x_pos, y_pos + 1))
+        if x_pos > 0:
+            neighbours.append((x_pos - 1, y_pos))
+        if x_pos < self.grid.width - 1:
+            neighbours.append((x_pos + 1, y_pos))
+        return neighbours
+
+    @staticmethod
+    def _locations(mask):
+        """This protected method returns the locations (x, y) of the True
+        items of the boolean array 'mask', row by row."""
+        rows, cols = np.nonzero(mask)
+        return list(zip(cols.tolist(), rows.tolist()))
+
+    def _is_on_edge(self, x_pos, y_pos):
+        """This protected method returns 'True' if the location is on an edge.
+        """
+        return x_pos in (0, self.grid.width - 1)\
+            or y_pos in (0, self.grid.height - 1)